@@ -0,0 +1,136 @@
+from csv_io import parse_number
+
+# --- カタログの集計 (ヘッダーの集計パネル) ---
+# 読み込み時に全行を1回だけ集計し、以降は編集のたびに変更前と変更後の値の差分だけを足し引きする。
+# 編集1件あたりの更新は行数によらず一定で、全行を読み直すことはない。
+# このモジュールは Tk に依存しない。
+
+MARGIN_FIELDS = ("rank",) # 粗利率を分けて集計する列
+STAT_FIELDS = ("cost_price", "selling_price", "stock_quantity", "is_published", "is_sale") + MARGIN_FIELDS
+BATCH_SIZE = 5000 # 読み込み時に1回で集計する行数
+
+
+def number(value):
+    """ストアの値 (int / 文字列) を数値にする。空欄や数値として読めない値は None"""
+    if type(value) is int:
+        return value
+    if value is None or value == "":
+        return None
+    return parse_number(value)
+
+
+class CatalogStats:
+    """
+    在庫金額 (原価 × 在庫数)・粗利率 (MARGIN_FIELDS の値ごと)・公開/セール/在庫切れの件数。
+    行は先頭から順に集計し (extend() で対象を広げ、step() で少しずつ進める)、
+    まだ集計していない行の編集は無視する (後でその時点の値が集計される)。
+    """
+    def __init__(self):
+        self.version = 0 # 値が変わるたびに増える (表示の更新判定用)
+        self.clear()
+
+    def clear(self):
+        self.counted = 0 # 集計済みの行数 (先頭から)
+        self.total = 0 # 集計する行数
+        self.stock_value = 0
+        self.published = 0
+        self.sale = 0
+        self.out_of_stock = 0 # 在庫数が 0 以下
+        self.published_out_of_stock = 0 # 公開中で在庫切れ
+        # 列 → {値: [件数, 売価の合計, 原価の合計]} (売価と原価が両方ある行だけ)
+        self.margins = {key: {} for key in MARGIN_FIELDS}
+        self.version += 1
+
+    def pending(self):
+        return self.counted < self.total
+
+    def extend(self, total):
+        """読み込みでストアが total 行になったときに呼ぶ"""
+        self.total = total
+
+    def step(self, store, budget_rows=None):
+        """まだ集計していない行を1バッチ分集計する。すべて終わったら True を返す"""
+        size = budget_rows or getattr(store, "BATCH_ROWS", BATCH_SIZE) # mmap のストアは1行ごとの取り出しが重い
+        end = min(self.counted + size, self.total, len(store))
+        if end > self.counted:
+            rows = range(self.counted, end)
+            add = self.add
+            for values in zip(*(store.get_many(key, rows) for key in STAT_FIELDS)):
+                add(values, 1)
+            self.counted = end
+            self.version += 1
+        return not self.pending()
+
+    def add(self, values, sign):
+        """1行分の値 (STAT_FIELDS の順) を sign=1 なら足し、-1 なら引く"""
+        cost, selling, stock, published, sale, *groups = values
+        cost = number(cost)
+        selling = number(selling)
+        stock = number(stock)
+        if cost is not None and stock is not None:
+            self.stock_value += sign * cost * stock
+        if published:
+            self.published += sign
+        if sale:
+            self.sale += sign
+        if stock is not None and stock <= 0:
+            self.out_of_stock += sign
+            if published:
+                self.published_out_of_stock += sign
+        if cost is not None and selling is not None:
+            for key, group in zip(MARGIN_FIELDS, groups):
+                totals = self.margins[key].get(group)
+                if totals is None:
+                    totals = self.margins[key][group] = [0, 0, 0]
+                totals[0] += sign
+                totals[1] += sign * selling
+                totals[2] += sign * cost
+                if not totals[0]:
+                    del self.margins[key][group]
+
+    def edit(self, row, changes, item):
+        """
+        1件のレコードの編集を反映する (write_fields() の後に呼ぶ)。
+        changes は {キー: (変更前, 変更後)}、item は編集後のレコード。
+        """
+        if row >= self.counted or not any(key in changes for key in STAT_FIELDS):
+            return
+        after = [item.get(key) for key in STAT_FIELDS]
+        before = [changes[key][0] if key in changes else value for key, value in zip(STAT_FIELDS, after)]
+        self.add(before, -1)
+        self.add(after, 1)
+        self.version += 1
+
+    def bulk_edit(self, store, changes):
+        """
+        列単位の書き換え {列名: BulkChange} を反映する (ストアに書き込んだ後に呼ぶ)。
+        書き換えた行の値だけを読むため、手間は書き換えた行数に比例する。
+        """
+        keys = [key for key in STAT_FIELDS if key in changes]
+        rows = sorted({row for key in keys for row in changes[key].rows if row < self.counted})
+        if not rows:
+            return
+        after = {key: store.get_many(key, rows) for key in STAT_FIELDS}
+        before = dict(after)
+        position = {row: n for n, row in enumerate(rows)}
+        for key in keys:
+            column = before[key] = list(after[key])
+            seen = set()
+            for row, old in zip(changes[key].rows, changes[key].old):
+                # 同じ行が2回含まれる場合は最初の変更前の値が元の値
+                if row in position and row not in seen:
+                    column[position[row]] = old
+                    seen.add(row)
+        for values in zip(*(before[key] for key in STAT_FIELDS)):
+            self.add(values, -1)
+        for values in zip(*(after[key] for key in STAT_FIELDS)):
+            self.add(values, 1)
+        self.version += 1
+
+    def margin_rates(self, key=MARGIN_FIELDS[0]):
+        """key 列の値ごとの粗利率 [(値, 粗利率), ...] を値の順に返す (売価の合計が 0 の値は除く)"""
+        return [
+            (group, (selling - cost) / selling)
+            for group, (count, selling, cost) in sorted(self.margins[key].items(), key=lambda entry: str(entry[0]))
+            if selling
+        ]
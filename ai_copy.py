@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog_cache import default_cache_dir
+
+# --- AI によるキャッチコピー・商品説明の生成 ---
+# OpenAI 互換の chat/completions API を使う。選んだ商品をまとめて asyncio で並行に問い合わせ、
+# 結果はキュー経由で UI スレッドに渡す (UI は poll() で受け取る)。
+
+AI_MODELS = ("gpt-4o", "gemini-1.5-pro")
+# モデル名の先頭 → API の URL。環境変数 ELTEX_AI_ENDPOINT を指定するとすべてそちらに送る (検証用のスタブサーバーなど)
+ENDPOINTS = {
+    "gpt-": "https://api.openai.com/v1",
+    "gemini-": "https://generativelanguage.googleapis.com/v1beta/openai",
+}
+GENERATED_FIELDS = ("catch_copy", "description")
+CONCURRENCY = 8 # 同時に送るリクエスト数
+RATE_PER_SECOND = 5.0 # 1秒あたりのリクエスト数の上限 (トークンバケット)
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0 # 再試行の待ち時間 (1回ごとに倍、最大 BACKOFF_MAX)
+BACKOFF_MAX = 60.0
+TIMEOUT = 60
+RETRY_STATUS = (408, 409, 429, 500, 502, 503, 504)
+CACHE_FILE = "ai_copy.jsonl"
+
+# プロンプトに含める商品情報 (列名 → 表示名)
+PROMPT_FIELDS = {
+    "name": "商品名",
+    "catch_copy": "現在のキャッチコピー",
+    "selling_price": "販売価格 (円)",
+    "size_w": "幅 (mm)",
+    "size_h": "高さ (mm)",
+    "size_d": "奥行 (mm)",
+    "weight": "重量 (g)",
+    "delivery_display": "配送",
+    "memo": "メモ",
+}
+FIELD_INSTRUCTIONS = {
+    "catch_copy": '"catch_copy": 商品の魅力が伝わる30文字程度のキャッチコピー',
+    "description": '"description": 商品ページ用の説明文。<p> / <br> / <ul><li> だけを使ったHTML',
+}
+PROMPT_TEMPLATE = """あなたは家電・日用品の通販サイトのコピーライターです。
+次の商品について、以下のキーを持つ JSON オブジェクトだけを出力してください。
+{instructions}
+
+# 商品情報
+{product}"""
+
+
+class ApiError(Exception):
+    """API 呼び出しの失敗。retryable なら待ってから再試行する"""
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def endpoint_for(model):
+    endpoint = os.environ.get("ELTEX_AI_ENDPOINT")
+    if endpoint:
+        return endpoint.rstrip("/")
+    for prefix, url in ENDPOINTS.items():
+        if model.startswith(prefix):
+            return url
+    return ENDPOINTS["gpt-"]
+
+
+def build_prompt(values, fields):
+    """商品の値 {列名: 値} から fields (GENERATED_FIELDS の一部) を生成するプロンプトを作る"""
+    product = "\n".join(
+        f"{label}: {values[key]}" for key, label in PROMPT_FIELDS.items() if values.get(key) not in (None, "")
+    )
+    instructions = "\n".join(f"- {FIELD_INSTRUCTIONS[key]}" for key in fields)
+    return PROMPT_TEMPLATE.format(instructions=instructions, product=product)
+
+
+def parse_result(content, fields):
+    """モデルの出力 (JSON) から fields の値を取り出す。形式が違う場合は再試行する"""
+    content = content.strip()
+    if content.startswith("```"):
+        # ```json ... ``` で囲んで返すモデルがある
+        content = content.strip("`").removeprefix("json").strip()
+    try:
+        result = json.loads(content)
+    except ValueError:
+        raise ApiError("AIの出力が JSON ではありません", retryable=True)
+    if not isinstance(result, dict) or not all(isinstance(result.get(key), str) and result[key].strip() for key in fields):
+        raise ApiError("AIの出力に必要な項目がありません", retryable=True)
+    return {key: result[key].strip() for key in fields}
+
+
+def request_completion(endpoint, api_key, model, prompt, timeout=TIMEOUT):
+    """chat/completions を1回呼び、応答のテキストを返す (ブロックするためワーカースレッドで呼ぶ)"""
+    body = json.dumps({
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+    }).encode("utf-8")
+    request = urllib.request.Request(f"{endpoint}/chat/completions", data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.load(response)
+    except urllib.error.HTTPError as e:
+        retry_after = e.headers.get("Retry-After") if e.headers else None
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        raise ApiError(f"HTTP {e.code}: {e.reason}", retryable=e.code in RETRY_STATUS, retry_after=retry_after)
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        raise ApiError(f"接続できませんでした: {e}", retryable=True)
+    except ValueError as e:
+        raise ApiError(f"応答を読めませんでした: {e}", retryable=True)
+    try:
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise ApiError("応答の形式が正しくありません", retryable=True)
+
+
+class TokenBucket:
+    """1秒あたり rate 回 (続けてなら capacity 回まで) に呼び出しを抑えるレート制限 (asyncio 用)"""
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self.refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """サーバーから待つよう指示された (429 の Retry-After) ときは全体の送信を止める"""
+        self.refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class CopyCache:
+    """
+    生成結果のキャッシュ (プロンプト + モデル → 結果)。
+    商品情報が変わっていなければ再実行しても API を呼ばない。1行1件の JSON で追記する。
+    """
+    def __init__(self, directory=None):
+        self.path = os.path.join(directory or default_cache_dir(), CACHE_FILE)
+        self.entries = {}
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.entries[record["key"]] = record["result"]
+                    except (ValueError, KeyError, TypeError):
+                        continue # 書き込み途中で終了した行
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error reading AI copy cache {self.path}: {e}")
+
+    @staticmethod
+    def key(model, prompt):
+        return hashlib.blake2b(f"{model}\0{prompt}".encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, model, prompt):
+        return self.entries.get(self.key(model, prompt))
+
+    def put(self, model, prompt, result):
+        key = self.key(model, prompt)
+        with self.lock:
+            self.entries[key] = result
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "result": result}, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Error writing AI copy cache {self.path}: {e}")
+
+
+class CopyGenerator(threading.Thread):
+    """
+    jobs [(レコードid, 生成する列のタプル, プロンプト), ...] を並行に生成するワーカースレッド。
+    スレッドの中で asyncio のイベントループを回し、同時実行数を concurrency、
+    送信の間隔を TokenBucket で抑え、失敗したリクエストは指数バックオフで再試行する。
+    結果は届いた順に poll() で (レコードid, {列名: 値} または None, エラーメッセージ) として受け取る。
+    """
+    def __init__(self, jobs, model, api_key, cache=None, concurrency=CONCURRENCY, rate=RATE_PER_SECOND,
+                 endpoint=None, retries=MAX_RETRIES, timeout=TIMEOUT):
+        super().__init__(daemon=True)
+        self.jobs = list(jobs)
+        self.model = model
+        self.api_key = api_key
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.endpoint = endpoint or endpoint_for(model)
+        self.retries = retries
+        self.timeout = timeout
+        self.results = queue.Queue()
+        self.total = len(self.jobs)
+        self.completed = 0
+        self.cached = 0
+        self.failed = 0
+        self.last_failure = None # 最後に失敗したリクエストのエラーメッセージ
+        self.stopped = False
+        self.finished = False
+        self.error = None
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    async def main(self):
+        self.bucket = TokenBucket(self.rate)
+        jobs = asyncio.Queue()
+        for job in self.jobs:
+            jobs.put_nowait(job)
+        # urllib はブロックするため、同時実行数と同じ数のスレッドで呼ぶ (既定のスレッドプールはCPU数で決まる)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.executor:
+            await asyncio.gather(*(self.worker(jobs) for _ in range(min(self.concurrency, len(self.jobs)))))
+
+    async def worker(self, jobs):
+        while not self.stopped and not jobs.empty():
+            record_id, fields, prompt = jobs.get_nowait()
+            try:
+                values = await self.generate(fields, prompt)
+            except ApiError as e:
+                self.failed += 1
+                self.last_failure = str(e)
+                self.results.put((record_id, None, str(e)))
+            else:
+                self.results.put((record_id, values, None))
+            self.completed += 1
+
+    async def generate(self, fields, prompt):
+        cached = self.cache.get(self.model, prompt) if self.cache else None
+        if cached is not None:
+            self.cached += 1
+            return cached
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                content = await loop.run_in_executor(
+                    self.executor, request_completion, self.endpoint, self.api_key, self.model, prompt, self.timeout
+                )
+                values = parse_result(content, fields)
+                break
+            except ApiError as e:
+                if not e.retryable or attempt == self.retries or self.stopped:
+                    raise
+                if e.retry_after:
+                    delay = e.retry_after
+                    self.bucket.pause(delay)
+                else:
+                    # 同時に失敗したリクエストが一斉に再送しないよう、待ち時間をばらつかせる
+                    delay = random.uniform(0.5, 1.0) * min(BACKOFF_MAX, BACKOFF_SECONDS * 2 ** attempt)
+                await asyncio.sleep(delay)
+        if self.cache:
+            self.cache.put(self.model, prompt, values)
+        return values
+
+    def poll(self, limit=500):
+        """届いた結果 (最大 limit 件) と、すべて終わったかどうかを返す"""
+        results = []
+        while len(results) < limit:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return results, self.finished and self.results.empty()
+
+    def progress(self):
+        return self.completed / self.total if self.total else 1.0
+
+    def stop(self):
+        """まだ送っていない商品の生成をやめる (送信中のリクエストは終わるまで待つ)"""
+        self.stopped = True
@@ -0,0 +1,164 @@
+"""
+エディタのホットパスのベンチマーク。
+
+合成データ (generate_dummy_data) で App を起動し、以下を計測して JSON で出力する。
+  - startup:              App() の生成から最初の描画が終わるまで
+  - switch_tab:           タブ切り替え1回 (保存 → タブ更新 → 読み込み → 描画)
+  - refresh_tabs:         タブバーの更新1回
+  - preview_keystroke:    desc_source の打鍵1回でUIスレッドが費やす時間
+  - preview_latency:      打鍵が止まってからプレビューに反映されるまで
+  - save_current_values:  1フィールド変更後の書き戻し1回
+  - export:               全件CSV保存 (rows_per_sec も出力)
+
+ディスプレイのない Linux では Xvfb 上で実行する:
+    xvfb-run -a python benchmark.py --sizes 20,1000,10000,100000 --output bench.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+    }
+
+
+def flush(app):
+    """保留中の描画・ジオメトリ計算を処理しきる"""
+    app.update_idletasks()
+    app.update()
+
+
+def wait_until(app, condition, timeout=600.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark step timed out")
+        app.update()
+        time.sleep(0.001)
+
+
+def bench_startup(module, size, repeat):
+    samples = []
+    for _ in range(repeat):
+        data = module.generate_dummy_data(size)
+        start = time.perf_counter()
+        app = module.App(data=data)
+        flush(app)
+        samples.append(time.perf_counter() - start)
+        app.destroy()
+    return summarize(samples)
+
+
+def bench_editor(module, size, repeat):
+    results = {}
+    app = module.App(data=module.generate_dummy_data(size))
+    try:
+        flush(app)
+        editor = app.editor_view
+        # 検索索引の作成が計測に混ざらないよう先に終わらせる
+        wait_until(app, lambda: not editor.index_building)
+        # データ全体に散らばった商品を順に開く
+        step = max(1, size // repeat)
+        ids = [app.data[(i * step) % size]["id"] for i in range(repeat)]
+
+        samples = []
+        for item_id in ids:
+            start = time.perf_counter()
+            editor.switch_tab(item_id)
+            app.update_idletasks()
+            samples.append(time.perf_counter() - start)
+        results["switch_tab"] = summarize(samples)
+
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            editor.refresh_tabs()
+            app.update_idletasks()
+            samples.append(time.perf_counter() - start)
+        results["refresh_tabs"] = summarize(samples)
+
+        keystroke, latency = [], []
+        for i in range(repeat):
+            editor.desc_source.insert("end", f"<p>追記{i}</p>")
+            start = time.perf_counter()
+            editor.schedule_preview()
+            keystroke.append(time.perf_counter() - start)
+            # 打鍵が止まった後の更新を直接呼び、反映されるまでを計る
+            start = time.perf_counter()
+            editor.update_preview()
+            wait_until(app, lambda: editor.preview_waiting is None)
+            app.update_idletasks()
+            latency.append(time.perf_counter() - start)
+        results["preview_keystroke"] = summarize(keystroke)
+        results["preview_latency"] = summarize(latency)
+
+        samples = []
+        for i in range(repeat):
+            editor.vars["catch_copy"].set(f"ベンチマーク {i}")
+            start = time.perf_counter()
+            editor.save_current_values()
+            samples.append(time.perf_counter() - start)
+        results["save_current_values"] = summarize(samples)
+
+        samples = []
+        with tempfile.TemporaryDirectory() as tmp:
+            app.csv_path = os.path.join(tmp, "bench.csv")
+            for _ in range(max(1, repeat // 10)):
+                start = time.perf_counter()
+                app.on_save()
+                wait_until(app, lambda: app.exporter is None)
+                samples.append(time.perf_counter() - start)
+        results["export"] = summarize(samples)
+        results["export"]["rows_per_sec"] = size / statistics.median(samples)
+    finally:
+        app.destroy()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="エディタのホットパスのベンチマーク (JSON出力)")
+    parser.add_argument("--module", default="main", help="計測するエディタのモジュール (main / main2)")
+    parser.add_argument("--sizes", default="20,1000,10000,100000", help="合成データの件数 (カンマ区切り)")
+    parser.add_argument("--repeat", type=int, default=20, help="各計測の繰り返し回数")
+    parser.add_argument("--startup-repeat", type=int, default=3, help="起動時間の繰り返し回数")
+    parser.add_argument("--output", help="結果のJSONを書き出すファイル (省略時は標準出力)")
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(args.module)
+    report = {
+        "module": args.module,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [],
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        entry = {"rows": size, "startup": bench_startup(module, size, args.startup_repeat)}
+        entry.update(bench_editor(module, size, args.repeat))
+        report["results"].append(entry)
+        print(f"rows={size} done", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
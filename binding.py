@@ -0,0 +1,133 @@
+import unicodedata
+
+from csv_io import parse_bool, parse_number
+from preview import diff_region
+from schema import BOOL, INT
+
+# --- レコード ⇔ フォームの値の受け渡し ---
+
+BMP_MAX = "\uffff"
+
+
+def replace_text(textbox, old, new):
+    """
+    テキストボックスの内容 old を new に書き換える。
+    先頭と末尾の一致部分は残し、異なる範囲だけを削除・挿入する。
+    """
+    if max(old, default="") > BMP_MAX or max(new, default="") > BMP_MAX:
+        # 絵文字など BMP 外の文字は Tk の文字位置と Python の添字がずれるため全体を置き換える
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", new)
+        return
+    start, end, new_text = diff_region(old, new)
+    if end > start:
+        textbox.delete(f"1.0 + {start} chars", f"1.0 + {end} chars")
+    if new_text:
+        textbox.insert(f"1.0 + {start} chars", new_text)
+
+
+def format_value(field, value):
+    """保存している値をフォームに表示する文字列にする (書式は表示するときだけ適用する)"""
+    if field.kind == BOOL:
+        return parse_bool(value)
+    text = "" if value is None else str(value)
+    if field.kind == INT and field.display:
+        try:
+            number = int(text)
+        except ValueError:
+            return text
+        if str(number) == text:
+            return format(number, field.display)
+    return text
+
+
+def parse_value(field, text):
+    """
+    フォームに入力された文字列を保存する値にする (入力を確定したときに1回だけ解析する)。
+    数値は "1,980" や全角数字も整数に正規化し、数値として読めない入力はそのまま残す (検証で指摘する)。
+    """
+    if field.kind == BOOL:
+        return bool(text)
+    if field.kind == INT:
+        number = parse_number(text)
+        if type(number) is int:
+            return str(number)
+        return text if text.strip() else ""
+    if field.choices:
+        normalized = unicodedata.normalize("NFKC", text).strip()
+        if normalized in field.choices:
+            return normalized # 「10％」→「10%」
+    return text
+
+
+class FormBinding:
+    """
+    レコードとフォーム (tk変数・テキストボックス) の間で値を受け渡す。
+    画面に表示中の値を覚えておき、show() では値が異なるウィジェットだけを書き換える。
+    var.set() は1回ごとに Tcl の呼び出し・トレース・再描画が走るため、
+    似た商品どうしの切り替えではほとんど何も書き換えずに済む。
+    fields {キー: schema.Field} を渡すと、表示は format_value()、入力は parse_value() で変換する。
+    """
+    def __init__(self, variables, textboxes, fields=None):
+        from tkinter import BooleanVar # 変換の関数 (format_value など) は Tk なしで import できるように、ここで読み込む
+        self.variables = variables # キー → StringVar / BooleanVar
+        self.textboxes = textboxes # キー → CTkTextbox
+        self.fields = fields or {}
+        self.converters = {key: bool if isinstance(var, BooleanVar) else str for key, var in variables.items()}
+        self.shown = {} # キー → 表示中の文字列 (未知のキーは必ず書き換える)
+        self.source = {} # キー → 表示中の文字列の元になった値
+
+    def invalidate(self):
+        """表示中の値が分からなくなったとき (フォームを外から書き換えたときなど) に呼ぶ"""
+        self.shown.clear()
+        self.source.clear()
+
+    def display(self, key, value):
+        field = self.fields.get(key)
+        return format_value(field, value) if field else self.converters[key](value)
+
+    def show(self, item):
+        """item の値をフォームに表示し、書き換えたキーの集合を返す"""
+        changed = set()
+        for key, var in self.variables.items():
+            if key not in item:
+                continue
+            # 表示が同じでも元の値は異なる場合がある ("1,980" と 1980 など) ため、元の値は必ず覚え直す
+            value = self.source[key] = item[key]
+            text = self.display(key, value)
+            if key in self.shown and self.shown[key] == text:
+                continue
+            var.set(text)
+            self.shown[key] = text
+            changed.add(key)
+        for key, textbox in self.textboxes.items():
+            value = item.get(key, "")
+            old = self.shown.get(key)
+            if old == value:
+                continue
+            if old is None:
+                old = textbox.get("1.0", "end-1c")
+            replace_text(textbox, old, value)
+            self.shown[key] = value
+            changed.add(key)
+        return changed
+
+    def read(self):
+        """
+        フォームの現在の値を {キー: 値} で返す (ユーザーの入力を含む表示中の値として覚え直す)。
+        表示したときから変わっていない項目は元の値をそのまま返すため、整形した表示が保存する値を書き換えることはない。
+        """
+        values = {}
+        for key, var in self.variables.items():
+            text = var.get()
+            if key in self.source and self.shown.get(key) == text:
+                values[key] = self.source[key]
+                continue
+            field = self.fields.get(key)
+            values[key] = parse_value(field, text) if field else text
+            self.shown[key] = text
+            self.source[key] = values[key]
+        for key, textbox in self.textboxes.items():
+            values[key] = textbox.get("1.0", "end-1c")
+            self.shown[key] = self.source[key] = values[key]
+        return values
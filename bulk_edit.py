@@ -0,0 +1,270 @@
+import ast
+import math
+
+from column_store import INT_FIELDS, IntColumn
+from csv_io import BOOL_FIELDS, FALSE_VALUES, FIELDS, TRUE_VALUES, parse_number
+
+# --- 一括編集 ---
+# 条件式 (例: rank == 'C' and selling_price >= 1000) に一致する行に
+# 代入式 (例: selling_price = selling_price * 1.05) をまとめて適用する。
+# 式は列ごとのリストに対する内包表記へ変換して評価し、1行ずつの辞書操作は行わない。
+
+READONLY_FIELDS = ("id",) # レコードの識別に使う列は一括編集できない
+# 四捨五入の前に足す値。1990 * 1.05 = 2089.4999... のような浮動小数点の誤差で切り下がらないようにする
+ROUND_EPSILON = 1e-7
+
+
+class BulkEditError(ValueError):
+    pass
+
+
+def round_half_up(value, ndigits=0):
+    """四捨五入 (組み込みの round() は偶数丸めのため価格計算には使わない)"""
+    if ndigits >= 0:
+        factor = 10 ** ndigits
+        scaled = value * factor
+    else:
+        factor = 10 ** -ndigits
+        scaled = value / factor
+    number = math.floor(abs(scaled) + 0.5 + ROUND_EPSILON)
+    if scaled < 0:
+        number = -number
+    if ndigits > 0:
+        return number / factor
+    return number * factor if ndigits < 0 else number
+
+
+# 式の中で使える関数
+FUNCTIONS = {
+    "round": round_half_up,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "int": int,
+    "str": str,
+    "len": len,
+    "number": parse_number,
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.IfExp, ast.Call, ast.Constant, ast.Name, ast.Load, ast.Tuple, ast.List,
+)
+
+
+class _ColumnRefs(ast.NodeTransformer):
+    """列名を「列のリスト[i]」に、関数名を許可した関数に置き換える"""
+    def __init__(self):
+        self.fields = []
+
+    def visit_Name(self, node):
+        if node.id in FIELDS:
+            if node.id not in self.fields:
+                self.fields.append(node.id)
+            return ast.copy_location(ast.Subscript(ast.Name(f"c_{node.id}", ast.Load()), ast.Name("i", ast.Load()), ast.Load()), node)
+        if node.id in FUNCTIONS:
+            return ast.copy_location(ast.Name(f"f_{node.id}", ast.Load()), node)
+        raise BulkEditError(f"不明な名前です: {node.id}")
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise BulkEditError("式の中で使える関数は " + ", ".join(FUNCTIONS) + " です")
+        if node.keywords:
+            raise BulkEditError("関数の引数はキーワードなしで指定してください")
+        return self.generic_visit(node)
+
+
+def compile_expression(node, select=False):
+    """
+    式の構文木を、行番号のリストと参照する列のリストを受け取る関数に変換する。
+    select=True なら式が真になった行番号のリストを、それ以外は各行の式の値のリストを返す関数になる。
+    戻り値は (関数, 参照する列名のリスト)。
+    """
+    for child in ast.walk(node):
+        if not isinstance(child, ALLOWED_NODES):
+            raise BulkEditError(f"式の中で使えない書き方です: {type(child).__name__}")
+    refs = _ColumnRefs()
+    body = ast.fix_missing_locations(refs.visit(node))
+    params = ", ".join(["rows"] + [f"c_{key}" for key in refs.fields])
+    if select:
+        # 空欄の数値は比較できないため、条件に一致しないものとして扱う
+        guard = "".join(f"c_{key}[i] is not None and " for key in refs.fields if key in INT_FIELDS)
+        source = f"lambda {params}: [i for i in rows if {guard}({ast.unparse(body)})]"
+    else:
+        source = f"lambda {params}: [({ast.unparse(body)}) for i in rows]"
+    namespace = {f"f_{name}": func for name, func in FUNCTIONS.items()}
+    namespace["__builtins__"] = {}
+    return eval(compile(source, "<bulk-edit>", "eval"), namespace), refs.fields
+
+
+def parse_condition(source):
+    if not source.strip():
+        return None
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise BulkEditError(f"条件式の書き方が正しくありません: {e.msg}")
+    return compile_expression(tree.body, select=True)
+
+
+def parse_assignments(source):
+    """「列名 = 式」を改行または ; で区切って並べた代入式を [(列名, 関数, 参照する列名)] にする"""
+    try:
+        tree = ast.parse(source.strip())
+    except SyntaxError as e:
+        raise BulkEditError(f"変更内容の書き方が正しくありません: {e.msg}")
+    assignments = []
+    for statement in tree.body:
+        if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name)):
+            raise BulkEditError("変更内容は「列名 = 式」の形で指定してください")
+        key = statement.targets[0].id
+        if key not in FIELDS:
+            raise BulkEditError(f"不明な列です: {key}")
+        if key in READONLY_FIELDS:
+            raise BulkEditError(f"{key} は一括編集できません")
+        if any(key == other for other, _, _ in assignments):
+            raise BulkEditError(f"{key} が2回指定されています")
+        func, fields = compile_expression(statement.value)
+        assignments.append((key, func, fields))
+    if not assignments:
+        raise BulkEditError("変更内容を入力してください")
+    return assignments
+
+
+def to_int(value):
+    """数値列に書き込む値を整数にする (小数は四捨五入)"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise BulkEditError("計算結果が数値になりません")
+        return round_half_up(value)
+    number = parse_number(value) if value is not None else None
+    if number is None:
+        raise BulkEditError(f"数値の列に数値以外の値は書き込めません: {value!r}")
+    return to_int(number)
+
+
+def to_ints(values):
+    """to_int() をまとめて適用する。価格計算で大半を占める0以上の小数は関数呼び出しなしで丸める"""
+    floor = math.floor
+    try:
+        return [
+            value if type(value) is int
+            else floor(value + (0.5 + ROUND_EPSILON)) if type(value) is float and value >= 0
+            else to_int(value)
+            for value in values
+        ]
+    except BulkEditError:
+        raise
+    except (OverflowError, ValueError):
+        raise BulkEditError("計算結果が数値になりません")
+
+
+def to_bool(value):
+    """フラグの列に書き込む値を bool にする ("false" や "0" は偽。フラグとして読めない値はエラー)"""
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise BulkEditError(f"フラグの列に書き込めない値です: {value!r}")
+
+
+class BulkChange:
+    """一括編集で1つの列に加えた変更 (値が実際に変わった行だけ)"""
+    __slots__ = ("key", "rows", "old", "new")
+
+    def __init__(self, key, rows, old, new):
+        self.key = key
+        # 値は ColumnStore.get_many() / set_many() で読み書きする形 (数値列は原則 int)
+        self.rows = rows # 行番号のリスト
+        self.old = old # 各行の変更前の値
+        self.new = new # 各行の変更後の値
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class BulkEdit:
+    """
+    ColumnStore に対する一括編集。
+    preview() で対象件数を確かめてから apply() で全対象行に1回で書き込む。
+    代入式はすべて変更前の値で計算してから書き込むため、複数の代入の順序には依存しない。
+    """
+    def __init__(self, store, condition, assignments):
+        self.store = store
+        self.condition = parse_condition(condition)
+        self.assignments = parse_assignments(assignments)
+        self.columns = {}
+
+    def column(self, key):
+        if key not in self.columns:
+            self.columns[key] = self.store.typed_column(key)
+        return self.columns[key]
+
+    def evaluate(self, func, fields, rows):
+        try:
+            return func(rows, *(self.column(key) for key in fields))
+        except BulkEditError:
+            raise
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise BulkEditError(f"式を計算できませんでした: {e}")
+
+    def select(self):
+        """
+        条件に一致する行と、そのうち代入式で参照する数値が空欄のため変更できない行の数を返す。
+        戻り値は (行番号のリスト, 変更できる行番号のリスト)。
+        """
+        self.columns = {} # 列の値は呼び出しごとに読み直す
+        rows = range(len(self.store))
+        if self.condition:
+            rows = self.evaluate(*self.condition, rows)
+        valid = rows
+        for key in {key for _, _, fields in self.assignments for key in fields if key in INT_FIELDS}:
+            values = self.column(key)
+            valid = [i for i in valid if values[i] is not None]
+        return rows, valid
+
+    def preview(self):
+        """(条件に一致した件数, 空欄のため変更できない件数) を返す"""
+        rows, valid = self.select()
+        return len(rows), len(rows) - len(valid)
+
+    def apply(self):
+        """一括編集を実行し、{列名: BulkChange} を返す"""
+        _, rows = self.select()
+        rows = list(rows)
+        results = [(key, self.evaluate(func, fields, rows)) for key, func, fields in self.assignments]
+
+        changes = {}
+        for key, values in results:
+            if key in INT_FIELDS:
+                new = to_ints(values)
+                if new and not (IntColumn.EMPTY < min(new) and max(new) < 2 ** 63):
+                    raise BulkEditError(f"{key} の計算結果が大きすぎます")
+            elif key in BOOL_FIELDS:
+                new = [to_bool(value) for value in values]
+            else:
+                new = ["" if value is None else str(value) for value in values]
+            old = self.store.get_many(key, rows)
+            changed = [n for n in range(len(rows)) if old[n] != new[n]]
+            if changed:
+                changes[key] = BulkChange(key, [rows[n] for n in changed], [old[n] for n in changed], [new[n] for n in changed])
+
+        # 全列の計算と検証が終わってから書き込む (途中でエラーになっても一部だけ書き換わらない)
+        for key, change in changes.items():
+            self.store.set_many(key, change.rows, change.new)
+        self.columns = {}
+        return changes
@@ -0,0 +1,127 @@
+# --- レコード索引 ---
+
+class RecordIndex:
+    """
+    id / webcd / jan からレコードを O(1) で引くための索引。
+    同じキー値のレコードが複数ある場合は先に追加されたものを返し
+    (従来の next(...) による線形探索と同じ)、後続は控えとして保持する。
+    ストアは data[row] のたびに新しいビューを返すため、レコードは行番号 (.row) で同じものか判定する。
+    """
+    KEYS = ("id", "webcd", "jan")
+
+    def __init__(self, records=(), keys=KEYS):
+        self.keys = tuple(keys)
+        self.maps = {k: {} for k in self.keys}
+        # キー値が重複したレコードの控え {key: {value: [record, ...]}}
+        self.shadowed = {k: {} for k in self.keys}
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.maps[self.keys[0]])
+
+    def get(self, key, value, default=None):
+        return self.maps[key].get(value, default)
+
+    def clear(self):
+        for k in self.keys:
+            self.maps[k].clear()
+            self.shadowed[k].clear()
+
+    def add(self, record):
+        for k in self.keys:
+            self._add_key(k, record.get(k), record)
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def remove(self, record):
+        for k in self.keys:
+            self._remove_key(k, record.get(k), record)
+
+    def rekey(self, record, key, old_value, new_value):
+        """レコードの key 列が old_value から new_value に変わったときに呼ぶ"""
+        if key not in self.maps or old_value == new_value:
+            return
+        self._remove_key(key, old_value, record)
+        self._add_key(key, new_value, record)
+
+    def _add_key(self, key, value, record):
+        if value in (None, ""):
+            return
+        current = self.maps[key].setdefault(value, record)
+        if current.row != record.row:
+            self.shadowed[key].setdefault(value, []).append(record)
+
+    def _remove_key(self, key, value, record):
+        if value in (None, ""):
+            return
+        mapping = self.maps[key]
+        others = self.shadowed[key].get(value)
+        current = mapping.get(value)
+        if current is not None and current.row == record.row:
+            if others:
+                # 控えていた重複レコードを繰り上げる
+                mapping[value] = others.pop(0)
+                if not others:
+                    del self.shadowed[key][value]
+            else:
+                del mapping[value]
+        elif others:
+            for i, other in enumerate(others):
+                if other.row == record.row:
+                    del others[i]
+                    break
+            if not others:
+                del self.shadowed[key][value]
+
+
+# --- 変更 (ダーティ) 管理 ---
+
+class DirtyTracker:
+    """
+    編集で値が実際に変わったレコードとフィールドを id 単位で記録する。
+    保存開始時の seq を覚えておき、保存完了後に clear_through() すれば
+    保存中に行われた編集は未保存のまま残る。
+    """
+    def __init__(self):
+        self.fields = {} # id → 変更されたフィールド名の集合
+        self.changed_at = {} # id → 最後に変更されたときの seq
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, record_id):
+        return record_id in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def mark(self, record_id, field):
+        self.seq += 1
+        self.fields.setdefault(record_id, set()).add(field)
+        self.changed_at[record_id] = self.seq
+
+    def mark_many(self, record_ids, field):
+        """一括編集などで複数のレコードの同じフィールドが変わったときに呼ぶ"""
+        self.seq += 1
+        seq = self.seq
+        fields = self.fields
+        changed_at = self.changed_at
+        for record_id in record_ids:
+            fields.setdefault(record_id, set()).add(field)
+            changed_at[record_id] = seq
+
+    def dirty_fields(self, record_id):
+        return self.fields.get(record_id, set())
+
+    def clear_through(self, seq):
+        """seq 時点までに変更され、その後は変更されていないレコードを保存済みにする"""
+        for record_id in [i for i, at in self.changed_at.items() if at <= seq]:
+            del self.fields[record_id]
+            del self.changed_at[record_id]
+
+    def clear(self):
+        self.fields.clear()
+        self.changed_at.clear()
@@ -0,0 +1,350 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from collections import namedtuple
+
+from column_store import BoolColumn, CategoryColumn, ColumnStore, IntColumn, TextColumn
+from csv_io import CsvLoader
+
+# --- 解析済みカタログのキャッシュ ---
+# 読み込んだCSVを列ストアと検索索引ごとバイナリで保存しておき、
+# 同じファイル (パス・サイズ・更新日時・内容のハッシュが一致) を次に開くときは解析を省く。
+# ハッシュはファイル全体から取る (解析よりずっと速く、更新日時を保ったまま途中だけ書き換えたファイルも見分けられる)。
+
+MAGIC = b"ELTXCAT1"
+FORMAT_VERSION = 3
+CACHE_MAX_BYTES = 1024 * 1024 * 1024 # キャッシュ全体の上限。超えたら最後に使ったのが古いものから消す
+HASH_READ_BYTES = 1024 * 1024 # fingerprint で一度に読むバイト数
+
+# store: ColumnStore / search: restore_search_index() に渡す検索索引の内容
+CatalogSnapshot = namedtuple("CatalogSnapshot", "store search")
+
+
+def default_cache_dir():
+    """キャッシュの保存先 (環境変数 ELTEX_CACHE_DIR で変更できる)"""
+    path = os.environ.get("ELTEX_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "eltex-csv-editor")
+
+
+def fingerprint(path):
+    """
+    ファイルを識別する {path, size, mtime_ns, hash} を返す (hash はファイル全体のハッシュ)。
+    読んでいる間に変更された場合は OSError
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_BYTES), b""):
+            digest.update(block)
+    after = os.stat(path)
+    if (stat.st_size, stat.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+        raise OSError(f"読み込み中にファイルが変更されました: {path}")
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest.hexdigest()}
+
+
+def unchanged(fp):
+    """fingerprint() を取った後にファイルのサイズ・更新日時が変わっていないか"""
+    try:
+        stat = os.stat(fp["path"])
+    except OSError:
+        return False
+    return (stat.st_size, stat.st_mtime_ns) == (fp["size"], fp["mtime_ns"])
+
+
+def pack_strings(strings):
+    """文字列のリストを (連結したUTF-8, 各文字列のバイト長) にする"""
+    encoded = [text.encode("utf-8", "surrogatepass") for text in strings]
+    return b"".join(encoded), array("I", map(len, encoded))
+
+
+def unpack_strings(buffer, lengths):
+    strings = []
+    pos = 0
+    for length in lengths:
+        strings.append(str(buffer[pos:pos + length], "utf-8", "surrogatepass"))
+        pos += length
+    return strings
+
+
+# --- 取り込み (UIスレッド) ---
+# ストアと索引はUIスレッドが書き換えるため、UIスレッドで複製してからワーカーで書き出す
+
+def capture_column(column):
+    if isinstance(column, IntColumn):
+        return ("int", array("q", column.values), dict(column.overflow))
+    if isinstance(column, BoolColumn):
+        return ("bool", array("b", column.values))
+    if isinstance(column, CategoryColumn):
+        return ("category", array(column.codes.typecode, column.codes), list(column.categories))
+    return ("text", bytes(column.buffer), array("Q", column.starts), array("I", column.lengths))
+
+
+def capture(store, search_index):
+    """store と検索索引の内容を複製する (以降の編集の影響を受けない)"""
+    columns = {key: capture_column(column) for key, column in store.columns.items()}
+    search = {
+        "indexed": search_index.indexed,
+        "prefix": {key: (list(index.keys), array("I", index.rows)) for key, index in search_index.prefix.items()},
+        "postings": {gram: array("I", rows) for gram, rows in search_index.text.postings.items()},
+    }
+    return columns, search
+
+
+def restore_search_index(search_index, search):
+    """CatalogSnapshot.search の内容を検索索引に戻す"""
+    for key, (keys, rows) in search["prefix"].items():
+        search_index.prefix[key].keys = keys
+        search_index.prefix[key].rows = rows
+    search_index.text.postings = search["postings"]
+    search_index.indexed = search["indexed"]
+
+
+# --- ファイル形式 ---
+# MAGIC, ヘッダー長 (8バイト), ヘッダー (JSON), 配列・バイト列を順に連結したもの
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+        self.blobs = [] # [型コード (バイト列は "bytes"), バイト数]
+
+    def add(self, data):
+        self.parts.append(data)
+        if isinstance(data, array):
+            self.blobs.append([data.typecode, data.itemsize * len(data)])
+        else:
+            self.blobs.append(["bytes", len(data)])
+        return len(self.blobs) - 1
+
+    def add_strings(self, strings):
+        buffer, lengths = pack_strings(strings)
+        return [self.add(buffer), self.add(lengths)]
+
+
+class _Reader:
+    def __init__(self, data, blobs, start):
+        self.data = memoryview(data)
+        self.blobs = []
+        for typecode, size in blobs:
+            self.blobs.append((typecode, start, size))
+            start += size
+        if start != len(data):
+            raise ValueError("キャッシュファイルが途中で切れています")
+
+    def get(self, n):
+        typecode, start, size = self.blobs[n]
+        chunk = self.data[start:start + size]
+        if typecode == "bytes":
+            return chunk
+        values = array(typecode)
+        values.frombytes(chunk)
+        return values
+
+    def get_strings(self, refs):
+        return unpack_strings(self.get(refs[0]), self.get(refs[1]))
+
+
+def encode(fp, columns, search):
+    """capture() の内容を書き出すバイト列のリストにする (ワーカースレッドで呼ぶ)"""
+    writer = _Writer()
+    described = {}
+    for key, (kind, *parts) in columns.items():
+        if kind == "int":
+            values, overflow = parts
+            described[key] = [kind, writer.add(values), writer.add(array("Q", overflow)), writer.add_strings(overflow.values())]
+        elif kind == "bool":
+            described[key] = [kind, writer.add(parts[0])]
+        elif kind == "category":
+            codes, categories = parts
+            described[key] = [kind, writer.add(codes), writer.add_strings(categories)]
+        else:
+            described[key] = [kind] + [writer.add(part) for part in parts]
+    prefix = {key: [writer.add_strings(keys), writer.add(rows)] for key, (keys, rows) in search["prefix"].items()}
+    grams = list(search["postings"])
+    postings = [search["postings"][gram] for gram in grams]
+    counts = array("I", map(len, postings))
+    rows = array("I")
+    for posting in postings:
+        rows.extend(posting)
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "fingerprint": fp,
+        "columns": described,
+        "search": {
+            "indexed": search["indexed"],
+            "prefix": prefix,
+            "grams": writer.add_strings(grams),
+            "counts": writer.add(counts),
+            "rows": writer.add(rows),
+        },
+        "blobs": writer.blobs,
+    }
+    encoded = json.dumps(header).encode("utf-8")
+    return [MAGIC, len(encoded).to_bytes(8, "little"), encoded] + writer.parts
+
+
+def decode(data, fp):
+    """キャッシュファイルの内容から CatalogSnapshot を作る。fingerprint が一致しなければ None"""
+    if data[:len(MAGIC)] != MAGIC:
+        return None
+    start = len(MAGIC) + 8
+    header_len = int.from_bytes(data[len(MAGIC):start], "little")
+    header = json.loads(bytes(data[start:start + header_len]))
+    if header.get("version") != FORMAT_VERSION or header.get("byteorder") != sys.byteorder or header.get("fingerprint") != fp:
+        return None
+    reader = _Reader(data, header["blobs"], start + header_len)
+
+    store = ColumnStore()
+    for key, (kind, *refs) in header["columns"].items():
+        column = store.columns[key]
+        if kind == "int":
+            column.values = reader.get(refs[0])
+            column.overflow = dict(zip(reader.get(refs[1]), reader.get_strings(refs[2])))
+        elif kind == "bool":
+            column.values = reader.get(refs[0])
+        elif kind == "category":
+            column.codes = reader.get(refs[0])
+            column.categories = reader.get_strings(refs[1])
+            column.lookup = {text: code for code, text in enumerate(column.categories)}
+        else:
+            column.buffer = bytearray(reader.get(refs[0]))
+            column.starts = reader.get(refs[1])
+            column.lengths = reader.get(refs[2])
+            column.garbage = len(column.buffer) - sum(column.lengths)
+    if len({len(column) for column in store.columns.values()}) > 1:
+        raise ValueError("キャッシュの列の行数が揃っていません")
+
+    search = header["search"]
+    grams = reader.get_strings(search["grams"])
+    all_rows = reader.get(search["rows"])
+    postings = {}
+    pos = 0
+    for gram, count in zip(grams, reader.get(search["counts"])):
+        postings[gram] = all_rows[pos:pos + count]
+        pos += count
+    prefix = {key: (reader.get_strings(keys), reader.get(rows)) for key, (keys, rows) in search["prefix"].items()}
+    return CatalogSnapshot(store, {"indexed": search["indexed"], "prefix": prefix, "postings": postings})
+
+
+class CatalogCache:
+    """
+    解析済みカタログのキャッシュ (1ファイル = 1エントリ)。
+    エントリはCSVのパスごとに1つで、ファイルが更新されると次の保存で置き換わる。
+    合計が max_bytes を超えたら最後に使った日時 (エントリの更新日時) が古いものから削除する。
+    """
+    def __init__(self, directory=None, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock() # 書き出しとエントリの削除が重ならないようにする
+
+    def entry_path(self, path):
+        name = hashlib.blake2b(os.path.abspath(path).encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + ".cache")
+
+    def load(self, fp):
+        """fp と一致するキャッシュがあれば CatalogSnapshot を、なければ None を返す (ワーカースレッドで呼ぶ)"""
+        entry = self.entry_path(fp["path"])
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            snapshot = decode(data, fp)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Error reading catalog cache {entry}: {e}")
+            snapshot = None
+        if snapshot is None:
+            return None
+        try:
+            os.utime(entry) # 最後に使った日時として記録する (LRU)
+        except OSError:
+            pass
+        return snapshot
+
+    def save(self, fp, columns, search):
+        """capture() の内容を書き出す (ワーカースレッドで呼ぶ)"""
+        parts = encode(fp, columns, search)
+        size = sum(len(part) if not isinstance(part, array) else part.itemsize * len(part) for part in parts)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = self.entry_path(fp["path"])
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+            try:
+                with open(fd, "wb") as f:
+                    for part in parts:
+                        f.write(part)
+                os.replace(tmp_path, entry)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self.evict(keep=entry)
+
+    def save_async(self, fp, columns, search):
+        """save() をワーカースレッドで実行する (失敗してもキャッシュを作らないだけで、読み込みには影響しない)"""
+        def run():
+            try:
+                if unchanged(fp):
+                    self.save(fp, columns, search)
+            except Exception as e:
+                print(f"Error writing catalog cache: {e}")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def evict(self, keep=None):
+        """合計サイズが上限を超えていれば、最後に使ったのが古いエントリから削除する"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".cache"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class CachedCsvLoader(CsvLoader):
+    """
+    キャッシュを使う CsvLoader。ファイルの fingerprint がキャッシュと一致すれば
+    CSVを解析せずに snapshot (CatalogSnapshot) を用意して完了する。
+    一致しなければ CsvLoader と同じくチャンクを返し、UI側は読み込み後に CatalogCache.save_async() で保存する。
+    """
+    def __init__(self, path, cache, **kwargs):
+        super().__init__(path, **kwargs)
+        self.cache = cache
+        self.fingerprint = None
+        self.snapshot = None
+
+    def run(self):
+        try:
+            self.fingerprint = fingerprint(self.path)
+            self.snapshot = self.cache.load(self.fingerprint)
+        except Exception as e:
+            # キャッシュが使えなくても通常どおり読み込む (ファイル自体のエラーは CsvLoader で報告される)
+            print(f"Catalog cache unavailable for {self.path}: {e}")
+        if self.snapshot is not None:
+            self.finished = True
+            return
+        super().run()
@@ -0,0 +1,376 @@
+"""
+商品CSVの差分と3方向マージ (GUIなし。エディタの「差分取り込み」からも使う)。
+
+2つのCSVをキー (id または webcd) で突き合わせ、追加・削除・変更された商品と、変更されたフィールドを求める。
+比較前のCSV (base) はキー → 行のハッシュだけを保持し、比較後のCSV (incoming) は1行ずつ読んで照合する。
+照合は辞書の参照だけなので、手間は行数に比例する (50万行でも数秒)。
+フィールド単位の差分は、ハッシュが異なった行についてだけ base をもう一度読んで求める。
+
+    python catalog_diff.py old.csv new.csv --report diff.csv
+    python catalog_diff.py base.csv supplier.csv --local edited.csv -o merged.csv --report conflicts.csv
+
+終了コード: 0 = 差分・競合なし / 1 = 差分 (--local のときは競合) あり / 2 = 引数・ファイルの誤り
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from operator import itemgetter
+
+from csv_io import BOOL_FIELDS, FIELDS, format_bool
+
+KEY_FIELDS = ("id", "webcd") # 突き合わせに使える列
+BOOL_POSITIONS = tuple(FIELDS.index(key) for key in BOOL_FIELDS)
+PROGRESS_ROWS = 10000 # この行数ごとに progress を呼ぶ
+REMOVED_FIELD = "(削除)" # 行の削除どうし・削除と変更の競合を表すフィールド名
+
+# 3方向マージの競合。ローカルの値を残し、base / local / incoming の値を報告する
+Conflict = namedtuple("Conflict", "key field base local incoming")
+
+
+def read_rows(path, key="id", encoding="utf-8-sig", progress=None):
+    """
+    CSV を1行ずつ読み、(キー, FIELDS 順の値のタプル) を返す。
+    フラグの列は 0 / 1 に正規化する (表記の違いを差分にしない)。キーが空欄の行はキーを "" として返す。
+    """
+    key_position = FIELDS.index(key)
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        width = len(header)
+        # ヘッダーにない列は、行の末尾に足した空欄の位置から取り出す
+        getter = itemgetter(*(header.index(k) if k in header else width for k in FIELDS))
+        for n, row in enumerate(reader, 1):
+            if len(row) == width:
+                row.append("")
+            else:
+                row = (row + [""] * width)[:width] + [""] # 列が足りない・多すぎる行
+            values = getter(row)
+            if any(values[p] not in ("0", "1") for p in BOOL_POSITIONS):
+                values = list(values)
+                for p in BOOL_POSITIONS:
+                    values[p] = format_bool(values[p])
+                values = tuple(values)
+            if progress and n % PROGRESS_ROWS == 0:
+                progress(n)
+            yield values[key_position], values
+
+
+class CatalogDiff:
+    """
+    base → incoming の差分。
+    added は {キー: 値のタプル}、removed は base の順のキーのリスト、
+    changed は {キー: {フィールド: (base の値, incoming の値)}}。
+    キーは一意である前提で、同じキーの行が複数ある場合の結果は保証しない。
+    キーが空欄の行は突き合わせられないため、数 (unkeyed) だけを数える。
+    """
+    def __init__(self, key):
+        self.key = key
+        self.added = {}
+        self.removed = []
+        self.changed = {}
+        self.unchanged = 0
+        self.unkeyed = 0 # incoming のキーが空欄の行
+        self.seconds = None
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def summary(self):
+        return f"追加 {len(self.added)}件 / 削除 {len(self.removed)}件 / 変更 {len(self.changed)}件 / 変更なし {self.unchanged}件"
+
+    def report_rows(self):
+        """差分を (キー, 種類, フィールド, 変更前, 変更後) の行として返す (レポートのCSV用)"""
+        for key in self.added:
+            yield key, "added", "", "", ""
+        for key in self.removed:
+            yield key, "removed", "", "", ""
+        for key, fields in self.changed.items():
+            for field, (old, new) in fields.items():
+                yield key, "changed", field, old, new
+
+
+def diff_files(base_path, incoming_path, key="id", encoding="utf-8-sig", progress=None):
+    """
+    2つのCSVの差分 (CatalogDiff) を求める。
+    progress を渡すと、読んだ行数 (base → incoming → base の2回目の通算) を PROGRESS_ROWS 行ごとに渡して呼ぶ。
+    """
+    if key not in KEY_FIELDS:
+        raise ValueError(f"キーにできない列です: {key}")
+    started = time.perf_counter()
+
+    def tick(offset):
+        return (lambda n: progress(offset + n)) if progress else None
+
+    # 1. base: キー → 行のハッシュ (同じプロセスの中でだけ比べるため hash() で足りる)
+    digests = {}
+    base_rows = 0
+    for record_key, values in read_rows(base_path, key, encoding, tick(0)):
+        base_rows += 1
+        if record_key:
+            digests[record_key] = hash(values)
+
+    # 2. incoming: ハッシュを照合する。変わった行は incoming の値を一時的に残す
+    diff = CatalogDiff(key)
+    pending = {}
+    incoming_rows = 0
+    for record_key, values in read_rows(incoming_path, key, encoding, tick(base_rows)):
+        incoming_rows += 1
+        if not record_key:
+            diff.unkeyed += 1
+            continue
+        digest = digests.pop(record_key, None)
+        if digest is None:
+            diff.added[record_key] = values
+        elif digest == hash(values):
+            diff.unchanged += 1
+        else:
+            pending[record_key] = values
+    diff.removed = list(digests) # 照合されずに残ったキー (辞書は base の順を保っている)
+    del digests
+
+    # 3. base の2回目: 変わった行のフィールドの差分を求める (変わった行がすべて見つかったら読むのをやめる)
+    if pending:
+        for record_key, values in read_rows(base_path, key, encoding, tick(base_rows + incoming_rows)):
+            new = pending.pop(record_key, None)
+            if new is not None:
+                fields = {field: (old, value) for field, old, value in zip(FIELDS, values, new) if old != value}
+                if fields:
+                    diff.changed[record_key] = fields
+                else:
+                    diff.unchanged += 1 # ハッシュの衝突 (実際には変わっていない)
+                if not pending:
+                    break
+    diff.seconds = time.perf_counter() - started
+    return diff
+
+
+class DiffWorker(threading.Thread):
+    """
+    diff_files() をワーカースレッドで実行する (エディタの差分取り込み用)。
+    UI は finished になるまで after() で待ち、diff (または error) を受け取る。
+    """
+    def __init__(self, base_path, incoming_path, key="id", encoding="utf-8-sig"):
+        super().__init__(daemon=True)
+        self.base_path = base_path
+        self.incoming_path = incoming_path
+        self.key = key
+        self.encoding = encoding
+        self.rows = 0 # 読んだ行数 (進捗の表示用)
+        self.diff = None
+        self.error = None
+        self.stopped = False
+        self.finished = False
+
+    def run(self):
+        try:
+            self.diff = diff_files(self.base_path, self.incoming_path, self.key, self.encoding, self.progress)
+        except InterruptedError:
+            pass
+        except (OSError, UnicodeError, csv.Error, ValueError) as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def progress(self, rows):
+        self.rows = rows
+        if self.stopped:
+            raise InterruptedError("差分の計算を中止しました")
+
+    def stop(self):
+        self.stopped = True
+
+
+def local_value(value):
+    """ストアの値 (RowView の値) を CSV と同じ表記にする"""
+    if isinstance(value, bool):
+        return format_bool(value)
+    return "" if value is None else str(value)
+
+
+def merge_plan(diff, local):
+    """
+    base → incoming の差分 diff とローカルの編集から、3方向マージの結果を求める。
+    local(キー) は (ローカルのレコード, 未保存のフィールドの集合) を返す (レコードがなければ (None, ()))。
+    未保存のフィールドはローカルの値を残し、incoming の値と異なれば競合として報告する。
+    それ以外のフィールドは incoming の値を取り込む。
+    戻り値は (取り込む値 {キー: {フィールド: 値}}, 追加する行 [値のタプル], 競合 [Conflict])。
+    削除された行は取り込まない (diff.removed を報告する)。
+    """
+    updates = {}
+    added = []
+    conflicts = []
+
+    def merge_record(record_key, record, edited, fields):
+        values = {}
+        for field, (old, new) in fields.items():
+            current = local_value(record.get(field))
+            if current == new:
+                continue
+            if field in edited:
+                conflicts.append(Conflict(record_key, field, old, current, new))
+            else:
+                values[field] = new
+        if values:
+            updates[record_key] = values
+
+    for record_key, fields in diff.changed.items():
+        record, edited = local(record_key)
+        if record is None:
+            # ローカルで id / webcd を書き換えたなどで見つからない
+            conflicts.append(Conflict(record_key, REMOVED_FIELD, "", "(なし)", "(変更)"))
+            continue
+        merge_record(record_key, record, edited, fields)
+    for record_key, values in diff.added.items():
+        record, edited = local(record_key)
+        if record is None:
+            added.append(values)
+        else:
+            # 前回の取り込みで追加済みの行など: 追加ではなく変更として扱う
+            merge_record(record_key, record, edited, {field: ("", value) for field, value in zip(FIELDS, values)})
+    return updates, added, conflicts
+
+
+def merge_files(base_path, local_path, incoming_path, output, key="id", encoding="utf-8-sig", progress=None):
+    """
+    base を共通の祖先として local と incoming を3方向マージし、output (書き込み用のファイル) に書き出す。
+    行は base の順に1行ずつ書き、local → incoming で追加された行を末尾に足す。
+    キーが空欄の行は突き合わせられないため、local の行をそのまま末尾に残す。
+    両方で同じフィールドを異なる値に変えた場合と、一方で削除して他方で変更した場合は local を優先し、
+    競合のリスト [Conflict] を返す。
+    """
+    local = diff_files(base_path, local_path, key, encoding, progress)
+    incoming = diff_files(base_path, incoming_path, key, encoding, progress)
+    local_removed = set(local.removed)
+    incoming_removed = set(incoming.removed)
+    conflicts = []
+    writer = csv.writer(output)
+    writer.writerow(FIELDS)
+    for record_key, values in read_rows(base_path, key, encoding):
+        if not record_key:
+            continue
+        local_fields = local.changed.get(record_key, {})
+        incoming_fields = incoming.changed.get(record_key, {})
+        if record_key in local_removed:
+            if incoming_fields:
+                conflicts.append(Conflict(record_key, REMOVED_FIELD, "", "(削除)", "(変更)"))
+            continue
+        if record_key in incoming_removed:
+            if not local_fields:
+                continue
+            conflicts.append(Conflict(record_key, REMOVED_FIELD, "", "(変更)", "(削除)"))
+        row = list(values)
+        for position, field in enumerate(FIELDS):
+            change = local_fields.get(field)
+            other = incoming_fields.get(field)
+            if change and other and change[1] != other[1]:
+                conflicts.append(Conflict(record_key, field, change[0], change[1], other[1]))
+            if change:
+                row[position] = change[1]
+            elif other:
+                row[position] = other[1]
+        writer.writerow(row)
+    for record_key, values in local.added.items():
+        other = incoming.added.get(record_key)
+        if other is not None:
+            conflicts.extend(
+                Conflict(record_key, field, "", mine, theirs)
+                for field, mine, theirs in zip(FIELDS, values, other) if mine != theirs
+            )
+        writer.writerow(values)
+    writer.writerows(values for record_key, values in incoming.added.items() if record_key not in local.added)
+    if local.unkeyed:
+        writer.writerows(values for record_key, values in read_rows(local_path, key, encoding) if not record_key)
+    return conflicts
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="商品CSVの差分・3方向マージ")
+    parser.add_argument("base", help="比較前 (3方向マージでは共通の祖先) のCSV")
+    parser.add_argument("incoming", help="比較後 (取り込む側) のCSV")
+    parser.add_argument("--local", help="base を編集したCSV。指定すると incoming と3方向マージする")
+    parser.add_argument("-o", "--output", help="マージ結果のCSV (--local と一緒に指定する。- で標準出力)")
+    parser.add_argument("--report", help="差分 (--local のときは競合) を書き出すCSV (- で標準出力)")
+    parser.add_argument("--key", default="id", choices=KEY_FIELDS, help="商品を突き合わせる列 (既定: id)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="入力の文字コード (既定: utf-8-sig)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="集計を表示しない")
+    args = parser.parse_args(argv)
+    if args.output and not args.local:
+        parser.error("-o は --local と一緒に指定してください")
+    return args
+
+
+def open_output(path):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def write_report(path, header, rows):
+    f = open_output(path)
+    try:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        f.flush()
+        f.detach() if path == "-" else f.close()
+
+
+def run(args):
+    started = time.perf_counter()
+    if not args.local:
+        diff = diff_files(args.base, args.incoming, args.key, args.encoding)
+        if args.report:
+            write_report(args.report, ("key", "status", "field", "old", "new"), diff.report_rows())
+        if not args.quiet:
+            print(f"{diff.summary()} ({diff.seconds:.1f}秒)", file=sys.stderr)
+        return 1 if len(diff) else 0
+
+    output = None
+    tmp_path = None
+    if args.output == "-":
+        output = open_output("-")
+    elif args.output:
+        # 一時ファイルに書き切ってから置き換える (途中で失敗しても既存のファイルは壊れない)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(args.output)), prefix=".", suffix=".tmp")
+        output = open(fd, "w", newline="", encoding="utf-8")
+    else:
+        output = open(os.devnull, "w", newline="", encoding="utf-8")
+    try:
+        conflicts = merge_files(args.base, args.local, args.incoming, output, args.key, args.encoding)
+    except BaseException:
+        output.close()
+        if tmp_path:
+            os.remove(tmp_path)
+        raise
+    if args.output == "-":
+        output.flush()
+        output.detach()
+    else:
+        output.close()
+        if tmp_path:
+            os.replace(tmp_path, args.output)
+    if args.report:
+        write_report(args.report, Conflict._fields, conflicts)
+    if not args.quiet:
+        print(f"マージしました: 競合 {len(conflicts)}件 ({time.perf_counter() - started:.1f}秒)", file=sys.stderr)
+    return 1 if conflicts else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        return run(args)
+    except (OSError, UnicodeError, csv.Error) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+商品CSVの一括処理 (GUIなし)。夜間バッチなどで 読み込み → 一括変換 → 検証 → 書き出し を行う。
+
+エディタと同じ列 (csv_io.FIELDS) ・一括編集の式 (bulk_edit) ・検証 (validate) を使う。
+Tk / PIL は import しない。行は --chunk-size 行ずつ読み込んで処理するため、
+ファイルの大きさによらずメモリの使用量は一定で、パイプラインの途中にも置ける。
+
+    python cli.py catalog.csv --filter "rank == 'C'" --set "selling_price = round(cost_price * 1.3, -1)" -o out.csv
+    python cli.py catalog.csv --issues issues.csv --strict
+    zcat catalog.csv.gz | python cli.py - --set "is_sale = True" -o - | gzip > out.csv.gz
+
+終了コード: 0 = 正常 / 1 = --strict で検証の問題があった / 2 = 引数・式・ファイルの誤り
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+
+from bulk_edit import BulkEdit, BulkEditError
+from column_store import ColumnStore
+from csv_io import FIELDS, CsvExporter, item_to_row, read_csv_chunks
+from validate import extract, validate_batch
+
+CHUNK_SIZE = 5000
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="商品CSVの一括変換・検証・書き出し (GUIなし)")
+    parser.add_argument("input", help="入力CSV (- で標準入力)")
+    parser.add_argument("-o", "--output", help="出力CSV (- で標準出力)。省略すると書き出さない")
+    parser.add_argument("--filter", default="", help="変換する行の条件 (一括編集と同じ書き方。省略すると全件)")
+    parser.add_argument("--set", action="append", default=[], metavar="EXPR", help="変換内容「列名 = 式」 (複数指定できる)")
+    parser.add_argument("--no-validate", action="store_true", help="検証しない")
+    parser.add_argument("--issues", help="検証で見つかった問題を書き出すCSV (- で標準出力)")
+    parser.add_argument("--strict", action="store_true", help="検証で問題があれば終了コード 1 で終わる")
+    parser.add_argument("--input-encoding", default="utf-8-sig", help="入力の文字コード (既定: utf-8-sig)")
+    parser.add_argument("--encoding", default="utf-8", help="出力の文字コード (既定: utf-8。cp932 / utf-8-sig など)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"一度に処理する行数 (既定: {CHUNK_SIZE})")
+    parser.add_argument("-q", "--quiet", action="store_true", help="経過と集計を表示しない")
+    args = parser.parse_args(argv)
+    if args.filter and not args.set:
+        parser.error("--filter は --set と一緒に指定してください (--filter は変換する行を選ぶ条件です)")
+    return args
+
+
+def open_text(path, mode, encoding):
+    """- なら標準入出力を指定の文字コードで開き直す"""
+    if path != "-":
+        return open(path, mode, newline="", encoding=encoding)
+    stream = sys.stdin if "r" in mode else sys.stdout
+    return io.TextIOWrapper(stream.buffer, encoding=encoding, newline="", write_through="w" in mode)
+
+
+class StreamWriter:
+    """標準出力への書き出し (CsvExporter と同じ feed() / close() で使う)"""
+    def __init__(self, encoding):
+        self.file = open_text("-", "w", encoding)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+        self.written = 0
+        self.error = None
+
+    def feed(self, items):
+        self.writer.writerows(item_to_row(item) for item in items)
+        self.written += len(items)
+
+    def close(self):
+        self.file.flush()
+        self.file.detach() # sys.stdout を閉じない
+
+
+def feed(writer, items):
+    if isinstance(writer, CsvExporter):
+        # 書き出しが追いつくまで待つ (書き出しに失敗して止まっていたら待たない)
+        while not writer.ready():
+            if writer.finished:
+                raise OSError(f"書き出しに失敗しました: {writer.error}")
+            time.sleep(0.01)
+    writer.feed(items)
+
+
+def log(args, message):
+    if not args.quiet:
+        print(message, file=sys.stderr)
+
+
+def run(args):
+    # 式は最初に1回だけ解析する (誤りがあれば読み込みを始める前に終了する)
+    edit = BulkEdit(ColumnStore(), args.filter, "\n".join(args.set)) if args.set else None
+    validate = not args.no_validate
+    writer = None
+    if args.output == "-":
+        writer = StreamWriter(args.encoding)
+    elif args.output:
+        # 一時ファイルに書き切ってから置き換える (途中で失敗しても既存のファイルは壊れない)
+        writer = CsvExporter(args.output, 0, args.encoding)
+        writer.start()
+    issues_file = issues_writer = None
+    if args.issues:
+        issues_file = open_text(args.issues, "w", "utf-8-sig" if args.issues != "-" else "utf-8")
+        issues_writer = csv.writer(issues_file)
+        issues_writer.writerow(("row", "id", "field", "message"))
+
+    started = time.perf_counter()
+    total = 0
+    changed = {}
+    issue_count = 0
+    issue_fields = {}
+    completed = False
+    try:
+        with open_text(args.input, "r", args.input_encoding) as f:
+            for chunk in read_csv_chunks(f, args.chunk_size):
+                store = ColumnStore(chunk)
+                if edit:
+                    edit.store = store
+                    for key, change in edit.apply().items():
+                        changed[key] = changed.get(key, 0) + len(change)
+                if validate:
+                    rows = range(len(store))
+                    for issue in validate_batch(rows, extract(store, rows)):
+                        issue_count += 1
+                        issue_fields[issue.field] = issue_fields.get(issue.field, 0) + 1
+                        if issues_writer:
+                            # 行番号はデータ行の1始まり (ヘッダー行を除く)
+                            issues_writer.writerow((total + issue.row + 1, issue.id, issue.field, issue.message))
+                if writer:
+                    feed(writer, store[:])
+                total += len(store)
+                log(args, f"{total}件 処理しました ({time.perf_counter() - started:.1f}秒)")
+        completed = True
+    finally:
+        if isinstance(writer, CsvExporter):
+            if completed and not writer.finished:
+                writer.close()
+            elif not writer.finished:
+                writer.abort() # 途中で失敗した場合は出力先を書き換えない
+            writer.join()
+        elif writer:
+            writer.close()
+        if issues_file:
+            issues_file.flush()
+            if args.issues == "-":
+                issues_file.detach()
+            else:
+                issues_file.close()
+    if writer and writer.error:
+        raise OSError(f"書き出しに失敗しました: {writer.error}")
+
+    log(args, f"完了: {total}件 ({time.perf_counter() - started:.1f}秒)")
+    for key, count in changed.items():
+        log(args, f"  変更 {key}: {count}件")
+    if validate:
+        log(args, f"  検証の問題: {issue_count}件" + "".join(f" / {key} {count}件" for key, count in issue_fields.items()))
+    return 1 if args.strict and issue_count else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        return run(args)
+    except BulkEditError as e:
+        print(f"式の誤り: {e}", file=sys.stderr)
+    except (OSError, UnicodeError, csv.Error) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,409 @@
+import sys
+from array import array
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+
+from catalog import RecordIndex
+from csv_io import BOOL_FIELDS, FIELDS, parse_bool, parse_number
+from schema import CATEGORY, INT, keys_of
+from search import SearchIndex
+
+# --- 列の種類 (schema.SCHEMA の型で決まる) ---
+# 数値列: 64bit整数の配列で保持 (整数として表せない値は文字列のまま別保持)
+INT_FIELDS = keys_of(INT)
+# 低カーディナリティ列: 文字列を1回だけ保持し、各行はコード番号だけを持つ
+CATEGORY_FIELDS = keys_of(CATEGORY)
+# 残りはテキスト列 (列ごとの共有バッファに UTF-8 で連結)
+TEXT_FIELDS = tuple(k for k in FIELDS if k not in INT_FIELDS + CATEGORY_FIELDS + BOOL_FIELDS)
+
+
+def canonical_int(text):
+    """text が整数をそのまま表した文字列 ("1980" など) ならその整数を、そうでなければ None を返す"""
+    try:
+        number = int(text)
+    except ValueError:
+        return None
+    if str(number) == text and IntColumn.EMPTY < number < 2 ** 63:
+        return number
+    return None
+
+
+def column_value(key, value):
+    """
+    CSVと同じ表記の値を get_many() が返す形にする (数値列の整数の表記は int、フラグは bool、それ以外は文字列)。
+    外から届いた値を get_many() の値と比べてから set_many() に渡すときに使う。
+    """
+    if key in BOOL_FIELDS:
+        return parse_bool(value)
+    if key in INT_FIELDS and type(value) is int:
+        return value
+    text = "" if value is None else str(value)
+    if key in INT_FIELDS and text:
+        number = canonical_int(text)
+        if number is not None:
+            return number
+    return text
+
+
+class IntColumn:
+    EMPTY = -2 ** 63 # 空文字列を表す番兵
+
+    def __init__(self):
+        self.values = array("q")
+        # 整数に正規化できない値 ("1,980" や "05" など) は元の文字列を保持して往復を保証する
+        self.overflow = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, row, value):
+        text = "" if value is None else str(value)
+        try:
+            number = int(text) if text else self.EMPTY
+        except ValueError:
+            number = None
+        if not text or (number is not None and str(number) == text and self.EMPTY < number < 2 ** 63):
+            self.overflow.pop(row, None)
+            return number
+        self.overflow[row] = text
+        return 0
+
+    def append(self, value):
+        self.values.append(self.encode(len(self.values), value))
+
+    def get(self, row):
+        if self.overflow and row in self.overflow:
+            return self.overflow[row]
+        number = self.values[row]
+        return "" if number == self.EMPTY else str(number)
+
+    def set(self, row, value):
+        self.values[row] = self.encode(row, value)
+
+    def get_many(self, rows):
+        """rows の各行の値を返す (set_many() にそのまま渡せるよう、数値は int のまま返す)"""
+        empty = self.EMPTY
+        data = self.values
+        values = [("" if value == empty else value) for value in map(data.__getitem__, rows)]
+        if self.overflow:
+            overflow = self.overflow
+            for n, row in enumerate(rows):
+                if row in overflow:
+                    values[n] = overflow[row]
+        return values
+
+    def set_many(self, rows, values):
+        """rows の各行に values をまとめて書き込む (範囲内の int はそのまま格納する)"""
+        data = self.values
+        if self.overflow:
+            rowset = set(rows)
+            for row in [row for row in self.overflow if row in rowset]:
+                del self.overflow[row]
+        if all(type(value) is int for value in values) and (not values or self.EMPTY < min(values) and max(values) < 2 ** 63):
+            for row, value in zip(rows, values):
+                data[row] = value
+            return
+        for row, value in zip(rows, values):
+            data[row] = self.encode(row, value)
+
+    def typed_values(self):
+        """全行を数値のリストで返す (空欄や数値として読めない値は None)"""
+        empty = self.EMPTY
+        numbers = [None if value == empty else value for value in self.values]
+        for row, text in self.overflow.items():
+            numbers[row] = parse_number(text)
+        return numbers
+
+    def clear(self):
+        self.values = array("q")
+        self.overflow.clear()
+
+    def nbytes(self):
+        return self.values.itemsize * len(self.values)
+
+
+class BoolColumn:
+    def __init__(self):
+        self.values = array("b")
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        self.values.append(parse_bool(value))
+
+    def get(self, row):
+        return bool(self.values[row])
+
+    def set(self, row, value):
+        self.values[row] = parse_bool(value)
+
+    def get_many(self, rows):
+        return [value == 1 for value in map(self.values.__getitem__, rows)]
+
+    def set_many(self, rows, values):
+        data = self.values
+        for row, value in zip(rows, values):
+            data[row] = parse_bool(value)
+
+    def typed_values(self):
+        return [value == 1 for value in self.values]
+
+    def clear(self):
+        self.values = array("b")
+
+    def nbytes(self):
+        return len(self.values)
+
+
+class CategoryColumn:
+    def __init__(self):
+        self.codes = array("H")
+        self.categories = [] # コード番号 → 文字列
+        self.lookup = {} # 文字列 → コード番号
+
+    def __len__(self):
+        return len(self.codes)
+
+    def encode(self, value):
+        text = sys.intern(str(value))
+        code = self.lookup.get(text)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(text)
+            self.lookup[text] = code
+            if code > 0xFFFF and self.codes.typecode == "H":
+                # 想定外に種類が多い列は32bitコードに切り替える
+                self.codes = array("I", self.codes)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def get(self, row):
+        return self.categories[self.codes[row]]
+
+    def set(self, row, value):
+        self.codes[row] = self.encode(value)
+
+    def get_many(self, rows):
+        categories = self.categories
+        return [categories[code] for code in map(self.codes.__getitem__, rows)]
+
+    def set_many(self, rows, values):
+        for row, value in zip(rows, values):
+            self.codes[row] = self.encode(value)
+
+    def typed_values(self):
+        categories = self.categories
+        return [categories[code] for code in self.codes]
+
+    def clear(self):
+        self.codes = array("H")
+        self.categories = []
+        self.lookup = {}
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+
+class TextColumn:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.starts = array("Q")
+        self.lengths = array("I")
+        self.garbage = 0 # 書き換えで参照されなくなったバイト数
+
+    def __len__(self):
+        return len(self.starts)
+
+    def append(self, value):
+        data = str(value).encode("utf-8")
+        self.starts.append(len(self.buffer))
+        self.lengths.append(len(data))
+        self.buffer += data
+
+    def get(self, row):
+        start = self.starts[row]
+        return self.buffer[start:start + self.lengths[row]].decode("utf-8")
+
+    def set(self, row, value):
+        data = str(value).encode("utf-8")
+        old_len = self.lengths[row]
+        if len(data) <= old_len:
+            # 元の領域に収まる場合は上書きする
+            start = self.starts[row]
+            self.buffer[start:start + len(data)] = data
+            self.garbage += old_len - len(data)
+        else:
+            self.starts[row] = len(self.buffer)
+            self.buffer += data
+            self.garbage += old_len
+        self.lengths[row] = len(data)
+        if self.garbage > (1 << 20) and self.garbage > len(self.buffer) // 2:
+            self.compact()
+
+    def get_many(self, rows):
+        buffer = self.buffer
+        starts = self.starts
+        lengths = self.lengths
+        return [str(buffer[starts[row]:starts[row] + lengths[row]], "utf-8") for row in rows]
+
+    def set_many(self, rows, values):
+        for row, value in zip(rows, values):
+            self.set(row, value)
+
+    def typed_values(self):
+        buffer = self.buffer
+        return [str(buffer[start:start + length], "utf-8") for start, length in zip(self.starts, self.lengths)]
+
+    def compact(self):
+        """書き換えで生じた未使用領域を詰める"""
+        buffer = bytearray()
+        starts = array("Q")
+        for row, start in enumerate(self.starts):
+            starts.append(len(buffer))
+            buffer += self.buffer[start:start + self.lengths[row]]
+        self.buffer = buffer
+        self.starts = starts
+        self.garbage = 0
+
+    def clear(self):
+        self.buffer = bytearray()
+        self.starts = array("Q")
+        self.lengths = array("I")
+        self.garbage = 0
+
+    def nbytes(self):
+        return len(self.buffer) + self.starts.itemsize * len(self.starts) + self.lengths.itemsize * len(self.lengths)
+
+
+class RowView(MutableMapping):
+    """
+    ColumnStore の1行を辞書のように読み書きするビュー。
+    EditorView からは従来のレコード (dict) と同じように扱える。
+    """
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, key):
+        column = self.store.columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column.get(self.row)
+
+    def __setitem__(self, key, value):
+        column = self.store.columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        column.set(self.row, value)
+
+    def __delitem__(self, key):
+        raise TypeError("ColumnStore の列は削除できません")
+
+    def __contains__(self, key):
+        return key in self.store.columns
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"RowView({self.row}, id={self['id']!r})"
+
+    def to_dict(self):
+        return {key: column.get(self.row) for key, column in self.store.columns.items()}
+
+
+class ColumnStore:
+    """
+    商品レコードを列ごとの型付き配列で保持するストア。
+    App.data の list of dict と同じように len / [] / for / append / extend / clear が使え、
+    [] で取り出した RowView 経由で各フィールドを読み書きする。
+    EditorView から見たデータの入れ物 (MappedCsvStore / SqliteStore) のうち、メモリ上の実装。
+    """
+    def __init__(self, records=()):
+        self.columns = {}
+        for key in FIELDS:
+            if key in INT_FIELDS:
+                self.columns[key] = IntColumn()
+            elif key in BOOL_FIELDS:
+                self.columns[key] = BoolColumn()
+            elif key in CATEGORY_FIELDS:
+                self.columns[key] = CategoryColumn()
+            else:
+                self.columns[key] = TextColumn()
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    # --- EditorView が使う索引 (ストアごとに実装が異なる) ---
+
+    def record_index(self):
+        return RecordIndex(self)
+
+    def search_index(self):
+        return SearchIndex(self)
+
+    def transaction(self):
+        """複数の書き込みをまとめる (メモリ上のストアでは何もしない)"""
+        return nullcontext()
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [RowView(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return RowView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield RowView(self, row)
+
+    def append(self, record):
+        for key, column in self.columns.items():
+            column.append(record.get(key, ""))
+        return RowView(self, len(self) - 1)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        for column in self.columns.values():
+            column.clear()
+
+    def column(self, key):
+        """1列分の値をまとめて返す"""
+        column = self.columns[key]
+        return [column.get(row) for row in range(len(self))]
+
+    def typed_column(self, key):
+        """
+        1列分の値を型付きでまとめて返す。
+        数値列は int / float (空欄・数値として読めない値は None)、フラグ列は bool、それ以外は文字列。
+        """
+        return self.columns[key].typed_values()
+
+    def get_many(self, key, rows):
+        """key 列の rows の各行の値をまとめて返す (set_many() にそのまま渡せる形)"""
+        return self.columns[key].get_many(rows)
+
+    def set_many(self, key, rows, values):
+        """key 列の rows の各行に values をまとめて書き込む"""
+        self.columns[key].set_many(rows, values)
+
+    def nbytes(self):
+        """列データが占めるおおよそのバイト数"""
+        return sum(column.nbytes() for column in self.columns.values())
+
+    def close(self):
+        pass
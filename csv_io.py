@@ -0,0 +1,241 @@
+import csv
+import math
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+
+from schema import BOOL, SCHEMA, keys_of
+
+# --- CSV 列定義 ---
+# 列の並びと型は schema.SCHEMA で宣言している
+FIELDS = tuple(field.key for field in SCHEMA)
+BOOL_FIELDS = keys_of(BOOL)
+
+TRUE_VALUES = ("1", "true", "yes", "on", "○")
+FALSE_VALUES = ("0", "false", "no", "off", "×", "") # 読み込みでは TRUE_VALUES 以外はすべて偽とみなす
+
+# 保存時に選べる文字コード (表示名 → Pythonのcodec名)
+EXPORT_ENCODINGS = {
+    "UTF-8": "utf-8",
+    "UTF-8 (BOM付き)": "utf-8-sig",
+    "Shift_JIS (cp932)": "cp932",
+}
+
+# 保存方式
+SAVE_ALL = "全件を保存"
+SAVE_PATCH = "変更分のみ (パッチ)"
+SAVE_MODES = (SAVE_ALL, SAVE_PATCH)
+
+# 読み込み方式 (自動: 大きなファイルだけ mmap で開く)
+LOAD_AUTO = "自動"
+LOAD_MEMORY = "メモリに読み込む"
+LOAD_MMAP = "mmap (大きなファイル向け)"
+LOAD_SQLITE = "SQLite (データベース)"
+LOAD_MODES = (LOAD_AUTO, LOAD_MEMORY, LOAD_MMAP, LOAD_SQLITE)
+
+
+def patch_path(csv_path):
+    """変更分のみを書き出すパッチファイルのパス (元ファイル名.日時.patch.csv)"""
+    base, ext = os.path.splitext(csv_path)
+    return f"{base}.{time.strftime('%Y%m%d-%H%M%S')}.patch{ext or '.csv'}"
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def format_bool(value):
+    return "1" if parse_bool(value) else "0"
+
+
+def parse_number(value):
+    """
+    数値の列の値を数値に変換する。全角数字・桁区切りのカンマ・末尾の「円」は許容し、
+    数値として読めない値や空欄は None を返す。
+    """
+    text = unicodedata.normalize("NFKC", str(value)).strip().replace(",", "")
+    if text.endswith("円"):
+        text = text[:-1].rstrip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def item_to_row(item):
+    """レコードをCSVの1行 (FIELDS順の値のリスト) に変換"""
+    return [format_bool(item.get(key)) if key in BOOL_FIELDS else item.get(key, "") for key in FIELDS]
+
+
+def row_to_item(row):
+    """CSVの1行 (DictReaderの辞書) を App.data と同じ形式のレコードに変換"""
+    item = {}
+    for key in FIELDS:
+        val = row.get(key)
+        if val is None:
+            val = ""
+        item[key] = parse_bool(val) if key in BOOL_FIELDS else val
+    return item
+
+
+def iter_csv_chunks(path, chunk_size=2000, encoding="utf-8-sig"):
+    """CSVを chunk_size 行ずつのレコードのリストとして順に返す"""
+    # newline="" で開かないとセル内改行 (memo/description) が壊れる
+    with open(path, newline="", encoding=encoding) as f:
+        yield from read_csv_chunks(f, chunk_size)
+
+
+def read_csv_chunks(f, chunk_size=2000):
+    """開いているファイル (標準入力など) から iter_csv_chunks() と同じようにレコードを読む"""
+    reader = csv.DictReader(f)
+    chunk = []
+    for row in reader:
+        chunk.append(row_to_item(row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CsvLoader(threading.Thread):
+    """
+    ワーカースレッドでCSVを読み込み、チャンク単位でキューに積むローダー。
+    Tkのウィジェットはメインスレッドからしか触れないため、
+    UI側は after() で poll() を呼び出して受け取ったチャンクを反映する。
+    """
+    def __init__(self, path, chunk_size=2000, encoding="utf-8-sig", max_pending=8):
+        super().__init__(daemon=True)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        # UI側の取り込みが追いつかない場合はワーカーを待たせてメモリを抑える
+        self.chunks = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.finished = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            for chunk in iter_csv_chunks(self.path, self.chunk_size, self.encoding):
+                while not self._stop_event.is_set():
+                    try:
+                        self.chunks.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop_event.is_set():
+                    return
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def stop(self):
+        self._stop_event.set()
+
+    def poll(self, max_chunks=4):
+        """
+        読み込み済みのチャンクを最大 max_chunks 個取り出す。
+        戻り値は (レコードのリスト, 完了したかどうか)。
+        """
+        items = []
+        for _ in range(max_chunks):
+            try:
+                items.extend(self.chunks.get_nowait())
+            except queue.Empty:
+                break
+        done = self.finished and self.chunks.empty()
+        return items, done
+
+
+class CsvExporter(threading.Thread):
+    """
+    ワーカースレッドでCSVを書き出すエクスポーター。
+    レコードはUIスレッドが feed() でチャンクごとに渡す (キューの上限で未書き込み分のメモリを抑える)。
+    一時ファイルに書き切ってから os.replace() で置き換えるため、
+    途中で落ちても元のファイルは壊れない。
+    """
+    def __init__(self, path, total, encoding="utf-8", max_pending=4):
+        super().__init__(daemon=True)
+        self.path = path
+        self.total = total
+        self.encoding = encoding
+        self.chunks = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.error = None
+        self.finished = False
+        self.closed = False
+        self.aborted = False
+
+    def ready(self):
+        """feed() で次のチャンクを受け付けられるか"""
+        return not self.chunks.full() and not self.finished
+
+    def feed(self, items):
+        self.chunks.put(items)
+
+    def close(self):
+        """全チャンクを渡し終えたら呼ぶ (ワーカーが失敗して止まっていても待ち続けない)"""
+        self.closed = True
+        while not self.finished:
+            try:
+                self.chunks.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+    def abort(self):
+        """書き出しをやめる (一時ファイルを消し、元のファイルは変更しない)"""
+        self.aborted = True
+        self.close()
+
+    def progress(self):
+        return self.written / self.total if self.total else 1.0
+
+    def run(self):
+        tmp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+            with open(fd, "w", newline="", encoding=self.encoding) as f:
+                # mkstemp は 0600 で作成するため、置き換え後も元ファイルの権限を保つ
+                if os.path.exists(self.path):
+                    shutil.copymode(self.path, tmp_path)
+                else:
+                    os.chmod(tmp_path, 0o644)
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                while True:
+                    items = self.chunks.get()
+                    if items is None or self.aborted:
+                        break
+                    writer.writerows(item_to_row(item) for item in items)
+                    self.written += len(items)
+                if self.aborted:
+                    raise InterruptedError("書き出しを中止しました")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.error = e
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        finally:
+            self.finished = True
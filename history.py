@@ -0,0 +1,183 @@
+import time
+from collections import deque
+
+from bulk_edit import BulkChange
+
+# --- 元に戻す / やり直し ---
+# 履歴にはレコードのコピーではなく、変わったフィールドの (変更前, 変更後) だけを残す。
+
+MAX_ENTRIES = 1000 # 残す操作の数
+MAX_BYTES = 32 * 1024 * 1024 # 履歴全体のおおよそのメモリ量の上限
+COALESCE_SECONDS = 2.0 # この間隔より短く続いた入力は1つの操作にまとめる
+COALESCE_FIELDS = frozenset({"description"}) # 打鍵ごとに書き戻すフィールド (HTMLソース)
+FIELD_COST = 64 # 1フィールド (一括編集では1行) あたりの管理用の見積もり
+
+
+def value_cost(value):
+    return len(value) if isinstance(value, str) else 8
+
+
+class RecordEdit:
+    """1件のレコードの編集 (save_current_values() が返した {キー: (変更前, 変更後)})"""
+    __slots__ = ("record_id", "changes", "time", "cost")
+
+    def __init__(self, record_id, changes, now):
+        self.record_id = record_id # 編集前の id
+        self.changes = dict(changes)
+        self.time = now
+        self.cost = self.measure()
+
+    def measure(self):
+        return sum(FIELD_COST + value_cost(old) + value_cost(new) for old, new in self.changes.values())
+
+    def current_id(self):
+        """編集後の id (id 自体を書き換えた場合に備える)"""
+        change = self.changes.get("id")
+        return change[1] if change else self.record_id
+
+
+class ColumnEdit:
+    """一括編集 (apply_bulk_edit() が返した {列名: BulkChange})"""
+    __slots__ = ("changes", "group", "time", "cost")
+
+    def __init__(self, changes, now, group=None):
+        self.changes = dict(changes)
+        self.group = group
+        self.time = now
+        self.cost = sum(map(self.measure, self.changes.values()))
+
+    @staticmethod
+    def measure(change):
+        return FIELD_COST * len(change) + sum(map(value_cost, change.old)) + sum(map(value_cost, change.new))
+
+    def extend(self, changes):
+        """同じ操作 (group) の続きの変更を加え、増えた見積もりを返す"""
+        added = 0
+        for key, change in changes.items():
+            current = self.changes.get(key)
+            if current is None:
+                # 後から伸ばすため、呼び出し元の BulkChange とはリストを共有しない
+                current = self.changes[key] = BulkChange(key, [], [], [])
+            current.rows.extend(change.rows)
+            current.old.extend(change.old)
+            current.new.extend(change.new)
+            added += self.measure(change)
+        self.cost += added
+        return added
+
+
+class EditHistory:
+    """
+    元に戻す / やり直しの履歴。
+    同じレコードの HTMLソースへの入力が COALESCE_SECONDS 以内に続いた場合は1つの操作にまとめ、
+    操作の数か見積もったメモリ量が上限を超えたら古いものから捨てる。
+    """
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.cost = 0 # 両方のスタックの見積もりの合計
+        self.sealed = True # True なら次の入力を直前の操作にまとめない
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def push_record(self, record_id, changes):
+        """save_current_values() で1件のレコードを書き換えたときに呼ぶ"""
+        if not changes:
+            return
+        now = self.clock()
+        self.drop_redo()
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if (not self.sealed and isinstance(last, RecordEdit) and last.record_id == record_id
+                and now - last.time <= COALESCE_SECONDS
+                and COALESCE_FIELDS.issuperset(changes) and COALESCE_FIELDS.issuperset(last.changes)):
+            # 入力の続き: 最初の変更前の値と最新の値だけを残す
+            for key, (old, new) in changes.items():
+                first = last.changes[key][0] if key in last.changes else old
+                if first == new:
+                    last.changes.pop(key, None)
+                else:
+                    last.changes[key] = (first, new)
+            last.time = now
+            self.cost -= last.cost
+            if not last.changes:
+                self.undo_stack.pop() # 入力して元の値に戻した
+                return
+            last.cost = last.measure()
+            self.cost += last.cost
+        else:
+            self.push(RecordEdit(record_id, changes, now))
+        self.sealed = not COALESCE_FIELDS.issuperset(changes)
+        self.evict()
+
+    def push_bulk(self, changes, group=None):
+        """
+        apply_bulk_edit() などで列をまとめて書き換えたときに呼ぶ。
+        group を指定すると、直前の操作が同じ group ならそこに加える (AI生成の結果を少しずつ書き込む場合など)。
+        """
+        changes = {key: change for key, change in changes.items() if len(change)}
+        if not changes:
+            return
+        self.drop_redo()
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if group is not None and isinstance(last, ColumnEdit) and last.group == group:
+            self.cost += last.extend(changes)
+        elif group is not None:
+            entry = ColumnEdit({}, self.clock(), group)
+            entry.extend(changes)
+            self.push(entry)
+        else:
+            self.push(ColumnEdit(changes, self.clock()))
+        self.sealed = True
+        self.evict()
+
+    def seal(self):
+        """直前の操作を閉じ、次の入力を別の操作にする"""
+        self.sealed = True
+
+    def undo(self):
+        """元に戻す操作 (RecordEdit / ColumnEdit) を返す。なければ None"""
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        self.sealed = True
+        return entry
+
+    def redo(self):
+        """やり直す操作を返す。なければ None"""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        self.sealed = True
+        return entry
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.cost = 0
+        self.sealed = True
+
+    def push(self, entry):
+        self.undo_stack.append(entry)
+        self.cost += entry.cost
+
+    def drop_redo(self):
+        # 新しい編集をしたら、やり直しの履歴は使えなくなる
+        self.cost -= sum(entry.cost for entry in self.redo_stack)
+        self.redo_stack.clear()
+
+    def evict(self):
+        # 最新の操作は上限を超えていても残す (元に戻せないよりはよい)
+        while len(self.undo_stack) > 1 and (len(self.undo_stack) > self.max_entries or self.cost > self.max_bytes):
+            self.cost -= self.undo_stack.popleft().cost
@@ -0,0 +1,164 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+# --- 編集ジャーナル ---
+# 保存 (CSVへの書き出し) 前の編集を1件ずつ追記していき、異常終了しても次に開いたときに復元できるようにする。
+# ファイルは1行1レコードの JSON で、先頭行は対象のCSV (パス・サイズ・更新日時) を表すヘッダー。
+
+JOURNAL_SUFFIX = ".journal"
+FORMAT_VERSION = 1
+FLUSH_INTERVAL = 0.2 # 書き込みをまとめて fsync する間隔 (異常終了で失う編集はこの時間分まで)
+
+
+def journal_path(csv_path):
+    """CSVに対応するジャーナルのパス (元ファイル名.csv.journal)"""
+    return csv_path + JOURNAL_SUFFIX
+
+
+def journal_value(value):
+    """
+    値を RowView と同じ表記にする (一括編集の get_many() の形では数値列が int のため文字列に直す)。
+    読み戻すときに write_fields() が表示中の値と比べるため、ジャーナルには常にこの形で残す。
+    """
+    return str(value) if type(value) is int else value
+
+
+def source_of(csv_path):
+    """ジャーナルのヘッダーに記録するCSVの情報"""
+    stat = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_journal(path):
+    """
+    ジャーナルを読み、(ヘッダー, [(レコードid, フィールド, 値), ...]) を返す。ファイルがなければ (None, [])。
+    書き込み途中で終了した末尾の行は読み飛ばす。
+    """
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return None, []
+    header = None
+    entries = []
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break # 途中で切れた行 (以降は書き込まれていない)
+            if header is None:
+                if record.get("journal") != FORMAT_VERSION:
+                    return None, []
+                header = record
+            elif "ids" in record:
+                field = record["field"]
+                entries.extend((record_id, field, journal_value(value)) for record_id, value in zip(record["ids"], record["values"]))
+            else:
+                entries.extend((record["id"], field, journal_value(value)) for field, value in record["changes"].items())
+    return header, entries
+
+
+class EditJournal:
+    """
+    編集をジャーナルファイルに追記する。
+    書き込みと fsync はワーカースレッドで FLUSH_INTERVAL ごとにまとめて行うため、
+    UIスレッドの record() はキューに積むだけで待たない。
+    """
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = journal_path(csv_path)
+        self.queue = queue.Queue()
+        self.error = None
+        self.written = 0 # 書き込んだレコード数 (ヘッダーを除く)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def record(self, record_id, changes):
+        """save_current_values() が返した変更 {キー: (変更前, 変更後)} を記録する"""
+        self.queue.put({"id": record_id, "changes": {key: journal_value(new) for key, (old, new) in changes.items()}})
+
+    def record_many(self, record_ids, field, values):
+        """一括編集で複数のレコードの field を values に書き換えたことを記録する"""
+        self.queue.put({"ids": list(record_ids), "field": field, "values": [journal_value(value) for value in values]})
+
+    def compact(self, entries):
+        """
+        ジャーナルを作り直し、未保存の編集 entries [(レコードid, フィールド, 値), ...] だけを残す。
+        CSVへの書き出しが終わったときと、ジャーナルを開き直したときに呼ぶ。
+        """
+        self.queue.put(("compact", list(entries)))
+
+    def close(self, remove=False):
+        """書き込みを終えてスレッドを止める。remove=True ならジャーナルファイルを削除する"""
+        self.queue.put(("close", remove))
+        self.thread.join(timeout=5)
+
+    def run(self):
+        f = None
+        try:
+            f = open(self.path, "a", encoding="utf-8")
+            if f.tell() == 0:
+                self.write_header(f)
+            while True:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                # 少し待って、その間に届いた編集をまとめて書き込む
+                while not isinstance(batch[-1], tuple):
+                    try:
+                        batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                records = [record for record in batch if not isinstance(record, tuple)]
+                if records:
+                    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.written += len(records)
+                if isinstance(batch[-1], tuple):
+                    command, arg = batch[-1]
+                    if command == "close":
+                        f.close()
+                        f = None
+                        if arg:
+                            os.remove(self.path)
+                        return
+                    f.close()
+                    f = None
+                    f = self.rewrite(arg)
+        except Exception as e:
+            self.error = e
+            print(f"Error writing edit journal {self.path}: {e}")
+        finally:
+            if f:
+                f.close()
+
+    def write_header(self, f):
+        try:
+            source = source_of(self.csv_path)
+        except OSError:
+            source = None
+        f.write(json.dumps({"journal": FORMAT_VERSION, "source": source}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    def rewrite(self, entries):
+        """ヘッダーと entries だけのジャーナルを一時ファイルに書いてから置き換え、追記用に開き直す"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                self.write_header(f)
+                for record_id, field, value in entries:
+                    f.write(json.dumps({"id": record_id, "changes": {field: value}}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.written = len(entries)
+        return open(self.path, "a", encoding="utf-8")
@@ -1,9 +1,29 @@
+import time
+STARTUP_T0 = time.perf_counter() # 起動時間の計測開始 (import より前)
+
 import customtkinter as ctk
 import tkinter as tk
-from tkinter import messagebox
-from PIL import Image
+from tkinter import filedialog, messagebox
+import csv
 import os
-import re
+import sys
+
+from aggregates import CatalogStats
+from binding import FormBinding, replace_text
+from bulk_edit import BulkChange, BulkEdit, BulkEditError
+from catalog import DirtyTracker
+from catalog_cache import CachedCsvLoader, CatalogCache, capture, restore_search_index
+from column_store import ColumnStore, column_value
+from csv_io import BOOL_FIELDS, EXPORT_ENCODINGS, FIELDS, LOAD_MODES, LOAD_SQLITE, SAVE_MODES, SAVE_PATCH, CsvExporter, CsvLoader, patch_path, row_to_item
+from history import ColumnEdit, EditHistory
+from mmap_csv import MappedCsvLoader, MappedCsvStore, use_mmap
+from perf import install_widget_counters, profiler
+from preview import PreviewEngine
+from schema import BOOL, FIELD_MAP, FORM_COLUMNS, FORM_SECTIONS, INT, MEMO, label_of
+from search import INDEXED_FIELDS
+from uniqueness import UNIQUE_FIELDS, UniqueIndex
+from validate import CatalogValidator
+# AI生成・差分取り込み・SQLite・編集ジャーナルは使うときに import する (起動を速くする)
 
 # --- 設定と定数 ---
 ctk.set_appearance_mode("System")
@@ -29,11 +49,11 @@ class AppColors:
     ACTION_SAVE = "#059669"      # 保存ボタンなどは安心感のある緑（Emerald）
 
 # --- データ生成 (ダミー) ---
-def generate_dummy_data():
+def generate_dummy_data(count=20):
     categories = ['半導体', '電子部品', '電気部品', 'コネクター', '開発ツール']
     ranks = ['S', 'A', 'B', 'C', 'J']
     data = []
-    for i in range(20):
+    for i in range(count):
         id_str = str(i + 1).zfill(4)
         category = categories[i % len(categories)]
         rank = ranks[i % len(ranks)]
@@ -65,8 +85,31 @@ def generate_dummy_data():
         data.append(item)
     return data
 
+def is_database(data):
+    # data が SqliteStore か (sqlite_store はSQLiteで開くときに import する)
+    module = sys.modules.get("sqlite_store")
+    return module is not None and isinstance(data, module.SqliteStore)
+
 # --- UI コンポーネント ---
 
+class IconLoader:
+    """アイコンの遅延読み込み：最初に get() されたときに読み込み、PIL もその時点で import する"""
+    def __init__(self, icon_defs):
+        self.icon_defs = icon_defs
+        self.cache = {}
+
+    def get(self, name):
+        if name not in self.cache: self.cache[name] = self.load(self.icon_defs.get(name))
+        return self.cache[name]
+
+    def load(self, path):
+        if not path or not os.path.exists(path): return None
+        try:
+            from PIL import Image
+            pil_image = Image.open(path)
+            return ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(20, 20))
+        except: return None
+
 class SectionTitle(ctk.CTkFrame):
     """セクションタイトル：企業の青をアクセントに使用"""
     def __init__(self, master, title, **kwargs):
@@ -84,7 +127,7 @@ class SectionTitle(ctk.CTkFrame):
         self.separator.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(0, 10))
 
 class InputField(ctk.CTkFrame):
-    def __init__(self, master, label, value_var, width=None, readonly=False, **kwargs):
+    def __init__(self, master, label, value_var, width=None, readonly=False, choices=(), justify="left", **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.label = ctk.CTkLabel(self, text=label, font=("Meiryo UI", 11, "bold"), text_color=("gray50", "gray40"), anchor="w")
         self.label.pack(fill="x", pady=(0, 2))
@@ -92,9 +135,21 @@ class InputField(ctk.CTkFrame):
         state = "readonly" if readonly else "normal"
         fg_color = ("#f1f5f9", "#334155") if readonly else None
         
-        self.entry = ctk.CTkEntry(self, textvariable=value_var, state=state, fg_color=fg_color, height=32, font=("Meiryo UI", 13))
+        if choices and not readonly: # 選択式 (想定外の値も表示できるよう入力も許す)
+            self.entry = ctk.CTkComboBox(self, values=list(choices), variable=value_var, height=32, font=("Meiryo UI", 13), justify=justify, button_color=AppColors.BRAND_BLUE)
+        else:
+            self.entry = ctk.CTkEntry(self, textvariable=value_var, state=state, fg_color=fg_color, height=32, font=("Meiryo UI", 13), justify=justify)
         if width: self.entry.configure(width=width)
         self.entry.pack(fill="x")
+        self.border_color = self.entry.cget("border_color")
+        self.warning = ctk.CTkLabel(self, text="", font=("Meiryo UI", 11), text_color="#dc2626", anchor="w") # 重複などの警告 (表示するときだけ pack)
+
+    def set_warning(self, text):
+        # 入力欄の下に警告を表示する (空文字で消す)
+        if text == self.warning.cget("text"): return
+        self.warning.configure(text=text)
+        self.warning.pack(fill="x") if text else self.warning.pack_forget()
+        self.entry.configure(border_color="#dc2626" if text else self.border_color)
 
 class CheckBoxField(ctk.CTkFrame):
     def __init__(self, master, label, variable, **kwargs):
@@ -103,19 +158,160 @@ class CheckBoxField(ctk.CTkFrame):
         self.check = ctk.CTkCheckBox(self, text=label, variable=variable, font=("Meiryo UI", 12), fg_color=AppColors.BRAND_BLUE, hover_color=AppColors.BRAND_BLUE_HOVER)
         self.check.pack(anchor="w", pady=5)
 
+class TabBar(ctk.CTkFrame):
+    """仮想化タブバー：表示幅に収まる数のボタンだけを使い回し、スクロールに応じて付け替える"""
+    TAB_WIDTH = 180
+    TAB_PADX = 3
+    SLOT_WIDTH = TAB_WIDTH + TAB_PADX * 2
+
+    def __init__(self, master, data, icons, on_select, dirty, **kwargs):
+        # タブコンテナ: 背景色は淡い色、ボーダーで区切る
+        super().__init__(master, fg_color=("gray95", "gray15"), corner_radius=0, **kwargs)
+        self.data = data
+        self.dirty = dirty
+        self.icons = icons
+        self.on_select = on_select
+        self.active_id = None
+        self.first = 0
+        self.buttons = []
+        self.bound = []
+        
+        self.strip = ctk.CTkFrame(self, height=45, fg_color="transparent", corner_radius=0)
+        self.strip.pack(fill="x")
+        self.scrollbar = ctk.CTkScrollbar(self, orientation="horizontal", height=12, command=self.on_scroll)
+        self.scrollbar.pack(fill="x", padx=3)
+        self.strip.bind("<Configure>", self.on_resize)
+        self.bind_wheel(self.strip)
+
+    def bind_wheel(self, widget):
+        for seq in ("<MouseWheel>", "<Shift-MouseWheel>", "<Button-4>", "<Button-5>"):
+            widget.bind(seq, self.on_wheel, add="+")
+
+    def visible_count(self):
+        return max(1, self.strip.winfo_width() // self.SLOT_WIDTH + 1)
+
+    def max_first(self):
+        return max(0, len(self.data) - self.visible_count() + 1)
+
+    def on_resize(self, event=None):
+        while len(self.buttons) < self.visible_count():
+            btn = ctk.CTkButton(self.strip, text="", image=self.icons.get("box"), compound="left", width=self.TAB_WIDTH, height=34,
+                                corner_radius=6, border_color=AppColors.BRAND_BLUE, hover_color=("gray90", "gray30"), anchor="w", **self.tab_style(False))
+            self.bind_wheel(btn)
+            self.buttons.append(btn)
+            self.bound.append(None)
+        self.render()
+
+    def tab_style(self, is_active):
+        # アクティブタブ: 白背景、ブランドブルーの文字と枠線
+        return {
+            "fg_color": ("white", "gray25") if is_active else "transparent",
+            "text_color": (AppColors.BRAND_BLUE, "#60a5fa") if is_active else ("gray40", "gray50"),
+            "border_width": 2 if is_active else 0,
+            "font": ("Meiryo UI", 12, "bold" if is_active else "normal"),
+        }
+
+    def render(self):
+        # 表示内容 (id, 商品名, アクティブか) が変わったボタンだけを再設定する
+        self.first = min(self.first, self.max_first())
+        count = len(self.data)
+        for slot, btn in enumerate(self.buttons):
+            row = self.first + slot
+            if row >= count:
+                if self.bound[slot] is not None:
+                    btn.place_forget()
+                    self.bound[slot] = None
+                continue
+            item = self.data[row]
+            # 未保存の変更があるタブには印を付ける
+            name = f"● {item['name']}" if item["id"] in self.dirty else item["name"]
+            state = (item["id"], name, item["id"] == self.active_id)
+            if state == self.bound[slot]: continue
+            if self.bound[slot] is None: btn.place(x=slot * self.SLOT_WIDTH + self.TAB_PADX, y=5)
+            btn.configure(text=state[1], command=lambda i=state[0]: self.on_select(i), **self.tab_style(state[2]))
+            self.bound[slot] = state
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        count = len(self.data)
+        if count == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        visible = min(count, self.visible_count() - 1) or 1
+        self.scrollbar.set(self.first / count, min(1.0, (self.first + visible) / count))
+
+    def set_active(self, item_id):
+        self.active_id = item_id
+        self.render()
+
+    def scroll_to(self, first):
+        first = max(0, min(int(first), self.max_first()))
+        if first != self.first:
+            self.first = first
+            self.render()
+
+    def on_scroll(self, action, value, unit=None):
+        if action == "moveto": self.scroll_to(float(value) * len(self.data))
+        elif action == "scroll": self.scroll_to(self.first + int(value))
+
+    def on_wheel(self, event):
+        if event.num == 4: delta = -1
+        elif event.num == 5: delta = 1
+        else: delta = -1 if event.delta > 0 else 1
+        self.scroll_to(self.first + delta)
+
+    def items_changed(self):
+        self.render()
+
+    def set_items(self, items):
+        # 表示するレコード列を差し替える (検索結果での絞り込み)
+        self.data = items
+        self.first = 0
+        self.render()
+
 class EditorView(ctk.CTkFrame):
+    PREVIEW_DELAY_MS = 150
+    PREVIEW_POLL_MS = 20
+    SEARCH_LIMIT = 1000
+
     def __init__(self, master, data, icons, **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.data = data
         self.icons = icons
-        self.active_id = data[0]["id"]
+        self.index = data.record_index()
+        self.dirty = DirtyTracker()
+        self.journal = None # 自動保存が有効な間、編集を追記する EditJournal
+        self.history = EditHistory() # 元に戻す / やり直し (フィールド単位の差分)
+        self.search_index = data.search_index()
+        self.index_building = False
+        self.stats = CatalogStats() # ヘッダーの集計パネル (読み込み時に1回集計し、以降は編集の差分で更新)
+        self.stats_building = False
+        self.unique = UniqueIndex() # JAN / WebCD などの重複 (読み込み時に1回数え、以降は編集した値だけ付け替える)
+        self.unique_building = False
+        self.unique_fields = {} # 一意の列 → 入力欄 (重複していれば警告を出す)
+        self.validator = CatalogValidator(data) # 全件検証 (一度実行した後は編集した行だけを再検証)
+        self.validating = False
+        self.active_id = data[0]["id"] if data else None
         self.vars = {}
         
-        # タブコンテナ: 背景色は淡い色、ボーダーで区切る
-        self.tab_container = ctk.CTkScrollableFrame(self, height=45, orientation="horizontal", fg_color=("gray95", "gray15"), corner_radius=0)
-        self.tab_container.pack(fill="x", side="top")
+        # プレビュー: 打鍵をまとめ、変換はワーカースレッドで行う
+        self.preview = PreviewEngine()
+        self.preview_after = None
+        self.preview_token = 0
+        self.preview_waiting = None
+        self.preview_text = ""
         
-        self.tabs = {}
+        # 検索バー: 入力に合わせてタブを絞り込む
+        search_bar = ctk.CTkFrame(self, fg_color=("gray95", "gray15"), corner_radius=0)
+        search_bar.pack(fill="x", side="top")
+        self.search_entry = ctk.CTkEntry(search_bar, width=360, height=28, placeholder_text="Search (name / catch copy / JAN / WebCD)", font=("Meiryo UI", 12), border_color=AppColors.BRAND_BLUE)
+        self.search_entry.pack(side="left", padx=10, pady=(8, 0))
+        self.search_entry.bind("<KeyRelease>", self.on_search)
+        self.search_status = ctk.CTkLabel(search_bar, text="", text_color="gray", font=("Meiryo UI", 11))
+        self.search_status.pack(side="left", padx=5, pady=(8, 0))
+
+        self.tab_bar = TabBar(self, data, icons, self.switch_tab, self.dirty)
+        self.tab_bar.pack(fill="x", side="top")
         self.refresh_tabs()
 
         self.main_scroll = ctk.CTkScrollableFrame(self, fg_color="transparent")
@@ -123,41 +319,137 @@ class EditorView(ctk.CTkFrame):
         
         self.create_form_content()
         self.load_active_item()
+        self.schedule_index_build()
+        self.stats.extend(len(data))
+        self.schedule_stats()
+        self.unique.extend(len(data))
+        self.schedule_unique_check()
 
+    @profiler.timed("refresh_tabs")
     def refresh_tabs(self):
-        for widget in self.tab_container.winfo_children():
-            widget.destroy()
-            
-        for item in self.data:
-            is_active = item["id"] == self.active_id
-            
-            # アクティブタブ: 白背景、ブランドブルーの文字と枠線
-            fg_color = ("white", "gray25") if is_active else "transparent"
-            text_color = (AppColors.BRAND_BLUE, "#60a5fa") if is_active else ("gray40", "gray50")
-            border_width = 2 if is_active else 0
-            border_color = AppColors.BRAND_BLUE
-            
-            btn = ctk.CTkButton(
-                self.tab_container,
-                text=item["name"],
-                image=self.icons.get("box"),
-                compound="left",
-                width=180,
-                height=34,
-                corner_radius=6,
-                fg_color=fg_color,
-                text_color=text_color,
-                border_width=border_width,
-                border_color=border_color,
-                hover_color=("gray90", "gray30"),
-                anchor="w",
-                font=("Meiryo UI", 12, "bold" if is_active else "normal"),
-                command=lambda i=item["id"]: self.switch_tab(i)
-            )
-            btn.pack(side="left", padx=3, pady=5)
+        self.tab_bar.set_active(self.active_id)
+
+    def append_items(self, items):
+        first_load = self.active_id is None and self.data
+        if first_load: self.active_id = self.data[0]["id"]
+        self.index.extend(items)
+        self.schedule_index_build()
+        self.stats.extend(len(self.data))
+        self.schedule_stats()
+        self.unique.extend(len(self.data))
+        self.schedule_unique_check()
+        if first_load:
+            self.tab_bar.set_active(self.active_id)
+            self.load_active_item()
+        else: self.tab_bar.items_changed()
+
+    def set_data(self, data):
+        # 読み込むファイルごとにストアを差し替える (続けて reset_items() を呼ぶ)
+        self.data = self.validator.store = data
+        self.index, self.search_index = data.record_index(), data.search_index()
+
+    def reset_items(self):
+        self.active_id = None
+        self.index.clear()
+        self.dirty.clear()
+        self.search_index.clear()
+        self.validator.clear()
+        self.history.clear()
+        self.stats.clear()
+        self.unique.clear()
+        self.binding.invalidate() # 未保存の入力が残っていても次の読み込みで必ず書き換える
+        self.search_entry.delete(0, "end")
+        self.search_status.configure(text="")
+        self.tab_bar.active_id = None
+        self.tab_bar.set_items(self.data)
+
+    def schedule_index_build(self):
+        if not self.index_building and self.search_index.pending():
+            self.index_building = True
+            self.after(1, self.build_index_step)
+
+    def build_index_step(self):
+        # 索引は少しずつ作り、その合間にUIのイベントを処理させる
+        if not self.search_index.build_step():
+            self.after(1, self.build_index_step)
+            return
+        self.index_building = False
+        if self.search_entry.get().strip(): self.on_search()
+
+    def schedule_stats(self):
+        if not self.stats_building and self.stats.pending():
+            self.stats_building = True
+            self.after(1, self.stats_step)
+
+    def stats_step(self):
+        # 集計も索引と同じく少しずつ進める
+        if not self.stats.step(self.data):
+            self.after(1, self.stats_step)
+            return
+        self.stats_building = False
 
+    def schedule_unique_check(self):
+        if not self.unique_building and self.unique.pending():
+            self.unique_building = True
+            self.after(1, self.unique_check_step)
+
+    def unique_check_step(self):
+        # 重複チェックも読み込みに合わせて少しずつ進める (ストアに入った行を1回だけ数える)
+        if not self.unique.step(self.data):
+            self.after(1, self.unique_check_step)
+            return
+        self.unique_building = False
+        item = self.index.get("id", self.active_id)
+        if item: self.show_unique_warnings(item) # 数え終わる前に開いていた商品の重複を表示する
+
+    def show_unique_warnings(self, item):
+        # item の一意の列が他の商品と重複していれば入力欄に警告を出す (まだ数えていない行は数えた後に出す)
+        for key, field in self.unique_fields.items():
+            others = sum(row != item.row for row in self.unique.matching_rows(self.data, key, item[key])) if item.row < self.unique.counted else 0
+            field.set_warning(f"Duplicates {others} other item(s)" if others else "")
+
+    def collisions_at(self, rows):
+        # {一意の列: [行, ...]} のうち他の商品と同じ値の [(レコードid, 列名, 値), ...] (一括編集・差分取り込みの直後と保存前に確かめる)
+        self.unique.finish(self.data) # 数え終わる前に呼ばれた場合は残りを数え切る
+        found = []
+        for key in UNIQUE_FIELDS:
+            if not rows.get(key): continue
+            matches = {} # 同じ値を何行にも書き込んだ場合は値ごとに1回だけ引く
+            for record_id, row, value in zip(self.data.get_many("id", rows[key]), rows[key], self.data.get_many(key, rows[key])):
+                if value not in matches: matches[value] = self.unique.matching_rows(self.data, key, value)
+                if any(other != row for other in matches[value]): found.append((record_id, key, value))
+        return found
+
+    def edited_collisions(self):
+        # 未保存の編集で他の商品と同じ値になった一意の列 (読み込み時からの重複は含めない)
+        rows = {}
+        for record_id in self.dirty:
+            keys = self.dirty.dirty_fields(record_id).intersection(UNIQUE_FIELDS)
+            item = self.index.get("id", record_id) if keys else None
+            if item is None: continue
+            for key in keys: rows.setdefault(key, []).append(item.row)
+        return self.collisions_at(rows)
+
+    def written_collisions(self, changes):
+        # 列単位の書き換え {列名: BulkChange} で他の商品と同じ値になった一意の列
+        return self.collisions_at({key: change.rows for key, change in changes.items() if key in UNIQUE_FIELDS})
+
+    def on_search(self, event=None):
+        query = self.search_entry.get()
+        if not query.strip():
+            self.tab_bar.set_items(self.data)
+            self.search_status.configure(text="")
+            return
+        rows = self.search_index.search(query, self.SEARCH_LIMIT)
+        self.tab_bar.set_items([self.data[row] for row in rows])
+        status = f"{len(rows)} hits" if len(rows) < self.SEARCH_LIMIT else f"{len(rows)}+ hits"
+        if self.search_index.pending(): status += " (indexing...)"
+        self.search_status.configure(text=status)
+
+    @profiler.timed("switch_tab")
     def switch_tab(self, new_id):
         self.save_current_values()
+        self.history.seal()
         self.active_id = new_id
         self.refresh_tabs()
         self.load_active_item()
@@ -166,82 +458,20 @@ class EditorView(ctk.CTkFrame):
         self.content_frame = ctk.CTkFrame(self.main_scroll, fg_color="transparent")
         self.content_frame.pack(fill="x", padx=20, pady=20, expand=True)
         
-        # --- 基本情報 ---
-        SectionTitle(self.content_frame, title="基本情報").pack(fill="x")
-        row1 = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        row1.pack(fill="x", pady=5)
-        
-        self.vars["webcd"] = ctk.StringVar()
-        self.vars["name"] = ctk.StringVar()
-        self.vars["catch_copy"] = ctk.StringVar()
-        
-        InputField(row1, "!WebCD", self.vars["webcd"], width=100).pack(side="left", padx=(0, 10))
-        InputField(row1, "!商品名", self.vars["name"]).pack(side="left", fill="x", expand=True)
-        InputField(self.content_frame, "キャッチコピー", self.vars["catch_copy"]).pack(fill="x", pady=5)
-
-        # --- コード・価格・在庫 ---
-        SectionTitle(self.content_frame, title="コード・価格・在庫").pack(fill="x", pady=(20, 0))
-        grid_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        grid_frame.pack(fill="x", pady=5)
-        grid_frame.grid_columnconfigure((0,1,2,3), weight=1)
-        
-        keys = ["jan", "instore_jan", "id", "cost_price", "selling_price", "tax_rate", "stock_quantity"]
-        for k in keys: self.vars[k] = ctk.StringVar()
-        
-        InputField(grid_frame, "!JANコード", self.vars["jan"]).grid(row=0, column=0, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "インストアJAN", self.vars["instore_jan"]).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "仕入先コード", self.vars["id"], readonly=True).grid(row=0, column=2, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "原価", self.vars["cost_price"]).grid(row=1, column=0, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "売価", self.vars["selling_price"]).grid(row=1, column=1, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "税率", self.vars["tax_rate"]).grid(row=1, column=2, padx=5, pady=5, sticky="ew")
-        InputField(grid_frame, "在庫数", self.vars["stock_quantity"]).grid(row=1, column=3, padx=5, pady=5, sticky="ew")
-
-        # --- 物流・管理 ---
-        SectionTitle(self.content_frame, title="物流・管理情報").pack(fill="x", pady=(20, 0))
-        logi_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        logi_frame.pack(fill="x")
-        logi_frame.grid_columnconfigure((0,1,2,3), weight=1)
-
-        keys_logi = ["delivery", "delivery_display", "shelf", "rank", "size_w", "size_h", "size_d", "weight"]
-        for k in keys_logi: self.vars[k] = ctk.StringVar()
-
-        InputField(logi_frame, "納期", self.vars["delivery"]).grid(row=0, column=0, padx=5, pady=5, sticky="ew")
-        InputField(logi_frame, "納期表示", self.vars["delivery_display"]).grid(row=0, column=1, padx=5, pady=5, sticky="ew")
-        InputField(logi_frame, "棚番号", self.vars["shelf"]).grid(row=0, column=2, padx=5, pady=5, sticky="ew")
-        InputField(logi_frame, "品質ランク", self.vars["rank"]).grid(row=0, column=3, padx=5, pady=5, sticky="ew")
-
-        size_bg = ctk.CTkFrame(self.content_frame, fg_color=("gray90", "gray25"))
-        size_bg.pack(fill="x", pady=10)
-        size_bg.grid_columnconfigure((0,1,2,3), weight=1)
-        InputField(size_bg, "幅 (mm)", self.vars["size_w"]).grid(row=0, column=0, padx=10, pady=10, sticky="ew")
-        InputField(size_bg, "高さ (mm)", self.vars["size_h"]).grid(row=0, column=1, padx=10, pady=10, sticky="ew")
-        InputField(size_bg, "奥行 (mm)", self.vars["size_d"]).grid(row=0, column=2, padx=10, pady=10, sticky="ew")
-        InputField(size_bg, "重量 (g)", self.vars["weight"]).grid(row=0, column=3, padx=10, pady=10, sticky="ew")
-
-        # --- 設定・フラグ & メモ ---
-        two_col = ctk.CTkFrame(self.content_frame, fg_color="transparent")
-        two_col.pack(fill="x", pady=10)
-        two_col.grid_columnconfigure((0, 1), weight=1)
-
-        flag_frame = ctk.CTkFrame(two_col, fg_color="transparent")
-        flag_frame.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
-        SectionTitle(flag_frame, title="設定・フラグ").pack(fill="x")
-        
-        self.vars["is_published"] = ctk.BooleanVar()
-        self.vars["is_sale"] = ctk.BooleanVar()
-        self.vars["is_free_shipping"] = ctk.BooleanVar()
-        CheckBoxField(flag_frame, "Web公開する", self.vars["is_published"]).pack(anchor="w")
-        CheckBoxField(flag_frame, "セール対象", self.vars["is_sale"]).pack(anchor="w")
-        CheckBoxField(flag_frame, "送料無料", self.vars["is_free_shipping"]).pack(anchor="w")
-
-        memo_frame = ctk.CTkFrame(two_col, fg_color="transparent")
-        memo_frame.grid(row=0, column=1, sticky="nsew", padx=(10, 0))
-        SectionTitle(memo_frame, title="社内用メモ").pack(fill="x")
-        self.memo_text = ctk.CTkTextbox(memo_frame, height=80, font=("Meiryo UI", 12))
-        self.memo_text.pack(fill="x", pady=5)
+        # 項目の並びと入力欄は schema から組み立てる (行の最後の項目は残りの列に広げる)
+        textboxes = {}
+        for n, (title, rows) in enumerate(FORM_SECTIONS):
+            SectionTitle(self.content_frame, title=title).pack(fill="x", pady=(20, 0) if n else 0)
+            grid_frame = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+            grid_frame.pack(fill="x", pady=5)
+            grid_frame.grid_columnconfigure(tuple(range(FORM_COLUMNS)), weight=1)
+            for row, keys in enumerate(rows):
+                for column, key in enumerate(keys):
+                    span = FORM_COLUMNS - column if column == len(keys) - 1 else 1
+                    self.create_field(grid_frame, FIELD_MAP[key], textboxes).grid(row=row, column=column, columnspan=span, padx=5, pady=5, sticky="ew")
 
         # --- エディタ ---
-        SectionTitle(self.content_frame, title="商品説明").pack(fill="x", pady=(20, 5))
+        SectionTitle(self.content_frame, title=FIELD_MAP["description"].label).pack(fill="x", pady=(20, 5))
         editor_container = ctk.CTkFrame(self.content_frame, border_width=1, border_color=("gray70", "gray40"))
         editor_container.pack(fill="x", pady=5)
         
@@ -256,45 +486,273 @@ class EditorView(ctk.CTkFrame):
         
         self.desc_source = ctk.CTkTextbox(split_body, height=200, font=("Consolas", 12), wrap="none")
         self.desc_source.grid(row=0, column=0, sticky="nsew", padx=1, pady=1)
-        self.desc_source.bind("<KeyRelease>", self.update_preview)
+        self.desc_source.bind("<KeyRelease>", self.schedule_preview)
         
         self.desc_preview = ctk.CTkTextbox(split_body, height=200, font=("Meiryo UI", 13), fg_color=("white", "gray15"), state="disabled")
         self.desc_preview.grid(row=0, column=1, sticky="nsew", padx=1, pady=1)
+        # 表示中と異なる値のウィジェットだけを書き換える
+        textboxes["description"] = self.desc_source
+        self.binding = FormBinding(self.vars, textboxes, FIELD_MAP)
+
+    def create_field(self, master, field, textboxes):
+        # schema の型に合わせた入力ウィジェット
+        if field.kind == BOOL:
+            self.vars[field.key] = ctk.BooleanVar()
+            return CheckBoxField(master, field.label, self.vars[field.key])
+        if field.kind == MEMO:
+            textboxes[field.key] = ctk.CTkTextbox(master, height=80, font=("Meiryo UI", 12))
+            return textboxes[field.key]
+        self.vars[field.key] = ctk.StringVar()
+        widget = InputField(master, label_of(field), self.vars[field.key], readonly=field.readonly, choices=field.choices, justify="right" if field.kind == INT else "left")
+        if field.unique: self.unique_fields[field.key] = widget
+        return widget
 
+    @profiler.timed("load_active_item")
     def load_active_item(self):
-        item = next((i for i in self.data if i["id"] == self.active_id), None)
+        item = self.index.get("id", self.active_id)
         if not item: return
-        for key, var in self.vars.items():
-            if key in item:
-                val = item[key]
-                if isinstance(var, ctk.BooleanVar): var.set(bool(val))
-                else: var.set(str(val))
-        self.memo_text.delete("1.0", "end"); self.memo_text.insert("1.0", item.get("memo", ""))
-        self.desc_source.delete("1.0", "end"); self.desc_source.insert("1.0", item.get("description", ""))
-        self.update_preview()
+        # 表示中と値が異なるウィジェットだけをセット
+        if "description" in self.binding.show(item): self.update_preview()
+        self.show_unique_warnings(item)
 
+    @profiler.timed("save_current_values")
     def save_current_values(self):
-        item = next((i for i in self.data if i["id"] == self.active_id), None)
-        if not item: return
-        for key, var in self.vars.items(): item[key] = var.get()
-        item["memo"] = self.memo_text.get("1.0", "end-1c")
-        item["description"] = self.desc_source.get("1.0", "end-1c")
+        # 値が実際に変わったフィールドだけを書き戻し、{キー: (変更前, 変更後)} を返す
+        item = self.index.get("id", self.active_id)
+        if not item: return {}
+        values = self.binding.read()
+        with self.data.transaction(): changes = self.write_fields(item, values) # 1レコード分の書き込みをまとめてコミット
+        if changes:
+            self.history.push_record(self.active_id, changes)
+            if self.journal: self.journal.record(self.active_id, changes)
+            if self.validator.revalidate([item.row], changes): self.schedule_validation()
+            if any(key in changes for key in UNIQUE_FIELDS): self.show_unique_warnings(item) # 重複はその場で入力欄に出す (保存は on_save で止める)
+        return changes
+
+    def write_fields(self, item, values):
+        # item に values を書き込んで未保存の印と索引を更新し、実際に変わったフィールドの {キー: (変更前, 変更後)} を返す
+        changes = {}
+        for key, value in values.items():
+            old = item.get(key)
+            if old == value: continue
+            # webcd / jan が書き換えられた場合は索引を付け替える
+            if key in self.index.keys: self.index.rekey(item, key, old, value)
+            item[key] = value
+            changes[key] = (old, value)
+        if changes:
+            for key in changes: self.dirty.mark(item["id"], key)
+            self.search_index.update(item.row, item, changes)
+            self.stats.edit(item.row, changes, item) # 変更前と変更後の差分だけを集計に反映
+            self.unique.edit(item.row, changes)
+        return changes
+
+    @profiler.timed("bulk_edit")
+    def apply_bulk_edit(self, edit):
+        # 編集中の入力を先に書き戻してから一括編集し、{列名: BulkChange} を返す
+        self.save_current_values()
+        with self.data.transaction():
+            changes = edit.apply()
+            self.bulk_changed(changes)
+        self.history.push_bulk(changes)
+        return changes
+
+    def apply_generated(self, results, group):
+        # AI生成の結果 {レコードid: {列名: 値}} をまとめて書き込む (同じ group の結果は履歴上1つの操作にまとめる)
+        self.save_current_values() # 表示中の入力を先に書き戻す
+        return self.write_records(results, "id", group)
+
+    def write_records(self, records, key="id", group=None):
+        # {キー: {列名: 値}} (キーは key 列の値) を列ごとにまとめて書き込む (AI生成・差分取り込み。フラグは bool に直す)
+        columns = {}
+        for record_key, values in records.items():
+            item = self.index.get(key, record_key)
+            if item is None: continue # 生成中・取り込み中にレコードの id が変わった
+            for field, value in values.items():
+                rows, new = columns.setdefault(field, ([], []))
+                rows.append(item.row)
+                new.append(column_value(field, value)) # get_many() の値と同じ形にして比べる (数値列の "1980" は 1980)
+        changes = {}
+        with self.data.transaction():
+            for key, (rows, new) in columns.items():
+                old = self.data.get_many(key, rows)
+                changed = [n for n in range(len(rows)) if old[n] != new[n]]
+                if changed:
+                    changes[key] = BulkChange(key, [rows[n] for n in changed], [old[n] for n in changed], [new[n] for n in changed])
+                    self.data.set_many(key, changes[key].rows, changes[key].new)
+            if changes: self.bulk_changed(changes)
+        self.history.push_bulk(changes, group)
+        return changes
+
+    def merge_incoming(self, diff):
+        # 差分 diff を未保存の編集と3方向マージして取り込み、(書き換えた {列名: BulkChange}, 追加した件数, 競合) を返す
+        # 未保存のフィールドはそのまま残す (取り込む値と異なれば競合)
+        self.save_current_values()
+        def local(record_key):
+            item = self.index.get(diff.key, record_key)
+            return (item, self.dirty.dirty_fields(item["id"])) if item is not None else (None, ())
+        from catalog_diff import merge_plan
+        updates, added, conflicts = merge_plan(diff, local)
+        changes = self.write_records(updates, diff.key)
+        return changes, self.append_records(added), conflicts
+
+    def append_records(self, rows):
+        # 追加された商品 [FIELDS 順の値] を末尾に足して未保存の印を付ける (mmap のファイルには足せないため 0 件)
+        if not rows or isinstance(self.data, MappedCsvStore): return 0
+        items = [row_to_item(dict(zip(FIELDS, values))) for values in rows]
+        start = len(self.data)
+        self.data.extend(items)
+        ids = [item["id"] for item in items]
+        for key in FIELDS: self.dirty.mark_many(ids, key)
+        self.append_items(self.data[start:])
+        if self.validator.revalidate(range(start, len(self.data)), FIELDS): self.schedule_validation()
+        return len(items)
+
+    def bulk_changed(self, changes):
+        # 列単位でまとめて書き換えた値を未保存の印・索引・表示中のフォームに反映
+        self.stats.bulk_edit(self.data, changes)
+        self.unique.bulk_edit(changes)
+        for key, change in changes.items():
+            ids = self.data.get_many("id", change.rows)
+            self.dirty.mark_many(ids, key)
+            # id 自体を書き換えた場合は、ジャーナルを読み戻すときに変更前の id で探す
+            if self.journal: self.journal.record_many(change.old if key == "id" else ids, key, change.new)
+            if key not in self.index.keys and key not in INDEXED_FIELDS: continue
+            for record_id, row, old, new in zip(ids, change.rows, change.old, change.new):
+                item = self.index.get("id", record_id)
+                if item is None or item.row != row: item = self.data[row]
+                self.index.rekey(item, key, old, new)
+                self.search_index.update(row, item, {key: (old, new)})
+        rows = sorted({row for change in changes.values() for row in change.rows})
+        if self.validator.revalidate(rows, changes): self.schedule_validation()
+        self.refresh_tabs()
+        self.load_active_item()
+
+    def replay_edits(self, entries):
+        # ジャーナルに残っていた編集 [(レコードid, フィールド, 値), ...] をデータに適用し、適用した件数を返す
+        applied, rows, keys = 0, set(), set()
+        with self.data.transaction():
+            for record_id, key, value in entries:
+                item = self.index.get("id", record_id)
+                if item is None or key not in item: continue # レコード・列がなくなった
+                if self.write_fields(item, {key: value}):
+                    rows.add(item.row)
+                    keys.add(key)
+                    applied += 1
+        if rows and self.validator.revalidate(sorted(rows), keys): self.schedule_validation()
+        self.binding.invalidate()
+        self.refresh_tabs()
+        self.load_active_item()
+        return applied
+
+    def undo(self, event=None):
+        # 直前の編集を元に戻す (Ctrl+Z)。入力中の値は先に履歴に入れる
+        self.save_current_values()
+        entry = self.history.undo()
+        if entry: self.apply_history(entry, undo=True)
+        return "break"
+
+    def redo(self, event=None):
+        # 元に戻した編集をやり直す (Ctrl+Y / Ctrl+Shift+Z)
+        self.save_current_values()
+        entry = self.history.redo()
+        if entry: self.apply_history(entry, undo=False)
+        return "break"
+
+    def apply_history(self, entry, undo):
+        # 履歴の差分を書き戻す (undo=True なら変更前の値、False なら変更後の値)
+        if isinstance(entry, ColumnEdit):
+            changes = {}
+            with self.data.transaction():
+                for key, change in entry.changes.items():
+                    old, new = (change.new, change.old) if undo else (change.old, change.new)
+                    self.data.set_many(key, change.rows, new)
+                    changes[key] = BulkChange(key, change.rows, old, new)
+                self.bulk_changed(changes)
+            return
+        item = self.index.get("id", entry.current_id() if undo else entry.record_id)
+        if item is None: return # 別のファイルを開いたなどでレコードがなくなった
+        record_id = item["id"]
+        with self.data.transaction(): changes = self.write_fields(item, {key: (old if undo else new) for key, (old, new) in entry.changes.items()})
+        if changes:
+            if self.journal: self.journal.record(record_id, changes)
+            if self.validator.revalidate([item.row], changes): self.schedule_validation()
+        self.active_id = item["id"] # 書き戻したレコードを開く
+        self.refresh_tabs()
+        self.load_active_item()
+
+    def unsaved_edits(self):
+        # 未保存のフィールドの現在の値を [(レコードid, フィールド, 値), ...] で返す (ジャーナルの作り直し用)
+        entries = []
+        for record_id in self.dirty:
+            item = self.index.get("id", record_id)
+            if item is not None: entries.extend((record_id, key, item[key]) for key in sorted(self.dirty.dirty_fields(record_id)))
+        return entries
 
+    def start_validation(self):
+        # 全件の検証を始める (大きなファイルではプロセスプールで並列に実行)
+        self.validator.start()
+        self.schedule_validation()
+
+    def schedule_validation(self):
+        if not self.validating:
+            self.validating = True
+            self.after(1, self.validation_step)
+
+    def validation_step(self):
+        if not self.validator.step():
+            self.after(5, self.validation_step)
+            return
+        self.validating = False
+
+    def schedule_preview(self, event=None):
+        if self.preview_after: self.after_cancel(self.preview_after)
+        self.preview_after = self.after(self.PREVIEW_DELAY_MS, self.on_typing_paused)
+
+    def on_typing_paused(self):
+        # 入力の区切りごとにデータへ書き戻す (続けて入力した分は履歴上1つの操作にまとまる)
+        self.preview_after = None
+        self.save_current_values()
+        self.update_preview()
+
+    @profiler.timed("update_preview")
     def update_preview(self, event=None):
+        if self.preview_after:
+            self.after_cancel(self.preview_after)
+            self.preview_after = None
         html_content = self.desc_source.get("1.0", "end-1c")
-        text_content = html_content.replace("<br>", "\n").replace("</p>", "\n\n").replace("</li>", "\n")
-        text_content = re.sub(r'<li>', '・ ', text_content)
-        text_content = re.sub(r'<[^>]+>', '', text_content)
+        self.preview_token += 1
+        text_content = self.preview.submit(html_content, self.preview_token)
+        if text_content is not None:
+            self.preview_waiting = None
+            self.show_preview(text_content)
+            return
+        if self.preview_waiting is None: self.after(self.PREVIEW_POLL_MS, self.poll_preview)
+        self.preview_waiting = self.preview_token
+
+    def poll_preview(self):
+        result = self.preview.poll()
+        if self.preview_waiting is None: return
+        if result and result[0] == self.preview_waiting:
+            self.preview_waiting = None
+            self.show_preview(result[1])
+        else: self.after(self.PREVIEW_POLL_MS, self.poll_preview)
+
+    def show_preview(self, text_content):
+        # 表示中のテキストとの差分の範囲だけを書き換える (BMP 外の文字があれば全体を置き換える)
+        if text_content == self.preview_text: return
         self.desc_preview.configure(state="normal")
-        self.desc_preview.delete("1.0", "end")
-        self.desc_preview.insert("1.0", text_content)
+        replace_text(self.desc_preview, self.preview_text, text_content)
         self.desc_preview.configure(state="disabled")
+        self.preview_text = text_content
 
 class SettingsView(ctk.CTkScrollableFrame):
-    def __init__(self, master, on_back, icons, **kwargs):
+    def __init__(self, master, on_back, icons, settings, **kwargs):
         super().__init__(master, fg_color="transparent", **kwargs)
         self.on_back = on_back
         self.icons = icons
+        self.settings = settings
+        from ai_copy import AI_MODELS
+        if not settings["ai_model"].get(): settings["ai_model"].set(AI_MODELS[0])
         
         header = ctk.CTkFrame(self, fg_color="transparent")
         header.pack(fill="x", pady=20, padx=20)
@@ -325,10 +783,16 @@ class SettingsView(ctk.CTkScrollableFrame):
         self.create_settings_section(content, "一般設定", [
             ("テーマ", self.create_theme_selector),
             ("言語", lambda p: ctk.CTkOptionMenu(p, values=["日本語", "English"]).pack(anchor="e")),
+            ("保存方式", lambda p: ctk.CTkOptionMenu(p, values=list(SAVE_MODES), variable=self.settings["save_mode"]).pack(anchor="e")),
+            ("保存時の文字コード", lambda p: ctk.CTkOptionMenu(p, values=list(EXPORT_ENCODINGS), variable=self.settings["export_encoding"]).pack(anchor="e")),
+            ("読み込み方式", lambda p: ctk.CTkOptionMenu(p, values=list(LOAD_MODES), variable=self.settings["load_mode"]).pack(anchor="e")),
+            ("自動保存", lambda p: ctk.CTkSwitch(p, text="", variable=self.settings["autosave"]).pack(anchor="e")),
         ])
         self.create_settings_section(content, "AI 機能設定", [
-            ("AIモデル", lambda p: ctk.CTkOptionMenu(p, values=["gpt-4o", "gemini-1.5-pro"]).pack(anchor="e")),
-            ("APIキー", lambda p: ctk.CTkEntry(p, show="*", width=300, placeholder_text="sk-...").pack(anchor="e"))
+            ("AIモデル", lambda p: ctk.CTkOptionMenu(p, values=list(AI_MODELS), variable=self.settings["ai_model"]).pack(anchor="e")),
+            ("APIキー", lambda p: ctk.CTkEntry(p, show="*", width=300, placeholder_text="sk-...", textvariable=self.settings["api_key"]).pack(anchor="e")),
+            ("同時リクエスト数", lambda p: ctk.CTkOptionMenu(p, values=["1", "2", "4", "8", "16", "32"], variable=self.settings["ai_concurrency"]).pack(anchor="e")),
+            ("1秒あたりのリクエスト数", lambda p: ctk.CTkOptionMenu(p, values=["1", "2", "5", "10", "20", "50"], variable=self.settings["ai_rate"]).pack(anchor="e")),
         ])
 
     def create_settings_section(self, parent, title, items):
@@ -351,14 +815,414 @@ class SettingsView(ctk.CTkScrollableFrame):
         for mode in modes:
             ctk.CTkRadioButton(frame, text=mode, variable=self.theme_var, value=mode, command=lambda m=mode: change_theme(m)).pack(side="left", padx=5)
 
+class BulkEditDialog(ctk.CTkToplevel):
+    """一括編集ダイアログ (条件に一致する商品の価格・在庫・フラグなどをまとめて変更)"""
+    HELP = (
+        "Filter:  rank == 'C'    '家電' in name    selling_price >= 1000 and is_published\n"
+        "Change:  selling_price = selling_price * 1.05    is_sale = True\n"
+        "         selling_price = round(cost_price * 1.3, -1)    (one per line)\n"
+        "Functions: round (half up, -1 = tens) / floor / ceil / abs / min / max / number\n"
+        "Decimals written to numeric columns are rounded half up. Empty numbers never match."
+    )
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.app = app
+        self.title("Bulk Edit")
+        self.geometry("640x420")
+        self.transient(app)
+        ctk.CTkLabel(self, text="Filter (empty = all items)", font=("Meiryo UI", 12, "bold"), anchor="w").pack(fill="x", padx=20, pady=(20, 2))
+        self.condition = ctk.CTkEntry(self, height=32, font=("Consolas", 13), placeholder_text="rank == 'C'")
+        self.condition.pack(fill="x", padx=20)
+        ctk.CTkLabel(self, text="Change (column = expression)", font=("Meiryo UI", 12, "bold"), anchor="w").pack(fill="x", padx=20, pady=(15, 2))
+        self.assignments = ctk.CTkTextbox(self, height=80, font=("Consolas", 13))
+        self.assignments.pack(fill="x", padx=20)
+        ctk.CTkLabel(self, text=self.HELP, font=("Meiryo UI", 11), text_color="gray", justify="left", anchor="w").pack(fill="x", padx=20, pady=10)
+        footer = ctk.CTkFrame(self, fg_color="transparent")
+        footer.pack(fill="x", padx=20, pady=(0, 20), side="bottom")
+        self.status = ctk.CTkLabel(footer, text="", font=("Meiryo UI", 12), anchor="w")
+        self.status.pack(side="left", fill="x", expand=True)
+        ctk.CTkButton(footer, text="Apply", width=90, fg_color=AppColors.ACTION_SAVE, hover_color="#047857", command=self.on_apply).pack(side="right")
+        ctk.CTkButton(footer, text="Count", width=100, fg_color="transparent", border_width=1, text_color=("gray20", "gray80"), command=self.on_preview).pack(side="right", padx=10)
+
+    def show_error(self, message):
+        self.status.configure(text=message, text_color=AppColors.BRAND_RED)
+
+    def build(self):
+        # 式に誤りがあればメッセージを表示して None を返す
+        try: return BulkEdit(self.app.data, self.condition.get(), self.assignments.get("1.0", "end-1c"))
+        except BulkEditError as e: self.show_error(str(e))
+
+    def preview(self, edit):
+        try: matched, skipped = edit.preview()
+        except BulkEditError as e:
+            self.show_error(str(e))
+            return None
+        text = f"Matches: {matched} items" + (f" ({skipped} skipped: empty numbers)" if skipped else "")
+        self.status.configure(text=text, text_color=("gray10", "gray90"))
+        return matched - skipped
+
+    def on_preview(self):
+        edit = self.build()
+        if edit: self.preview(edit)
+
+    def on_apply(self):
+        if self.app.exporter or self.app.loader:
+            self.show_error("Please wait until loading / saving finishes.")
+            return
+        edit = self.build()
+        count = self.preview(edit) if edit else None
+        if not count: return
+        if not messagebox.askyesno("Bulk Edit", f"Apply the change to {count} items?", parent=self): return
+        try: changes = self.app.editor_view.apply_bulk_edit(edit)
+        except BulkEditError as e:
+            self.show_error(str(e))
+            return
+        summary = ", ".join(f"{key} {len(change)}" for key, change in changes.items()) or "no values changed"
+        self.status.configure(text=f"Changed: {summary}", text_color=("gray10", "gray90"))
+        self.app.warn_collisions(self.app.editor_view.written_collisions(changes), parent=self)
+
+class AiCopyDialog(ctk.CTkToplevel):
+    """AIによるキャッチコピー・商品説明の生成 (生成した順に書き込み、元に戻すでまとめて取り消せる)"""
+    TARGET_ACTIVE, TARGET_CONDITION = "Current item", "Filtered items"
+    FIELD_LABELS = {"catch_copy": "キャッチコピー", "description": "商品説明 (HTML)"}
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.app = app
+        self.title("AI Copy")
+        self.geometry("560x360")
+        self.transient(app)
+        from ai_copy import GENERATED_FIELDS
+        ctk.CTkLabel(self, text="Target", font=("Meiryo UI", 12, "bold"), anchor="w").pack(fill="x", padx=20, pady=(20, 2))
+        self.target = ctk.StringVar(value=self.TARGET_ACTIVE)
+        ctk.CTkSegmentedButton(self, values=[self.TARGET_ACTIVE, self.TARGET_CONDITION], variable=self.target).pack(anchor="w", padx=20)
+        self.condition = ctk.CTkEntry(self, height=32, font=("Consolas", 13), placeholder_text="rank == 'C'  (same as Bulk Edit; empty = all items)")
+        self.condition.pack(fill="x", padx=20, pady=(8, 0))
+        ctk.CTkLabel(self, text="Generate", font=("Meiryo UI", 12, "bold"), anchor="w").pack(fill="x", padx=20, pady=(15, 2))
+        fields = ctk.CTkFrame(self, fg_color="transparent")
+        fields.pack(fill="x", padx=20)
+        self.fields = {key: ctk.BooleanVar(value=key == "catch_copy") for key in GENERATED_FIELDS}
+        for key, var in self.fields.items(): ctk.CTkCheckBox(fields, text=self.FIELD_LABELS[key], variable=var, font=("Meiryo UI", 12)).pack(side="left", padx=(0, 20))
+        self.only_empty = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(self, text="Only empty fields", variable=self.only_empty, font=("Meiryo UI", 12)).pack(anchor="w", padx=20, pady=(10, 0))
+        footer = ctk.CTkFrame(self, fg_color="transparent")
+        footer.pack(fill="x", padx=20, pady=(0, 20), side="bottom")
+        self.status = ctk.CTkLabel(footer, text="", font=("Meiryo UI", 12), anchor="w")
+        self.status.pack(side="left", fill="x", expand=True)
+        ctk.CTkButton(footer, text="Generate", width=90, fg_color=AppColors.ACTION_SAVE, hover_color="#047857", command=self.on_start).pack(side="right")
+        ctk.CTkButton(footer, text="Stop", width=80, fg_color="transparent", border_width=1, text_color=("gray20", "gray80"), command=self.on_stop).pack(side="right", padx=10)
+
+    def show_error(self, message):
+        self.status.configure(text=message, text_color=AppColors.BRAND_RED)
+
+    def on_start(self):
+        if self.app.exporter or self.app.loader: return self.show_error("Please wait until loading / saving finishes.")
+        fields = tuple(key for key, var in self.fields.items() if var.get())
+        if not fields: return self.show_error("Select at least one field.")
+        editor = self.app.editor_view
+        if self.target.get() == self.TARGET_ACTIVE:
+            editor.save_current_values()
+            item = editor.index.get("id", editor.active_id)
+            rows = [item.row] if item else []
+        else:
+            try: rows, _ = BulkEdit(self.app.data, self.condition.get(), "").select()
+            except BulkEditError as e: return self.show_error(str(e))
+        count = self.app.start_copy_generation(list(rows), fields, self.only_empty.get())
+        if count is not None:
+            self.status.configure(text=f"Generating {count} items (progress in the header)" if count else "Nothing to generate", text_color=("gray10", "gray90"))
+
+    def on_stop(self):
+        if self.app.stop_copy_generation(): self.status.configure(text="Stopped", text_color=("gray10", "gray90"))
+
+class ValidationDialog(ctk.CTkToplevel):
+    """全件検証の結果一覧 (ダブルクリックでその商品を開く)。表示中だけ REFRESH_MS ごとに変化を確認して描き直す"""
+    REFRESH_MS = 300
+    MAX_LISTED = 1000
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.app = app
+        self.validator = app.editor_view.validator
+        self.shown_version = None
+        self.listed = []
+        self.title("Validation")
+        self.geometry("720x520")
+        self.transient(app)
+        header = ctk.CTkFrame(self, fg_color="transparent")
+        header.pack(fill="x", padx=20, pady=(20, 10))
+        ctk.CTkButton(header, text="Validate all", width=110, fg_color=AppColors.BRAND_BLUE, command=self.on_validate).pack(side="left")
+        self.status = ctk.CTkLabel(header, text="", font=("Meiryo UI", 12), anchor="w")
+        self.status.pack(side="left", padx=15, fill="x", expand=True)
+        self.summary = ctk.CTkLabel(self, text="", font=("Meiryo UI", 11), text_color="gray", justify="left", anchor="w")
+        self.summary.pack(fill="x", padx=20)
+        self.listbox = ctk.CTkTextbox(self, font=("Consolas", 12), wrap="none")
+        self.listbox.pack(fill="both", expand=True, padx=20, pady=(5, 20))
+        self.listbox.bind("<Double-Button-1>", self.on_open_item)
+        self.listbox.configure(state="disabled")
+        if not self.validator.checked and not self.validator.busy(): self.on_validate()
+        self.refresh()
+
+    def on_validate(self):
+        if self.app.loader:
+            self.status.configure(text="Please wait until loading finishes.")
+            return
+        self.app.editor_view.start_validation()
+
+    def refresh(self):
+        if not self.winfo_exists(): return
+        if self.validator.busy(): self.status.configure(text=f"Validating... {int(self.validator.progress() * 100)}%")
+        elif self.validator.version != self.shown_version:
+            self.shown_version = self.validator.version
+            self.render()
+        self.after(self.REFRESH_MS, self.refresh)
+
+    def render(self):
+        issues = self.validator.all_issues()
+        if not self.validator.checked: self.status.configure(text="Not validated yet")
+        else:
+            elapsed = f" ({self.validator.seconds:.1f}s)" if self.validator.seconds is not None else ""
+            self.status.configure(text=f"{len(issues)} issues in {len(self.validator.issues)} items{elapsed}")
+        counts = {}
+        for issue in issues: counts[issue.field] = counts.get(issue.field, 0) + 1
+        self.summary.configure(text="  ".join(f"{field}: {count}" for field, count in sorted(counts.items(), key=lambda c: -c[1])))
+        self.listed = issues[:self.MAX_LISTED]
+        lines = [f"{issue.id:<12} {issue.field:<16} {issue.message}" for issue in self.listed]
+        if len(issues) > self.MAX_LISTED: lines.append(f"... and {len(issues) - self.MAX_LISTED} more")
+        self.listbox.configure(state="normal")
+        self.listbox.delete("1.0", "end")
+        self.listbox.insert("1.0", "\n".join(lines))
+        self.listbox.configure(state="disabled")
+
+    def on_open_item(self, event):
+        line = int(self.listbox.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if 0 <= line < len(self.listed):
+            self.app.show_editor()
+            self.app.editor_view.switch_tab(self.listed[line].id)
+
+class MergeDialog(ctk.CTkToplevel):
+    """差分取り込みの結果。競合 (未保存の編集と取り込む値が異なるフィールド) と取り込まなかった削除の一覧 (ダブルクリックでその商品を開く)"""
+    MAX_LISTED = 1000
+    VALUE_WIDTH = 24
+
+    def __init__(self, app, path, diff, changes, appended, conflicts, **kwargs):
+        super().__init__(app, **kwargs)
+        self.app, self.diff = app, diff
+        from catalog_diff import REMOVED_FIELD
+        self.conflicts = [c for c in conflicts if c.field != REMOVED_FIELD]
+        self.listed = []
+        self.title(f"Merge: {os.path.basename(path)}")
+        self.geometry("760x520")
+        self.transient(app)
+        updated = sum(len(change) for change in changes.values())
+        skipped = len(diff.added) - appended
+        text = f"{diff.summary()} ({diff.seconds:.1f}s)\nUpdated {updated} values / Added {appended} items"
+        if skipped: text += f" ({skipped} items not added: file is memory-mapped)"
+        self.status = ctk.CTkLabel(self, text=text, font=("Meiryo UI", 12), justify="left", anchor="w")
+        self.status.pack(fill="x", padx=20, pady=(20, 5))
+        footer = ctk.CTkFrame(self, fg_color="transparent")
+        footer.pack(fill="x", padx=20, pady=(0, 20), side="bottom")
+        self.resolve_button = ctk.CTkButton(footer, text="Take incoming", width=140, fg_color=AppColors.BRAND_BLUE, command=self.on_take_incoming)
+        self.resolve_button.pack(side="right")
+        if not self.conflicts: self.resolve_button.configure(state="disabled")
+        self.listbox = ctk.CTkTextbox(self, font=("Consolas", 12), wrap="none")
+        self.listbox.pack(fill="both", expand=True, padx=20, pady=5)
+        self.listbox.bind("<Double-Button-1>", self.on_open_item)
+        self.render(conflicts)
+
+    def shorten(self, value):
+        value = str(value).replace("\n", " ")
+        return value if len(value) <= self.VALUE_WIDTH else value[:self.VALUE_WIDTH - 1] + "…"
+
+    def render(self, conflicts):
+        lines, self.listed = [f"{len(conflicts)} conflicts (local edits kept)"], [None]
+        for conflict in conflicts[:self.MAX_LISTED]:
+            lines.append(f"{conflict.key:<12} {conflict.field:<16} local: {self.shorten(conflict.local):<{self.VALUE_WIDTH}}  incoming: {self.shorten(conflict.incoming)}")
+            self.listed.append(conflict.key)
+        if self.diff.removed:
+            lines.append(f"\n{len(self.diff.removed)} items missing from the incoming CSV (not deleted)")
+            self.listed += [None, None]
+            for key in self.diff.removed[:self.MAX_LISTED]:
+                lines.append(key)
+                self.listed.append(key)
+        if len(conflicts) > self.MAX_LISTED or len(self.diff.removed) > self.MAX_LISTED: lines.append(f"... showing up to {self.MAX_LISTED}")
+        self.listbox.configure(state="normal")
+        self.listbox.delete("1.0", "end")
+        self.listbox.insert("1.0", "\n".join(lines))
+        self.listbox.configure(state="disabled")
+
+    def on_take_incoming(self):
+        if not messagebox.askyesno("Merge", f"Overwrite {len(self.conflicts)} local edits with the incoming values?", parent=self): return
+        records = {}
+        for conflict in self.conflicts: records.setdefault(conflict.key, {})[conflict.field] = conflict.incoming
+        editor = self.app.editor_view
+        editor.save_current_values()
+        editor.write_records(records, self.diff.key)
+        self.conflicts = []
+        self.resolve_button.configure(state="disabled")
+        self.render([])
+
+    def on_open_item(self, event):
+        line = int(self.listbox.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if 0 <= line < len(self.listed) and self.listed[line] is not None:
+            item = self.app.editor_view.index.get(self.diff.key, self.listed[line])
+            if item is not None:
+                self.app.show_editor()
+                self.app.editor_view.switch_tab(item["id"])
+
+class CollisionDialog(ctk.CTkToplevel):
+    """JAN / インストアJAN / WebCD / id が重複している商品の一覧 (ダブルクリックでその商品を開く。id の重複は最初の商品)。表示中だけ REFRESH_MS ごとに描き直す"""
+    REFRESH_MS = 300
+    MAX_LISTED = 500
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.app = app
+        self.unique = app.editor_view.unique
+        self.shown_version = None
+        self.listed = []
+        self.title("Duplicates")
+        self.geometry("720x520")
+        self.transient(app)
+        self.status = ctk.CTkLabel(self, text="", font=("Meiryo UI", 12), anchor="w")
+        self.status.pack(fill="x", padx=20, pady=(20, 5))
+        self.listbox = ctk.CTkTextbox(self, font=("Consolas", 12), wrap="none")
+        self.listbox.pack(fill="both", expand=True, padx=20, pady=(5, 20))
+        self.listbox.bind("<Double-Button-1>", self.on_open_item)
+        self.listbox.configure(state="disabled")
+        self.refresh()
+
+    def refresh(self):
+        if not self.winfo_exists(): return
+        if self.unique.pending(): self.status.configure(text=f"Checking... {self.unique.counted} / {self.unique.total}")
+        elif self.unique.version != self.shown_version:
+            self.shown_version = self.unique.version
+            self.render()
+        self.after(self.REFRESH_MS, self.refresh)
+
+    def render(self):
+        data = self.app.data
+        collisions = self.unique.collisions(data, self.MAX_LISTED)
+        total = self.unique.count()
+        if not total: self.status.configure(text="No duplicates")
+        else:
+            more = f" (showing up to {self.MAX_LISTED})" if total > self.MAX_LISTED else ""
+            self.status.configure(text=f"{total} duplicated values in {sum(len(c.rows) for c in collisions)} items{more}")
+        lines, self.listed = [], []
+        for collision in collisions:
+            lines.append(f"{FIELD_MAP[collision.key].label}: {collision.value} ({len(collision.rows)})")
+            self.listed.append(None)
+            for row, record_id, name in zip(collision.rows, data.get_many("id", collision.rows), data.get_many("name", collision.rows)):
+                lines.append(f"    {record_id:<12} {name}")
+                self.listed.append(row)
+        self.listbox.configure(state="normal")
+        self.listbox.delete("1.0", "end")
+        self.listbox.insert("1.0", "\n".join(lines))
+        self.listbox.configure(state="disabled")
+
+    def on_open_item(self, event):
+        line = int(self.listbox.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if 0 <= line < len(self.listed) and self.listed[line] is not None and self.listed[line] < len(self.app.data):
+            self.app.show_editor()
+            self.app.editor_view.switch_tab(self.app.data.get_many("id", [self.listed[line]])[0])
+
+class StatsPanel(ctk.CTkFrame):
+    """ヘッダーの集計パネル (集計は EditorView.stats が編集の差分で更新し、ここでは表示だけを書き換える)"""
+    def __init__(self, master, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.version = None
+        self.summary = ctk.CTkLabel(self, text="", text_color="#bfdbfe", font=("Meiryo UI", 11), anchor="e", height=16)
+        self.summary.pack(fill="x")
+        self.margins = ctk.CTkLabel(self, text="", text_color="#bfdbfe", font=("Meiryo UI", 10), anchor="e", height=14)
+        self.margins.pack(fill="x")
+
+    def refresh(self, stats):
+        if stats.version == self.version: return
+        self.version = stats.version
+        summary = (f"Stock value ¥{stats.stock_value:,.0f} / Published {stats.published:,} / Sale {stats.sale:,}"
+                   f" / Out of stock {stats.out_of_stock:,} ({stats.published_out_of_stock:,} published)")
+        if stats.pending(): summary += " (counting...)"
+        self.summary.configure(text=summary)
+        rates = stats.margin_rates()
+        self.margins.configure(text="Margin " + "  ".join(f"{rank or '-'}: {rate:.1%}" for rank, rate in rates) if rates else "")
+
+
+class PerfOverlay(ctk.CTkFrame):
+    """計測値のオーバーレイ (F12 / 件数表示のクリックで表示切り替え)。表示中だけ REFRESH_MS ごとに集計を読み直す"""
+    REFRESH_MS = 500
+    TIMERS = ("switch_tab", "refresh_tabs", "load_active_item", "save_current_values", "update_preview", "on_save", "export")
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, corner_radius=8, border_width=1, border_color=("gray70", "gray40"), **kwargs)
+        self.visible = False
+        self.refresh_after = None
+        self.text = ctk.CTkLabel(self, text="", font=("Consolas", 11), justify="left", anchor="w")
+        self.text.pack(fill="x", padx=10, pady=(8, 4))
+        buttons = ctk.CTkFrame(self, fg_color="transparent")
+        buttons.pack(fill="x", padx=10, pady=(0, 8))
+        ctk.CTkButton(buttons, text="Save trace", width=100, height=24, fg_color=AppColors.BRAND_BLUE, command=self.on_export).pack(side="left")
+        ctk.CTkButton(buttons, text="Reset", width=70, height=24, fg_color="transparent", border_width=1, text_color=("gray20", "gray80"), command=profiler.reset).pack(side="left", padx=5)
+
+    def toggle(self, event=None):
+        self.visible = not self.visible
+        if self.visible:
+            self.place(relx=1.0, x=-15, y=55, anchor="ne") # ヘッダー (status_label) の右下に重ねる
+            self.lift()
+            self.refresh()
+            return
+        self.place_forget()
+        if self.refresh_after:
+            self.after_cancel(self.refresh_after)
+            self.refresh_after = None
+
+    def refresh(self):
+        snapshot = profiler.snapshot()
+        lines = [f"{'':<20}{'last':>9}{'avg':>9}{'max':>9}{'count':>8}"]
+        for name in self.TIMERS:
+            stat = snapshot["timers"].get(name)
+            if stat: lines.append(f"{name:<20}{stat['last_ms']:>7.1f}ms{stat['avg_ms']:>7.1f}ms{stat['max_ms']:>7.1f}ms{stat['count']:>8}")
+            else: lines.append(f"{name:<20}{'-':>9}{'-':>9}{'-':>9}{0:>8}")
+        created = snapshot["counters"].get("tk.widgets.created", 0)
+        destroyed = snapshot["counters"].get("tk.widgets.destroyed", 0)
+        lines.append(f"Tk widgets  created {created}  destroyed {destroyed}  alive {created - destroyed}")
+        self.text.configure(text="\n".join(lines))
+        self.refresh_after = self.after(self.REFRESH_MS, self.refresh)
+
+    def on_export(self):
+        path = filedialog.asksaveasfilename(title="Save trace (open in chrome://tracing / Perfetto)", defaultextension=".json", initialfile="eltex-trace.json", filetypes=[("JSON", "*.json")])
+        if not path: return
+        try: profiler.export_chrome_trace(path)
+        except OSError as e: messagebox.showerror("Export Error", f"Saving the trace failed.\n{e}")
+
 class App(ctk.CTk):
-    def __init__(self):
+    LOADER_POLL_MS = 50
+    SNAPSHOT_CHUNK_SIZE = 5000 # キャッシュから読み込んだ行をタブ・索引に登録する1回分の行数
+    SNAPSHOT_POLL_MS = 500
+    SQLITE_CHUNK_SIZE = 500 # SQLite への取り込みは1行あたりが重いため、1回に登録する行を減らす
+    EXPORT_POLL_MS = 50
+    EXPORT_CHUNK_SIZE = 2000
+    COPY_POLL_MS = 500 # AI生成の結果をまとめて書き込む間隔
+    DIFF_POLL_MS = 100 # 差分の計算が終わるのを待つ間隔
+    STATS_REFRESH_MS = 300 # 集計パネルの表示を更新する間隔
+
+    def __init__(self, csv_path=None, data=None):
+        install_widget_counters() # 以降に作られるTkウィジェットの生成・破棄を数える
         super().__init__()
         self.title("eltex CSV Editor - Corporate Edition")
         self.geometry("1200x800")
         
         self.icons = self.load_icons()
-        self.data = generate_dummy_data()
+        self.loader = None
+        self.exporter = None
+        self.journal = None # 未保存の編集を追記する EditJournal (異常終了しても次に開いたときに復元する)
+        self.diff_worker = None # 実行中の差分の計算 (DiffWorker)
+        self.copy_generator, self.copy_cache, self.copy_runs = None, None, 0 # AI生成 (キャッシュは最初に生成するときに読み込む)
+        self.catalog_cache = CatalogCache() # 解析済みのCSVを次回から素早く開くためのキャッシュ
+        self.csv_path = csv_path
+        self.settings = {"save_mode": ctk.StringVar(value=SAVE_MODES[0]), "export_encoding": ctk.StringVar(value="UTF-8"), "load_mode": ctk.StringVar(value=LOAD_MODES[0]), "autosave": ctk.BooleanVar(value=True),
+                         "ai_model": ctk.StringVar(value=""), "api_key": ctk.StringVar(value=""), "ai_concurrency": ctk.StringVar(value="8"), "ai_rate": ctk.StringVar(value="5")} # ai_model の空欄は AI_MODELS の先頭 (設定画面を開いたときに入れる)
+        self.settings["autosave"].trace_add("write", lambda *args: self.autosave_changed())
+        self.data = ColumnStore() if csv_path else ColumnStore(generate_dummy_data() if data is None else data)
         
         self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
@@ -366,23 +1230,30 @@ class App(ctk.CTk):
         self.create_header()
         
         self.editor_view = EditorView(self, self.data, self.icons)
-        self.settings_view = SettingsView(self, self.show_editor, self.icons)
+        self.settings_view = None # 設定画面は最初に開かれたときに作る
+        self.bulk_dialog = None
+        self.validation_dialog = None
+        self.ai_dialog = None
+        self.merge_dialog = None
+        self.collision_dialog = None
         self.show_editor()
+        self.perf_overlay = PerfOverlay(self)
+        self.bind("<F12>", self.perf_overlay.toggle)
+        self.bind("<Control-z>", self.editor_view.undo)
+        self.bind("<Control-y>", self.editor_view.redo)
+        self.bind("<Control-Z>", self.editor_view.redo) # Ctrl+Shift+Z
+        self.status_label.bind("<Button-1>", self.perf_overlay.toggle)
+        self.startup_seconds = None
+        self.after_idle(self.on_first_frame)
+        self.after(self.STATS_REFRESH_MS, self.refresh_stats)
+        if csv_path: self.load_csv(csv_path)
 
     def load_icons(self):
-        icons = {}
         icon_defs = {
             "app": "assets/app_icon.png", "save": "assets/save.png", "settings": "assets/settings.png",
             "box": "assets/box.png", "github": "assets/github.png", "web": "assets/globe.png", "back": "assets/chevron-left.png"
         }
-        for name, path in icon_defs.items():
-            if os.path.exists(path):
-                try:
-                    pil_image = Image.open(path)
-                    icons[name] = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(20, 20))
-                except: icons[name] = None
-            else: icons[name] = None
-        return icons
+        return IconLoader(icon_defs)
 
     def create_header(self):
         # ヘッダー背景を「コーポレート・ブルー」に設定
@@ -402,26 +1273,365 @@ class App(ctk.CTk):
         btn_frame = ctk.CTkFrame(header, fg_color="transparent")
         btn_frame.pack(side="right", padx=15)
         
+        self.stats_panel = StatsPanel(btn_frame)
+        self.stats_panel.pack(side="left", padx=(0, 5))
         self.status_label = ctk.CTkLabel(btn_frame, text=f"Data: {len(self.data)} items", text_color="#bfdbfe", font=("Meiryo UI", 12))
         self.status_label.pack(side="left", padx=15)
         
         # 保存ボタンは視認性重視でグリーン、設定ボタンはヘッダーに馴染む色
+        ctk.CTkButton(btn_frame, text="開く", width=80, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.on_open).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="検証", width=70, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_validation).pack(side="left", padx=5)
+        self.unique_button = ctk.CTkButton(btn_frame, text="重複", width=70, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_collisions)
+        self.unique_button.pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="差分取り込み", width=100, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_merge).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="AI生成", width=80, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_ai_copy).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="一括編集", width=90, fg_color="transparent", border_width=1, border_color="#bfdbfe", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_bulk_edit).pack(side="left", padx=5)
         ctk.CTkButton(btn_frame, text="保存", image=self.icons.get("save"), width=100, fg_color=AppColors.ACTION_SAVE, hover_color="#047857", command=self.on_save).pack(side="left", padx=5)
         ctk.CTkButton(btn_frame, text="", image=self.icons.get("settings"), width=40, fg_color="transparent", hover_color=AppColors.BRAND_BLUE_HOVER, command=self.show_settings).pack(side="left", padx=5)
 
+    def refresh_stats(self):
+        # 集計・重複は編集のたびに差分で更新されているため、ここでは表示を書き換えるだけ
+        self.stats_panel.refresh(self.editor_view.stats)
+        count = self.editor_view.unique.count()
+        text = f"重複 {count}" if count else "重複"
+        if self.unique_button.cget("text") != text: self.unique_button.configure(text=text, text_color="#ef4444" if count else ctk.ThemeManager.theme["CTkButton"]["text_color"])
+        self.after(self.STATS_REFRESH_MS, self.refresh_stats)
+
+    def on_first_frame(self):
+        # time-to-first-frame を記録 (ELTEX_STARTUP_LOG に指定したファイルへ1起動1行で追記)
+        self.startup_seconds = time.perf_counter() - STARTUP_T0
+        log_path = os.environ.get("ELTEX_STARTUP_LOG")
+        if not log_path: return
+        try:
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\ttime_to_first_frame_ms={self.startup_seconds * 1000:.1f}\trows={len(self.data)}\n")
+        except OSError as e: print(f"Error writing startup log {log_path}: {e}")
+
     def show_editor(self):
-        self.settings_view.grid_forget()
+        if self.settings_view: self.settings_view.grid_forget()
         self.editor_view.grid(row=1, column=0, sticky="nsew")
 
     def show_settings(self):
+        if self.settings_view is None: self.settings_view = SettingsView(self, self.show_editor, self.icons, self.settings)
         self.editor_view.grid_forget()
         self.settings_view.grid(row=1, column=0, sticky="nsew")
 
+    def show_bulk_edit(self):
+        if self.bulk_dialog is None or not self.bulk_dialog.winfo_exists(): self.bulk_dialog = BulkEditDialog(self)
+        self.bulk_dialog.focus()
+
+    def show_validation(self):
+        if self.validation_dialog is None or not self.validation_dialog.winfo_exists(): self.validation_dialog = ValidationDialog(self)
+        self.validation_dialog.focus()
+
+    def show_collisions(self):
+        if self.collision_dialog is None or not self.collision_dialog.winfo_exists(): self.collision_dialog = CollisionDialog(self)
+        self.collision_dialog.focus()
+
+    def warn_collisions(self, collisions, parent=None):
+        # 一括編集・差分取り込みで他の商品と同じ値になった項目を知らせて重複の一覧を開く (保存は on_save で止める)
+        if not collisions: return
+        record_id, key, value = collisions[0]
+        messagebox.showwarning("Duplicate", f"{len(collisions)} values now duplicate other items. Fix them before saving.\ne.g. {FIELD_MAP[key].label} \"{value}\" of {record_id}", parent=parent or self)
+        self.show_collisions()
+
+    def show_ai_copy(self):
+        if self.ai_dialog is None or not self.ai_dialog.winfo_exists(): self.ai_dialog = AiCopyDialog(self)
+        self.ai_dialog.focus()
+
+    def show_merge(self):
+        # 取り込むCSVと開いているCSV (前回保存した内容) の差分をワーカースレッドで計算し、終わったら未保存の編集とマージする
+        if self.loader or self.exporter or self.diff_worker:
+            messagebox.showwarning("Merge", "Please wait until loading, saving or diffing finishes.")
+            return
+        if not self.csv_path or not os.path.exists(self.csv_path):
+            messagebox.showwarning("Merge", "Open a CSV file first.")
+            return
+        path = filedialog.askopenfilename(title="Open incoming CSV", filetypes=[("CSV", "*.csv"), ("All", "*.*")])
+        if not path: return
+        from catalog_diff import DiffWorker
+        self.diff_worker = DiffWorker(self.csv_path, path)
+        self.diff_worker.start()
+        self.after(self.DIFF_POLL_MS, self.poll_diff, self.diff_worker, path)
+
+    def poll_diff(self, worker, path):
+        if worker is not self.diff_worker: return # 中止した (別のファイルを開いた)
+        if not worker.finished:
+            self.status_label.configure(text=f"Diffing... {worker.rows} rows")
+            return self.after(self.DIFF_POLL_MS, self.poll_diff, worker, path)
+        self.diff_worker = None
+        self.status_label.configure(text=f"Data: {len(self.data)} items")
+        if worker.error:
+            messagebox.showerror("Merge Error", f"Could not diff the CSV.\n{worker.error}")
+            return
+        changes, appended, conflicts = self.editor_view.merge_incoming(worker.diff)
+        self.status_label.configure(text=f"Data: {len(self.data)} items") # 追加した商品を含める
+        if self.merge_dialog is not None and self.merge_dialog.winfo_exists(): self.merge_dialog.destroy()
+        self.merge_dialog = MergeDialog(self, path, worker.diff, changes, appended, conflicts)
+        self.merge_dialog.focus()
+        rows = {key: list(change.rows) for key, change in changes.items() if key in UNIQUE_FIELDS}
+        if appended:
+            for key in UNIQUE_FIELDS: rows.setdefault(key, []).extend(range(len(self.data) - appended, len(self.data))) # 追加した商品は末尾
+        self.warn_collisions(self.editor_view.collisions_at(rows), parent=self.merge_dialog)
+
+    def stop_diff(self):
+        if self.diff_worker: self.diff_worker.stop()
+        self.diff_worker = None
+
+    def destroy(self):
+        self.editor_view.validator.close() # 検証用のワーカープロセスを止める
+        self.stop_copy_generation()
+        self.stop_diff()
+        self.close_journal() # 未保存の編集は次に同じCSVを開いたときに復元する
+        self.data.close()
+        super().destroy()
+
+    def on_open(self):
+        path = filedialog.askopenfilename(title="Open CSV", filetypes=[("CSV", "*.csv"), ("All", "*.*")])
+        if path: self.load_csv(path)
+
+    def load_csv(self, path):
+        # ワーカースレッドで読み込み、届いたチャンクから順に画面へ反映
+        if self.exporter:
+            messagebox.showwarning("Saving", "Please wait until the export finishes.")
+            return
+        if self.loader: self.loader.stop()
+        # 大きなファイルは mmap で開き、行の位置とキー列だけを読み込む
+        # SQLite の場合はCSVの横のデータベースに取り込み、前回取り込んだものがあればそのまま開く
+        old, mode = self.data, self.settings["load_mode"].get()
+        errors = (OSError, UnicodeDecodeError, csv.Error)
+        try:
+            if mode == LOAD_SQLITE:
+                import sqlite3
+                from sqlite_store import SqliteStore, database_path
+                errors += (sqlite3.Error,)
+                self.data = SqliteStore(database_path(path))
+                self.loader = None if self.reuse_database(self.data, path) else CsvLoader(path, chunk_size=self.SQLITE_CHUNK_SIZE)
+            elif use_mmap(path, mode):
+                self.data = MappedCsvStore(path)
+                self.loader = MappedCsvLoader(self.data)
+            else:
+                self.data, self.loader = ColumnStore(), CachedCsvLoader(path, self.catalog_cache)
+        except errors as e:
+            if self.data is not old: self.data.close()
+            self.loader, self.data = None, old
+            messagebox.showerror("Load Error", f"Could not open CSV.\n{e}")
+            return
+        self.close_journal()
+        self.stop_copy_generation() # 生成結果は前のファイルの商品のもの
+        self.stop_diff() # 差分は前のファイルとのもの
+        self.editor_view.set_data(self.data)
+        self.editor_view.reset_items()
+        old.close()
+        self.csv_path = path
+        if self.loader is None: return self.database_opened()
+        self.loader.start()
+        self.status_label.configure(text="Data: 0 items (loading...)")
+        self.after(self.LOADER_POLL_MS, self.poll_loader, self.loader)
+
+    def poll_loader(self, loader):
+        if loader is not self.loader: return
+        if getattr(loader, "snapshot", None) is not None: return self.install_snapshot(loader)
+        items, done = loader.poll()
+        if items:
+            start = len(self.data)
+            self.data.extend(items)
+            self.editor_view.append_items(self.data[start:])
+        if not done:
+            self.status_label.configure(text=f"Data: {len(self.data)} items (loading...)")
+            self.after(self.LOADER_POLL_MS, self.poll_loader, loader)
+            return
+        self.loader = None
+        self.status_label.configure(text=f"Data: {len(self.data)} items")
+        if loader.error: messagebox.showerror("Load Error", f"CSV load failed.\n{loader.error}")
+        elif is_database(self.data): self.data.set_source(loader.path) # 次回はCSVを読まずにデータベースを開く
+        elif getattr(loader, "fingerprint", None): self.after(self.SNAPSHOT_POLL_MS, self.save_snapshot, loader.fingerprint, self.data, self.editor_view.dirty.seq)
+        if not loader.error: self.open_journal() # キャッシュに保存するのは読み戻す前の内容 (seq を先に渡している)
+
+    def reuse_database(self, store, path):
+        # 前回取り込んだデータベースを使うか決める (CSVが更新されていれば取り込み直す。未保存の編集が残っていれば確認)
+        if len(store) and store.source_matches(path): return True
+        if store.edited_fields() and not messagebox.askyesno("Database", "The CSV file changed since it was imported, but the database has edits that were not exported.\n\nDiscard them and re-import the CSV?\n(No opens the database as it is.)"):
+            return True
+        store.clear()
+        return False
+
+    def database_opened(self):
+        # 前回のデータベースを開いたとき、未保存の印を戻してからタブを表示
+        edited = self.data.edited_fields()
+        for record_id, fields in zip(self.data.get_many("id", list(edited)), edited.values()):
+            for field in fields: self.editor_view.dirty.mark(record_id, field)
+        self.editor_view.append_items(self.data[:])
+        self.status_label.configure(text=f"Data: {len(self.data)} items (database)")
+
+    def install_snapshot(self, loader, start=0):
+        # キャッシュから読み込んだストアに差し替え、タブと RecordIndex への登録を少しずつ進める
+        if loader is not self.loader: return
+        if start == 0:
+            self.data = loader.snapshot.store
+            self.editor_view.set_data(self.data)
+            self.editor_view.reset_items()
+            restore_search_index(self.editor_view.search_index, loader.snapshot.search)
+        end = min(start + self.SNAPSHOT_CHUNK_SIZE, len(self.data))
+        self.editor_view.append_items(self.data[start:end])
+        if end < len(self.data):
+            self.status_label.configure(text=f"Data: {end} items (loading from cache...)")
+            self.after(1, self.install_snapshot, loader, end)
+            return
+        self.loader = None
+        self.status_label.configure(text=f"Data: {len(self.data)} items")
+        self.open_journal()
+
+    def open_journal(self, replay=True):
+        # 自動保存が有効ならジャーナルを開く (replay=True なら前回保存されなかった編集を読み戻す)。SQLite は編集をその場で書き込むため使わない
+        self.close_journal()
+        if not self.csv_path or is_database(self.data) or not self.settings["autosave"].get(): return
+        from journal import EditJournal, journal_path, read_journal, source_of
+        if replay:
+            header, entries = read_journal(journal_path(self.csv_path))
+            try: source = source_of(self.csv_path)
+            except OSError: source = None
+            if entries and (header["source"] == source or messagebox.askyesno("Unsaved Edits", f"{len(entries)} edits were not saved last time, but the CSV file has changed since.\n\nApply them anyway?\n(No discards them.)")):
+                applied = self.editor_view.replay_edits(entries)
+                self.status_label.configure(text=f"Data: {len(self.data)} items ({applied} unsaved edits restored)")
+        self.journal = EditJournal(self.csv_path)
+        self.journal.compact(self.editor_view.unsaved_edits()) # 今のCSVに対するジャーナルとして作り直す
+        self.editor_view.journal = self.journal
+
+    def close_journal(self, remove=False):
+        if self.journal:
+            self.journal.close(remove)
+            self.journal = self.editor_view.journal = None
+
+    def autosave_changed(self):
+        # 切ったときはジャーナルを削除し、入れたときは今の未保存の編集からジャーナルを作る
+        if not self.settings["autosave"].get(): self.close_journal(remove=True)
+        elif self.loader is None: self.open_journal(replay=False)
+
+    def save_snapshot(self, fingerprint, data, seq):
+        # 索引ができるまで待ってからキャッシュに保存する (それまでに編集された場合は保存しない)
+        if data is not self.data or self.editor_view.dirty.seq != seq: return
+        if self.editor_view.search_index.pending():
+            self.after(self.SNAPSHOT_POLL_MS, self.save_snapshot, fingerprint, data, seq)
+            return
+        self.catalog_cache.save_async(fingerprint, *capture(data, self.editor_view.search_index))
+
+    def start_copy_generation(self, rows, fields, only_empty):
+        # rows の商品の fields をAIで生成し始め、生成する商品の数を返す (APIキーがない場合は None)
+        api_key = self.settings["api_key"].get().strip()
+        if not api_key and not os.environ.get("ELTEX_AI_ENDPOINT"):
+            messagebox.showwarning("AI Copy", "Enter an API key in Settings.")
+            return None
+        self.stop_copy_generation()
+        from ai_copy import AI_MODELS, GENERATED_FIELDS, PROMPT_FIELDS, CopyCache, CopyGenerator, build_prompt
+        columns = {key: self.data.get_many(key, rows) for key in dict.fromkeys(("id",) + tuple(PROMPT_FIELDS) + GENERATED_FIELDS)}
+        jobs = []
+        for n in range(len(rows)):
+            values = {key: column[n] for key, column in columns.items()}
+            targets = tuple(key for key in fields if not (only_empty and values[key]))
+            if targets: jobs.append((values["id"], targets, build_prompt(values, targets)))
+        if not jobs: return 0
+        if self.copy_cache is None: self.copy_cache = CopyCache()
+        self.copy_runs += 1
+        self.copy_generator = CopyGenerator(jobs, self.settings["ai_model"].get() or AI_MODELS[0], api_key, self.copy_cache, concurrency=int(self.settings["ai_concurrency"].get()), rate=float(self.settings["ai_rate"].get()))
+        self.copy_generator.start()
+        self.after(self.COPY_POLL_MS, self.poll_copy_generator, self.copy_generator, ("ai", self.copy_runs))
+        return len(jobs)
+
+    def poll_copy_generator(self, generator, group):
+        if generator is not self.copy_generator: return # 中止した・別のファイルを開いた
+        results, done = generator.poll()
+        values = {record_id: result for record_id, result, error in results if result}
+        if values: self.editor_view.apply_generated(values, group)
+        if not done:
+            self.status_label.configure(text=f"AI copy... {generator.completed}/{generator.total} items")
+            self.after(self.COPY_POLL_MS, self.poll_copy_generator, generator, group)
+            return
+        self.copy_generator = None
+        failed = f" ({generator.failed} failed: {generator.last_failure})" if generator.failed else ""
+        self.status_label.configure(text=f"AI copy done: {generator.total - generator.failed} items{failed}")
+        if generator.error: messagebox.showerror("AI Copy Error", f"AI copy generation stopped.\n{generator.error}")
+
+    def stop_copy_generation(self):
+        # 実行中のAI生成を中止し、中止した場合は True を返す
+        if self.copy_generator is None: return False
+        self.copy_generator.stop()
+        self.copy_generator = None
+        return True
+
+    @profiler.timed("on_save")
     def on_save(self):
         self.editor_view.save_current_values()
-        messagebox.showinfo("Export", "CSV Export Successful (Demo)")
+        if self.exporter or self.loader or self.diff_worker: return
+        collisions = self.editor_view.edited_collisions()
+        if collisions:
+            # JAN などを他の商品と同じ値にした編集は保存しない (読み込み時からあった重複は止めない)
+            record_id, key, value = collisions[0]
+            messagebox.showerror("Duplicate", f"{len(collisions)} edited values duplicate other items and cannot be saved.\ne.g. {FIELD_MAP[key].label} \"{value}\" of {record_id}")
+            return self.show_collisions()
+        dirty = self.editor_view.dirty
+        if self.settings["save_mode"].get() == SAVE_PATCH:
+            # 変更のあったレコードだけをパッチファイルに書き出す
+            # 読み込み直しなどで引けなくなった id は除く
+            items = [item for item in (self.editor_view.index.get("id", record_id) for record_id in dirty) if item is not None]
+            if not items:
+                self.status_label.configure(text="No changes")
+                return
+            path = patch_path(self.csv_path) if self.csv_path else filedialog.asksaveasfilename(title="Export Patch", defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        else:
+            path = self.csv_path
+            # Windows では mmap で開いているファイルを置き換えられないため、別のファイルに保存する
+            if path and os.name == "nt" and isinstance(self.data, MappedCsvStore) and os.path.samefile(path, self.data.path): path = None
+            path = path or filedialog.asksaveasfilename(title="Export CSV", defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+            items = self.data
+        if not path: return
+        self.exporter = CsvExporter(path, len(items), EXPORT_ENCODINGS[self.settings["export_encoding"].get()])
+        self.exporter.start()
+        self.export_started = time.perf_counter_ns()
+        self.export_items = items
+        self.export_row = 0
+        self.export_seq = dirty.seq
+        self.pump_export(self.exporter)
+
+    def pump_export(self, exporter):
+        # キューに空きがある分だけレコードを渡し、書き込みはワーカースレッドに任せる
+        while exporter.ready() and not exporter.closed:
+            if self.export_row >= len(self.export_items):
+                exporter.close()
+                break
+            end = min(self.export_row + self.EXPORT_CHUNK_SIZE, len(self.export_items))
+            exporter.feed([dict(item) for item in self.export_items[self.export_row:end]])
+            self.export_row = end
+        if not exporter.finished:
+            self.status_label.configure(text=f"Saving... {int(exporter.progress() * 100)}%")
+            self.after(self.EXPORT_POLL_MS, self.pump_export, exporter)
+            return
+        self.exporter = None
+        saved_all = self.export_items is self.data
+        self.export_items = None
+        profiler.record("export", self.export_started, time.perf_counter_ns()) # ワーカーでの書き出しを含めた保存全体
+        if exporter.error:
+            self.status_label.configure(text="Export failed")
+            messagebox.showerror("Export Error", f"CSV export failed. The original file was not modified.\n{exporter.error}")
+        elif not saved_all:
+            # パッチは元のCSVに反映されないため、編集は全件を保存するまで未保存の印とジャーナルに残す
+            self.status_label.configure(text=f"Patch saved: {os.path.basename(exporter.path)} ({exporter.written} items)")
+        else:
+            self.csv_path = exporter.path # 書き出しに成功してから保存先を切り替える (失敗した「名前を付けて保存」で変えない)
+            self.editor_view.dirty.clear_through(self.export_seq)
+            if is_database(self.data) and self.data.is_source(exporter.path):
+                # 元のCSVに保存した場合だけ編集の記録を消し、データベースと一致したことを記録 (別名で保存しても元のCSVは変わらない)
+                self.data.forget_edits(self.editor_view.dirty)
+                self.data.set_source(exporter.path)
+            if self.journal and self.journal.csv_path == self.csv_path: self.journal.compact(self.editor_view.unsaved_edits()) # 保存した編集をジャーナルから除く
+            elif self.settings["autosave"].get():
+                # 別のファイルに保存した (元のCSVのジャーナルの編集は保存済み)
+                self.close_journal(remove=True)
+                self.open_journal(replay=False)
+            self.editor_view.refresh_tabs()
+            self.status_label.configure(text=f"Saved: {os.path.basename(exporter.path)} ({exporter.written} items)")
 
 if __name__ == "__main__":
-    app = App()
+    app = App(sys.argv[1] if len(sys.argv) > 1 else None)
     app.mainloop()
 
@@ -0,0 +1,311 @@
+import codecs
+import csv
+import mmap
+import os
+import queue
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+
+from catalog import RecordIndex
+from column_store import INT_FIELDS, TextColumn, canonical_int
+from csv_io import BOOL_FIELDS, FIELDS, LOAD_AUTO, LOAD_MMAP, parse_bool, parse_number
+from search import SearchIndex
+
+# --- mmap による大きなCSVの読み込み ---
+# ファイルはメモリに展開せず、各行の開始位置 (行オフセット索引) とキー列だけを持つ。
+# 行の内容は参照されたときに初めて解析する。
+# キー列以外を全行について読む処理 (検索索引の作成・集計・全件検証) は、それぞれがファイル全体を読み直す。
+# 列をメモリに持てばその分だけ mmap で開く意味が薄れるため、読み直しの時間と引き換えにメモリを抑えている。
+# 重複チェック (uniqueness) が使う列はすべて KEY_FIELDS に含めてあり、読み直さない。
+
+# CSVの1行 (レコード)。"..." の中の改行・カンマは区切りとみなさない ("" のエスケープも引用符の対として扱える)
+RECORD = re.compile(rb'(?:[^"\n]*"[^"]*")*[^"\n]*(?:\n|\Z)')
+# RecordIndex と重複チェックが全行について参照する列は、読み込み時に取り出しておく
+KEY_FIELDS = ("id", "webcd", "jan", "instore_jan")
+CACHE_ROWS = 4096 # 解析済みの行を保持する数 (検証のバッチ1つ分より多くする)
+MMAP_MIN_BYTES = 200 * 1024 * 1024 # 読み込み方式が「自動」のとき、これ以上のファイルを mmap で開く
+
+
+def record_end(mm, start):
+    """start から始まる行の終わりの位置を返す。引用符が閉じていない場合は位置を示して csv.Error にする"""
+    found = RECORD.match(mm, start)
+    if found is None:
+        line, pos = 1, mm.find(b"\n", 0, start) # マッピングを切り出してコピーしないようにその場で数える
+        while pos != -1:
+            line += 1
+            pos = mm.find(b"\n", pos + 1, start)
+        raise csv.Error(f"引用符が閉じていません ({line}行目, {start}バイト目)")
+    return found.end()
+
+
+def use_mmap(path, mode):
+    """読み込み方式の設定とファイルサイズから、mmap で開くかどうかを決める"""
+    if mode != LOAD_AUTO:
+        return mode == LOAD_MMAP
+    try:
+        return os.path.getsize(path) >= MMAP_MIN_BYTES
+    except OSError:
+        return False
+
+
+class MappedRow(MutableMapping):
+    """MappedCsvStore の1行を辞書のように読み書きするビュー (RowView と同じ使い方ができる)"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return self.store.get(self.row, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        self.store.set(self.row, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("MappedCsvStore の列は削除できません")
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"MappedRow({self.row}, id={self['id']!r})"
+
+    def to_dict(self):
+        return {key: self.store.get(self.row, key) for key in FIELDS}
+
+
+class MappedCsvStore:
+    """
+    CSVファイルを mmap で開き、行の開始位置の配列とキー列 (KEY_FIELDS) だけを保持するストア。
+    ColumnStore と同じように len / [] / for / get_many / set_many / typed_column が使え、
+    行の各フィールドは参照されたときに解析する (解析結果は CACHE_ROWS 行までキャッシュ)。
+    編集した値はファイルには書き戻さず、行ごとの変更として別に保持する。
+    """
+    BATCH_ROWS = 500 # 行の解析が必要なため、検証などで1回に取り出す行数を ColumnStore より少なくする
+
+    def __init__(self, path, encoding="utf-8-sig"):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.mm = b"" # 空のファイルは mmap できない
+        # BOMは先頭にしかないため、各行は BOM なしの codec で読む
+        self.encoding = "utf-8" if codecs.lookup(encoding).name == "utf-8-sig" else encoding
+        self.data_start = 3 if self.mm[:3] == codecs.BOM_UTF8 else 0
+        try:
+            header_end = record_end(self.mm, self.data_start) if len(self.mm) else 0
+        except csv.Error:
+            self.close()
+            raise
+        header = self.mm[self.data_start:header_end].decode(self.encoding)
+        self.header = next(csv.reader([header]), [])
+        self.data_start = header_end
+        # 列名 → CSV上の位置 (ヘッダーにない列は空欄として扱う)
+        self.positions = {key: self.header.index(key) for key in FIELDS if key in self.header}
+        self.offsets = array("Q") # 各行の開始位置
+        self.keys = {key: TextColumn() for key in KEY_FIELDS}
+        self.edits = {} # 行番号 → {キー: 編集後の値}
+        self.cache = OrderedDict() # 行番号 → 解析済みの値のリスト (CSVの列順)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def record_index(self):
+        return RecordIndex(self)
+
+    def search_index(self):
+        return SearchIndex(self)
+
+    def transaction(self):
+        return nullcontext() # 編集はメモリ上に保持するため、まとめる必要はない
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [MappedRow(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return MappedRow(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield MappedRow(self, row)
+
+    def extend(self, entries):
+        """MappedCsvLoader が返す (行の開始位置, KEY_FIELDS の値...) を追加する"""
+        for offset, *keys in entries:
+            self.offsets.append(offset)
+            for column, value in zip(self.keys.values(), keys):
+                column.append(value)
+
+    def read(self, row):
+        """行をファイルから読んで値のリスト (CSVの列順) を返す (キャッシュしない)"""
+        start = self.offsets[row]
+        end = record_end(self.mm, start)
+        return next(csv.reader([self.mm[start:end].decode(self.encoding)]), [])
+
+    def parse(self, row):
+        """行の値のリストを返す (キャッシュを使う)"""
+        values = self.cache.get(row)
+        if values is not None:
+            self.cache.move_to_end(row)
+            return values
+        values = self.cache[row] = self.read(row)
+        if len(self.cache) > CACHE_ROWS:
+            self.cache.popitem(last=False)
+        return values
+
+    def get(self, row, key):
+        edits = self.edits.get(row)
+        if edits and key in edits:
+            return edits[key]
+        if key in self.keys:
+            return self.keys[key].get(row)
+        values = self.parse(row)
+        position = self.positions.get(key)
+        value = values[position] if position is not None and position < len(values) else ""
+        return parse_bool(value) if key in BOOL_FIELDS else value
+
+    def set(self, row, key, value):
+        # 読み出すときの値が RowView と同じ型 (フラグは bool、それ以外は文字列) になるよう正規化して保持する
+        value = parse_bool(value) if key in BOOL_FIELDS else "" if value is None else str(value)
+        self.edits.setdefault(row, {})[key] = value
+
+    def get_many(self, key, rows):
+        """key 列の rows の各行の値を返す (ColumnStore と同じく、数値列の整数は int で返す)"""
+        position = self.positions.get(key)
+        if key in self.keys:
+            values = self.keys[key].get_many(rows)
+        elif position is None:
+            values = [""] * len(rows)
+        else:
+            # 全行を読むような大量の取り出しでは、よく使う行のキャッシュを押し出さないよう直接読む
+            parse = self.parse if len(rows) <= CACHE_ROWS else self.read
+            values = [row[position] if position < len(row) else "" for row in map(parse, rows)]
+            if key in BOOL_FIELDS:
+                values = [parse_bool(value) for value in values]
+        if self.edits:
+            edits = self.edits
+            for n, row in enumerate(rows):
+                changes = edits.get(row)
+                if changes and key in changes:
+                    values[n] = changes[key]
+        if key in INT_FIELDS:
+            numbers = [canonical_int(value) if value else None for value in values]
+            values = [value if number is None else number for value, number in zip(values, numbers)]
+        return values
+
+    def set_many(self, key, rows, values):
+        for row, value in zip(rows, values):
+            self.set(row, key, value)
+
+    def typed_column(self, key):
+        """1列分の値を型付きで返す (ColumnStore.typed_column() と同じ形)"""
+        values = self.get_many(key, range(len(self)))
+        if key in INT_FIELDS:
+            return [value if type(value) is int else parse_number(value) for value in values]
+        return values
+
+    def column(self, key):
+        return [self.get(row, key) for row in range(len(self))]
+
+    def clear(self):
+        self.offsets = array("Q")
+        for column in self.keys.values():
+            column.clear()
+        self.edits.clear()
+        self.cache.clear()
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            try:
+                self.mm.close()
+            except BufferError:
+                pass # 停止中のローダーがまだ参照している。参照がなくなれば GC で解放される
+        self.file.close()
+
+    def nbytes(self):
+        """ファイル本体を除いた、索引などが占めるおおよそのバイト数"""
+        return self.offsets.itemsize * len(self.offsets) + sum(column.nbytes() for column in self.keys.values())
+
+
+class MappedCsvLoader(threading.Thread):
+    """
+    ワーカースレッドで mmap したCSVの行の開始位置を求め、キー列の値と合わせてチャンク単位でキューに積む。
+    CsvLoader と同じく UI 側は after() で poll() を呼び、受け取ったチャンクを store.extend() する。
+    """
+    def __init__(self, store, chunk_size=5000, max_pending=8):
+        super().__init__(daemon=True)
+        self.store = store
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.finished = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            mm = self.store.mm
+            size = len(mm)
+            pos = self.store.data_start
+            positions = [self.store.positions.get(key) for key in KEY_FIELDS]
+            encoding = self.store.encoding
+            chunk = []
+            while pos < size:
+                end = record_end(mm, pos)
+                line = mm[pos:end]
+                if line.strip(b"\r\n"):
+                    values = next(csv.reader([line.decode(encoding)]), [])
+                    keys = [values[i] if i is not None and i < len(values) else "" for i in positions]
+                    chunk.append((pos, *keys))
+                    if len(chunk) >= self.chunk_size:
+                        if not self.put(chunk):
+                            return
+                        chunk = []
+                pos = end
+            if chunk:
+                self.put(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    def put(self, chunk):
+        while not self._stop_event.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def poll(self, max_chunks=4):
+        """読み込み済みのチャンクを最大 max_chunks 個取り出す。戻り値は (エントリのリスト, 完了したかどうか)"""
+        entries = []
+        for _ in range(max_chunks):
+            try:
+                entries.extend(self.chunks.get_nowait())
+            except queue.Empty:
+                break
+        done = self.finished and self.chunks.empty()
+        return entries, done
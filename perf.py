@@ -0,0 +1,145 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# --- 計測 (タイマー・カウンター) ---
+
+
+class Profiler:
+    """
+    ホットパスの処理時間と回数を記録する軽量プロファイラ。
+    名前ごとの集計 (回数 / 合計 / 最大 / 直近) に加え、直近 max_events 件の区間を
+    Chrome のトレース形式 (chrome://tracing, Perfetto) で書き出せるように保持する。
+    """
+    def __init__(self, max_events=100000):
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.stats = {} # 名前 → [回数, 合計ns, 最大ns, 直近ns]
+        self.counters = {} # 名前 → 値
+        self.events = deque(maxlen=max_events)
+        self.origin_ns = time.perf_counter_ns()
+
+    def timed(self, name):
+        """関数の実行時間を name で記録するデコレーター"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.perf_counter_ns())
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.record(name, start, time.perf_counter_ns())
+
+    def record(self, name, start_ns, end_ns):
+        duration = end_ns - start_ns
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                self.stats[name] = [1, duration, duration, duration]
+            else:
+                stat[0] += 1
+                stat[1] += duration
+                stat[2] = max(stat[2], duration)
+                stat[3] = duration
+            self.events.append(("X", name, start_ns, duration, threading.get_ident()))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            value = self.counters.get(name, 0) + n
+            self.counters[name] = value
+            self.events.append(("C", name, time.perf_counter_ns(), value, threading.get_ident()))
+
+    def snapshot(self):
+        """
+        集計値のコピーを返す。
+        {"timers": {名前: {"count", "avg_ms", "max_ms", "last_ms"}}, "counters": {名前: 値}}
+        """
+        with self.lock:
+            timers = {
+                name: {
+                    "count": count,
+                    "avg_ms": total / count / 1e6,
+                    "max_ms": longest / 1e6,
+                    "last_ms": last / 1e6,
+                }
+                for name, (count, total, longest, last) in self.stats.items()
+            }
+            return {"timers": timers, "counters": dict(self.counters)}
+
+    def reset(self):
+        """区間の集計と記録を消す (カウンターは累計なので残す)"""
+        with self.lock:
+            self.stats.clear()
+            self.events.clear()
+
+    def chrome_trace(self):
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = []
+        for phase, name, ts_ns, value, tid in events:
+            event = {"name": name, "ph": phase, "ts": (ts_ns - self.origin_ns) / 1000, "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = value / 1000
+            else:
+                event["args"] = {"value": value}
+            trace.append(event)
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+# アプリ全体で共有するプロファイラ
+profiler = Profiler()
+
+_widget_counters_installed = False
+
+
+def install_widget_counters(target=profiler):
+    """
+    tkinter のウィジェット生成・破棄の回数を数える。
+    customtkinter の各ウィジェットも内部では複数の tk ウィジェットで構成されるため、
+    Tcl 側に作られたウィジェット数として tk.widgets.created / destroyed を記録する。
+    """
+    global _widget_counters_installed
+    if _widget_counters_installed:
+        return
+    import tkinter
+
+    original_init = tkinter.BaseWidget.__init__
+    original_destroy = tkinter.BaseWidget.destroy
+
+    @functools.wraps(original_init)
+    def counting_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        target.count("tk.widgets.created")
+
+    @functools.wraps(original_destroy)
+    def counting_destroy(self):
+        original_destroy(self)
+        target.count("tk.widgets.destroyed")
+
+    tkinter.BaseWidget.__init__ = counting_init
+    tkinter.BaseWidget.destroy = counting_destroy
+    _widget_counters_installed = True
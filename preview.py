@@ -0,0 +1,105 @@
+import hashlib
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+# --- HTML → プレビュー用テキスト変換 ---
+# <br> -> 改行, </p> -> 空行, <li> -> ・, その他タグ -> 削除
+BLOCK_TAGS = re.compile(r"<br>|</p>|</li>|<li>")
+BLOCK_REPLACEMENTS = {"<br>": "\n", "</p>": "\n\n", "</li>": "\n", "<li>": "・ "}
+ANY_TAG = re.compile(r"<[^>]+>")
+
+
+def html_to_text(html_content):
+    """HTMLソースから簡易プレビュー用のテキストを生成 (タグ除去)"""
+    text_content = BLOCK_TAGS.sub(lambda m: BLOCK_REPLACEMENTS[m.group(0)], html_content)
+    return ANY_TAG.sub("", text_content)
+
+
+def diff_region(old, new):
+    """
+    old を new に変えるために書き換えが必要な範囲を返す。
+    戻り値は (開始位置, old側の終了位置, 差し込む文字列)。変化がなければ (n, n, "")。
+    """
+    # 数百KBのソースでもUIスレッドで使えるよう、スライス比較の二分探索で一致長を求める
+    limit = min(len(old), len(new))
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    start = lo
+
+    lo, hi = 0, limit - start
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return start, len(old) - lo, new[start:len(new) - lo]
+
+
+def source_key(source):
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).digest()
+
+
+class PreviewEngine:
+    """
+    プレビュー変換をワーカースレッドで行うエンジン。
+    未処理の依頼は最新の1件だけを残して捨て (打鍵の合体)、
+    変換結果はソースのハッシュをキーにキャッシュする。
+    Tkのウィジェットには触れないため、UI側は poll() で結果を受け取る。
+    """
+    def __init__(self, cache_size=64):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.results = queue.Queue()
+        self.pending = None
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def submit(self, source, token):
+        """
+        変換を依頼する。キャッシュにあればその場で変換結果を返し、
+        なければ None を返してワーカーで変換する (結果は poll() で (token, text) として届く)。
+        """
+        key = source_key(source)
+        with self.cond:
+            text = self.cache.get(key)
+            if text is not None:
+                self.cache.move_to_end(key)
+                return text
+            self.pending = (key, source, token)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return None
+
+    def poll(self):
+        """届いている変換結果のうち最新のものを返す (なければ None)"""
+        result = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return result
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                key, source, token = self.pending
+                self.pending = None
+            text = html_to_text(source)
+            with self.cond:
+                self.cache[key] = text
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            self.results.put((token, text))
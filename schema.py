@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+# --- 項目の定義 (スキーマ) ---
+# 各列の型・単位・検証・表示形式をここで宣言し、フォームの組み立て (EditorView.create_form_content)・
+# 列の保持形式 (column_store)・検証 (validate)・表示と入力の変換 (binding) はすべてここから決める。
+# このモジュールは Tk に依存しない (cli や検証のワーカープロセスも import するため)
+
+# 型
+TEXT = "text" # 1行のテキスト
+INT = "int" # 整数。読み込み時に1回だけ解析して int64 の配列で保持し、表示するときだけ整形する
+CATEGORY = "category" # 値の種類が少ないテキスト (文字列は1回だけ保持)
+BOOL = "bool"
+MEMO = "memo" # 複数行のテキスト
+HTML = "html" # 商品説明 (HTMLソース)
+
+# 検証の種類 (check)
+GTIN = "gtin" # JAN などの GS1 コード (桁数とチェックデジット)
+
+# 1列分の定義。
+# unit は表示名に添える単位、required は必須 (ラベルに ! を付け、数値・GTIN は未入力を検証で指摘する)、
+# minimum は数値の下限、choices は選べる値 (フォームは選択式になり、それ以外の値は検証で指摘する)、
+# display は表示するときの書式 (format() の書式指定。"," なら桁区切り)、
+# unique は商品ごとに異なるべき値 (重複を一覧にし、重複させる編集は保存させない)
+Field = namedtuple(
+    "Field", "key label kind unit required minimum choices check display readonly unique",
+    defaults=("", False, None, (), None, "", False, False),
+)
+
+# CSV の列と同じ並び
+SCHEMA = (
+    Field("id", "仕入先コード", TEXT, readonly=True, unique=True),
+    Field("webcd", "WebCD", TEXT, required=True, unique=True),
+    Field("name", "商品名", TEXT, required=True),
+    Field("catch_copy", "キャッチコピー", TEXT),
+    Field("jan", "JANコード", TEXT, required=True, check=GTIN, unique=True),
+    Field("instore_jan", "インストアJAN", TEXT, check=GTIN, unique=True),
+    Field("cost_price", "原価", INT, unit="円", required=True, minimum=0, display=","),
+    Field("selling_price", "売価", INT, unit="円", required=True, minimum=0, display=","),
+    Field("tax_rate", "税率", CATEGORY, choices=("10%", "8%", "0%")),
+    Field("stock_quantity", "在庫数", INT, minimum=0, display=","),
+    Field("rank", "品質ランク", CATEGORY),
+    Field("delivery", "納期", CATEGORY),
+    Field("delivery_display", "納期表示", CATEGORY),
+    Field("shelf", "棚番号", TEXT),
+    Field("size_w", "幅", INT, unit="mm", minimum=0, display=","),
+    Field("size_h", "高さ", INT, unit="mm", minimum=0, display=","),
+    Field("size_d", "奥行", INT, unit="mm", minimum=0, display=","),
+    Field("weight", "重量", INT, unit="g", minimum=0, display=","),
+    Field("is_published", "公開する", BOOL),
+    Field("is_sale", "セール対象", BOOL),
+    Field("is_free_shipping", "送料無料", BOOL),
+    Field("memo", "社内用メモ", MEMO),
+    Field("description", "商品説明", HTML),
+)
+FIELD_MAP = {field.key: field for field in SCHEMA}
+
+# フォームの並び: (セクション名, 行のタプル)。各行は4列のグリッドに左から置き、行の最後の項目が残りの列を使う。
+# HTML の列 (商品説明) はプレビュー付きのエディタとして最後に置くため、ここには含めない。
+FORM_COLUMNS = 4
+FORM_SECTIONS = (
+    ("基本情報", (("webcd", "name"), ("catch_copy",))),
+    ("コード・価格・在庫", (("jan", "instore_jan", "id"), ("cost_price", "selling_price", "tax_rate", "stock_quantity"))),
+    ("物流・管理情報", (("delivery", "delivery_display", "shelf", "rank"),)),
+    ("サイズ・重量", (("size_w", "size_h", "size_d", "weight"),)),
+    ("設定・フラグ", (("is_published", "is_sale", "is_free_shipping"),)),
+    ("社内用メモ", (("memo",),)),
+)
+
+
+def keys_of(*kinds):
+    return tuple(field.key for field in SCHEMA if field.kind in kinds)
+
+
+def label_of(field):
+    """フォームに表示する項目名 (必須なら先頭に !、単位があれば末尾に添える)"""
+    label = f"!{field.label}" if field.required else field.label
+    return f"{label} ({field.unit})" if field.unit else label
@@ -0,0 +1,207 @@
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+
+# --- 検索索引 ---
+# コード類は前方一致、商品名・キャッチコピーは部分一致 (2文字のN-gram) で検索する
+PREFIX_FIELDS = ("jan", "instore_jan", "webcd")
+TEXT_FIELDS = ("name", "catch_copy")
+INDEXED_FIELDS = PREFIX_FIELDS + TEXT_FIELDS
+NGRAM = 2
+
+
+def normalize(text):
+    """全角英数・半角カナなどの表記ゆれを吸収して比較用の文字列にする"""
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+
+def search_text(item):
+    """部分一致検索の対象にする文字列 (商品名・キャッチコピーを正規化して連結したもの)"""
+    return normalize("\n".join(str(item.get(key, "")) for key in TEXT_FIELDS))
+
+
+def ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class PrefixIndex:
+    """値の昇順に並べた (値, 行番号) による前方一致索引"""
+    def __init__(self):
+        self.keys = []
+        self.rows = array("I")
+
+    def add(self, value, row):
+        if not value:
+            return
+        pos = bisect_right(self.keys, value)
+        self.keys.insert(pos, value)
+        self.rows.insert(pos, row)
+
+    def remove(self, value, row):
+        if not value:
+            return
+        pos = bisect_left(self.keys, value)
+        while pos < len(self.keys) and self.keys[pos] == value:
+            if self.rows[pos] == row:
+                del self.keys[pos]
+                del self.rows[pos]
+                return
+            pos += 1
+
+    def search(self, prefix, limit):
+        pos = bisect_left(self.keys, prefix)
+        found = []
+        while pos < len(self.keys) and len(found) < limit and self.keys[pos].startswith(prefix):
+            found.append(self.rows[pos])
+            pos += 1
+        return found
+
+    def clear(self):
+        self.keys = []
+        self.rows = array("I")
+
+
+class NGramIndex:
+    """N-gram → 行番号の昇順配列 による部分一致用の転置索引"""
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, text, row):
+        postings = self.postings
+        for gram in ngrams(text):
+            rows = postings.get(gram)
+            if rows is None:
+                postings[gram] = array("I", (row,))
+            elif rows[-1] < row:
+                rows.append(row) # 読み込み時は行番号順に届くので末尾追加で済む
+            else:
+                pos = bisect_left(rows, row)
+                if pos == len(rows) or rows[pos] != row:
+                    rows.insert(pos, row)
+
+    def remove(self, text, row):
+        for gram in ngrams(text):
+            rows = self.postings.get(gram)
+            if rows is None:
+                continue
+            pos = bisect_left(rows, row)
+            if pos < len(rows) and rows[pos] == row:
+                del rows[pos]
+                if not rows:
+                    del self.postings[gram]
+
+    def candidates(self, query):
+        """
+        query の全N-gramを含む行番号を昇順に返すジェネレータ。
+        各転置リストを二分探索で読み飛ばしながら共通部分を求める (leapfrog join)。
+        """
+        lists = []
+        for gram in ngrams(query):
+            rows = self.postings.get(gram)
+            if rows is None:
+                return
+            lists.append(rows)
+        lists.sort(key=len)
+        positions = [0] * len(lists)
+        target = lists[0][0]
+        while True:
+            for i, rows in enumerate(lists):
+                pos = bisect_left(rows, target, positions[i])
+                if pos == len(rows):
+                    return
+                positions[i] = pos
+                if rows[pos] != target:
+                    target = rows[pos] # 一致しなければ候補を先へ進めてやり直す
+                    break
+            else:
+                yield target
+                positions[0] += 1
+                if positions[0] == len(lists[0]):
+                    return
+                target = lists[0][positions[0]]
+
+    def clear(self):
+        self.postings.clear()
+
+
+class SearchIndex:
+    """
+    商品の検索索引。行番号 (data 上の位置) で管理し、
+    読み込み時は build_step() で少しずつ、編集時は update() で差分だけを更新する。
+    """
+    def __init__(self, data):
+        self.data = data
+        self.prefix = {key: PrefixIndex() for key in PREFIX_FIELDS}
+        self.text = NGramIndex()
+        self.indexed = 0 # data の先頭から索引に登録済みの行数
+
+    def pending(self):
+        return len(self.data) - self.indexed
+
+    def build_step(self, budget=0.02, batch=200):
+        """
+        未登録の行を budget 秒を目安に索引へ登録する。すべて登録済みなら True を返す。
+        UIスレッドの after() から繰り返し呼び、画面を止めずに索引を作る。
+        """
+        deadline = time.perf_counter() + budget
+        while self.indexed < len(self.data):
+            end = min(self.indexed + batch, len(self.data))
+            self.add_rows(self.indexed, self.data[self.indexed:end])
+            self.indexed = end
+            if time.perf_counter() >= deadline:
+                break
+        return self.indexed >= len(self.data)
+
+    def text_of(self, item):
+        return search_text(item)
+
+    def add_rows(self, start, items):
+        for row, item in enumerate(items, start):
+            for key, index in self.prefix.items():
+                index.add(item.get(key), row)
+            self.text.add(self.text_of(item), row)
+
+    def update(self, row, item, changes):
+        """save_current_values() が返した変更 {キー: (変更前, 変更後)} を索引に反映"""
+        if row >= self.indexed:
+            return # 未登録の行は build_step() で編集後の値が登録される
+        for key, (old, new) in changes.items():
+            if key in self.prefix:
+                self.prefix[key].remove(old, row)
+                self.prefix[key].add(new, row)
+        if any(key in changes for key in TEXT_FIELDS):
+            # 変更前の値から登録済みのN-gramを求めて取り除く
+            old_item = {key: changes[key][0] if key in changes else item.get(key, "") for key in TEXT_FIELDS}
+            self.text.remove(self.text_of(old_item), row)
+            self.text.add(self.text_of(item), row)
+
+    def search(self, query, limit=1000):
+        """
+        前方一致 (JAN / インストアJAN / WebCD) と部分一致 (商品名 / キャッチコピー) で検索し、
+        一致した行番号を昇順で最大 limit 件返す。
+        """
+        query = query.strip()
+        if not query:
+            return []
+        found = set()
+        for index in self.prefix.values():
+            found.update(index.search(query, limit))
+
+        text_query = normalize(query)
+        if len(text_query) >= NGRAM:
+            matched = 0
+            for row in self.text.candidates(text_query):
+                # N-gramがすべて含まれていても連続しているとは限らないため本文で確認する
+                if text_query in self.text_of(self.data[row]):
+                    found.add(row)
+                    matched += 1
+                    if matched >= limit:
+                        break
+        return sorted(found)[:limit]
+
+    def clear(self):
+        for index in self.prefix.values():
+            index.clear()
+        self.text.clear()
+        self.indexed = 0
@@ -0,0 +1,410 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from collections.abc import MutableMapping, Sequence
+from contextlib import contextmanager
+
+from column_store import INT_FIELDS, canonical_int
+from csv_io import BOOL_FIELDS, FIELDS, parse_bool, parse_number
+from search import PREFIX_FIELDS, TEXT_FIELDS, normalize, search_text
+
+# --- SQLite のストア ---
+# メモリに載りきらないカタログ向け。レコードはCSVの横に作るデータベースに置き、
+# 画面に必要な行だけをページ単位で読み出す。編集はその場でコミットされるため、
+# 落ちても次に開いたときに編集後の状態から再開できる。
+
+DATABASE_SUFFIX = ".sqlite"
+PAGE_ROWS = 64 # 1回の問い合わせで読み出す行数
+CACHE_PAGES = 256 # 読み出したページを保持する数
+IN_LIMIT = 500 # 1回の IN (...) に並べる行番号の数 (SQLite の変数の上限より小さく)
+LOOKUP_FIELDS = ("id", "webcd", "jan", "instore_jan") # 索引を作る列 (RecordIndex のキーと前方一致検索の対象)
+TRIGRAM_MIN = 3 # 全文検索 (trigram) が使える検索語の長さ。これより短い語は全件を走査する
+
+
+def database_path(csv_path):
+    """CSVに対応するデータベースのパス (元ファイル名.csv.sqlite)"""
+    return csv_path + DATABASE_SUFFIX
+
+
+def quote(key):
+    return '"' + key + '"'
+
+
+def encode(key, value):
+    """列の値をデータベースに書き込む値にする (数値列の整数は INTEGER、フラグは 0/1、それ以外は文字列)"""
+    if key in BOOL_FIELDS:
+        return 1 if parse_bool(value) else 0
+    if key in INT_FIELDS and type(value) is int:
+        return value
+    text = "" if value is None else str(value)
+    if key in INT_FIELDS and text:
+        number = canonical_int(text)
+        if number is not None:
+            return number
+    return text
+
+
+class SqliteRow(MutableMapping):
+    """SqliteStore の1行を辞書のように読み書きするビュー (RowView と同じ使い方ができる)"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return self.store.get(self.row, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        self.store.set(self.row, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("SqliteStore の列は削除できません")
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"SqliteRow({self.row}, id={self['id']!r})"
+
+    def to_dict(self):
+        return {key: self.store.get(self.row, key) for key in FIELDS}
+
+
+class RowRange(Sequence):
+    """SqliteStore の連続した行を、行ビューのリストのように扱う (全行を一度に作らない)"""
+    def __init__(self, store, rows):
+        self.store = store
+        self.rows = rows # range
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return RowRange(self.store, self.rows[n])
+        return SqliteRow(self.store, self.rows[n])
+
+
+class SqliteStore:
+    """
+    商品レコードを SQLite のテーブルに保持するストア。
+    ColumnStore と同じように len / [] / for / extend / get_many / set_many / typed_column が使え、
+    [] で取り出した SqliteRow 経由で各フィールドを読み書きする。
+    複数の書き込みは transaction() の中で行うと1回のコミットにまとまる。
+    """
+    def __init__(self, path):
+        self.path = path
+        # 自動コミット (BEGIN を明示したときだけトランザクションになる)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.positions = {key: n + 1 for n, key in enumerate(FIELDS)} # SELECT * の結果での位置 (先頭は row)
+        self.pages = OrderedDict() # ページ番号 → 行のタプルのリスト
+        self.depth = 0 # transaction() の入れ子の深さ
+        self.create_schema()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def create_schema(self):
+        # 列の型は指定しない (数値列は整数を INTEGER、それ以外の値は文字列のまま元の表記で保持する)
+        columns = ", ".join(quote(key) for key in FIELDS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS items (row INTEGER PRIMARY KEY, {columns}, search_text TEXT NOT NULL DEFAULT '')")
+        for key in LOOKUP_FIELDS:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS items_{key} ON items ({quote(key)})")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        # 元のCSVに書き出していない編集 (再度開いたときに未保存の印を戻す)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS edited (row INTEGER, field TEXT, PRIMARY KEY (row, field))")
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(search_text, content='items', content_rowid='row', tokenize='trigram')")
+        except sqlite3.OperationalError:
+            self.fts = False # trigram に対応していない SQLite では部分一致を全件走査で探す
+            return
+        self.fts = True
+        self.conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+                INSERT INTO items_fts (rowid, search_text) VALUES (new.row, new.search_text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, search_text) VALUES ('delete', old.row, old.search_text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF search_text ON items BEGIN
+                INSERT INTO items_fts (items_fts, rowid, search_text) VALUES ('delete', old.row, old.search_text);
+                INSERT INTO items_fts (rowid, search_text) VALUES (new.row, new.search_text);
+            END;
+        """)
+
+    @contextmanager
+    def transaction(self):
+        """with の中の書き込みを1つのトランザクションにする (入れ子にした場合は一番外側でコミット)"""
+        if self.depth:
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+            return
+        self.conn.execute("BEGIN")
+        self.depth = 1
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            self.pages.clear()
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self.depth = 0
+
+    # --- EditorView が使う索引 ---
+
+    def record_index(self):
+        return SqliteRecordIndex(self)
+
+    def search_index(self):
+        return SqliteSearchIndex(self)
+
+    # --- 行の読み書き ---
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return RowRange(self, range(*row.indices(len(self))))
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return SqliteRow(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield SqliteRow(self, row)
+
+    def append(self, record):
+        self.extend([record])
+        return SqliteRow(self, len(self) - 1)
+
+    def extend(self, records):
+        columns = ", ".join(["row"] + [quote(key) for key in FIELDS] + ["search_text"])
+        params = ", ".join("?" * (len(FIELDS) + 2))
+        values = [
+            [row] + [encode(key, record.get(key, "")) for key in FIELDS] + [search_text(record)]
+            for row, record in enumerate(records, self.count)
+        ]
+        with self.transaction():
+            self.conn.executemany(f"INSERT INTO items ({columns}) VALUES ({params})", values)
+        self.pages.pop(self.count // PAGE_ROWS, None) # 末尾のページは行が増えたため読み直す
+        self.count += len(values)
+
+    def page(self, number):
+        rows = self.pages.get(number)
+        if rows is not None:
+            self.pages.move_to_end(number)
+            return rows
+        start = number * PAGE_ROWS
+        rows = self.conn.execute("SELECT * FROM items WHERE row >= ? AND row < ? ORDER BY row", (start, start + PAGE_ROWS)).fetchall()
+        self.pages[number] = rows
+        if len(self.pages) > CACHE_PAGES:
+            self.pages.popitem(last=False)
+        return rows
+
+    def get(self, row, key):
+        value = self.page(row // PAGE_ROWS)[row % PAGE_ROWS][self.positions[key]]
+        if key in BOOL_FIELDS:
+            return bool(value)
+        return value if type(value) is str else str(value)
+
+    def set(self, row, key, value):
+        with self.transaction():
+            self.conn.execute(f"UPDATE items SET {quote(key)} = ? WHERE row = ?", (encode(key, value), row))
+            self.conn.execute("INSERT OR IGNORE INTO edited (row, field) VALUES (?, ?)", (row, key))
+        self.pages.pop(row // PAGE_ROWS, None)
+
+    def select(self, key, rows):
+        """rows の各行の key 列の値を {行番号: 値} で返す"""
+        column = quote(key)
+        if not rows:
+            return {}
+        low, high = min(rows), max(rows)
+        if high - low < 4 * len(rows):
+            # ほぼ連続した行 (検証のバッチなど) は範囲でまとめて読む
+            return dict(self.conn.execute(f"SELECT row, {column} FROM items WHERE row BETWEEN ? AND ?", (low, high)))
+        values = {}
+        rows = list(rows)
+        for i in range(0, len(rows), IN_LIMIT):
+            chunk = rows[i:i + IN_LIMIT]
+            values.update(self.conn.execute(f"SELECT row, {column} FROM items WHERE row IN ({', '.join('?' * len(chunk))})", chunk))
+        return values
+
+    def get_many(self, key, rows):
+        """key 列の rows の各行の値をまとめて返す (ColumnStore と同じく、数値列の整数は int で返す)"""
+        values = self.select(key, rows)
+        if key in BOOL_FIELDS:
+            return [values[row] == 1 for row in rows]
+        return [values[row] for row in rows]
+
+    def set_many(self, key, rows, values):
+        """key 列の rows の各行に values をまとめて書き込む"""
+        with self.transaction():
+            self.conn.executemany(f"UPDATE items SET {quote(key)} = ? WHERE row = ?", [(encode(key, value), row) for row, value in zip(rows, values)])
+            self.conn.executemany("INSERT OR IGNORE INTO edited (row, field) VALUES (?, ?)", [(row, key) for row in rows])
+        self.pages.clear()
+
+    def column(self, key):
+        """1列分の値をまとめて返す"""
+        if key in BOOL_FIELDS:
+            return [value == 1 for (value,) in self.conn.execute(f"SELECT {quote(key)} FROM items ORDER BY row")]
+        return [value if type(value) is str else str(value) for (value,) in self.conn.execute(f"SELECT {quote(key)} FROM items ORDER BY row")]
+
+    def typed_column(self, key):
+        """1列分の値を型付きで返す (ColumnStore.typed_column() と同じ形)"""
+        values = [value for (value,) in self.conn.execute(f"SELECT {quote(key)} FROM items ORDER BY row")]
+        if key in INT_FIELDS:
+            return [value if type(value) is int else parse_number(value) for value in values]
+        if key in BOOL_FIELDS:
+            return [value == 1 for value in values]
+        return values
+
+    def clear(self):
+        with self.transaction():
+            self.conn.execute("DELETE FROM items")
+            self.conn.execute("DELETE FROM edited")
+            self.conn.execute("DELETE FROM meta")
+        self.count = 0
+        self.pages.clear()
+
+    # --- 元のCSVとの対応 ---
+
+    def source_path(self):
+        """データベースの元になったCSVのパス (database_path() の逆)"""
+        return os.path.abspath(self.path[:-len(DATABASE_SUFFIX)])
+
+    def is_source(self, csv_path):
+        """csv_path がこのデータベースの元のCSVか (「名前を付けて保存」した別のファイルでないか)"""
+        return os.path.abspath(csv_path) == self.source_path()
+
+    def source_matches(self, csv_path):
+        """データベースが csv_path の現在の内容から作られたものか (サイズと更新日時で判定)"""
+        try:
+            stat = os.stat(csv_path)
+        except OSError:
+            return False
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        return meta.get("source_size") == stat.st_size and meta.get("source_mtime_ns") == stat.st_mtime_ns
+
+    def set_source(self, csv_path):
+        """csv_path の読み込み・書き出しが終わったときに呼ぶ"""
+        stat = os.stat(csv_path)
+        with self.transaction():
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("source_size", stat.st_size),
+                ("source_mtime_ns", stat.st_mtime_ns),
+            ])
+
+    def edited_fields(self):
+        """CSVに書き出していない編集を {行番号: {フィールド, ...}} で返す"""
+        edited = {}
+        for row, field in self.conn.execute("SELECT row, field FROM edited"):
+            edited.setdefault(row, set()).add(field)
+        return edited
+
+    def forget_edits(self, keep_ids=()):
+        """CSVに書き出した編集の記録を消す (keep_ids のレコードは書き出し後にも編集されたため残す)"""
+        keep = set(keep_ids)
+        rows = [row for row in self.edited_fields() if self.get(row, "id") not in keep]
+        with self.transaction():
+            self.conn.executemany("DELETE FROM edited WHERE row = ?", [(row,) for row in rows])
+
+    def nbytes(self):
+        """データベースファイルのおおよそのバイト数"""
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteRecordIndex:
+    """RecordIndex と同じ使い方で、キー列の索引 (SQL) から行を引く"""
+    KEYS = ("id", "webcd", "jan")
+
+    def __init__(self, store):
+        self.store = store
+        self.keys = self.KEYS
+
+    def __len__(self):
+        return self.store.conn.execute("SELECT COUNT(DISTINCT id) FROM items WHERE id != ''").fetchone()[0]
+
+    def get(self, key, value, default=None):
+        # 空欄は引けず、同じキー値の行が複数ある場合は先に追加された行を返す (RecordIndex と同じ)
+        if value in (None, ""):
+            return default
+        found = self.store.conn.execute(f"SELECT row FROM items WHERE {quote(key)} = ? ORDER BY row LIMIT 1", (value,)).fetchone()
+        return SqliteRow(self.store, found[0]) if found else default
+
+    # 行の追加・キーの変更はテーブルの索引に反映されるため何もしない
+    def extend(self, records):
+        pass
+
+    def rekey(self, record, key, old_value, new_value):
+        pass
+
+    def clear(self):
+        pass
+
+
+class SqliteSearchIndex:
+    """SearchIndex と同じ使い方で、テーブルの索引と全文検索 (FTS5 trigram) から検索する"""
+    def __init__(self, store):
+        self.data = store
+
+    def pending(self):
+        return 0 # 索引は行の追加と同時に作られる
+
+    def build_step(self, budget=0.02, batch=200):
+        return True
+
+    def update(self, row, item, changes):
+        if any(key in changes for key in TEXT_FIELDS):
+            self.data.conn.execute("UPDATE items SET search_text = ? WHERE row = ?", (search_text(item), row))
+
+    def search(self, query, limit=1000):
+        """SearchIndex.search() と同じく、一致した行番号を昇順で最大 limit 件返す"""
+        query = query.strip()
+        if not query:
+            return []
+        conn = self.data.conn
+        found = set()
+        for key in PREFIX_FIELDS:
+            # 前方一致は「query 以上、query の後ろに最大の文字を付けたもの未満」の範囲検索にして索引を使う
+            column = quote(key)
+            found.update(row for (row,) in conn.execute(
+                f"SELECT row FROM items WHERE {column} >= ? AND {column} < ? ORDER BY {column} LIMIT ?",
+                (query, query + "\U0010ffff", limit),
+            ))
+
+        text_query = normalize(query)
+        if len(text_query) >= TRIGRAM_MIN and self.data.fts:
+            phrase = '"' + text_query.replace('"', '""') + '"'
+            rows = conn.execute("SELECT rowid FROM items_fts WHERE items_fts MATCH ? ORDER BY rowid LIMIT ?", (phrase, limit))
+            found.update(row for (row,) in rows)
+        elif len(text_query) >= 2:
+            rows = conn.execute("SELECT row FROM items WHERE instr(search_text, ?) > 0 ORDER BY row LIMIT ?", (text_query, limit))
+            found.update(row for (row,) in rows)
+        return sorted(found)[:limit]
+
+    def clear(self):
+        pass
@@ -0,0 +1,74 @@
+import random
+
+from aggregates import CatalogStats
+from bulk_edit import BulkChange
+from column_store import ColumnStore
+
+
+def snapshot(stats):
+    return (stats.stock_value, stats.published, stats.sale, stats.out_of_stock, stats.published_out_of_stock, stats.margins)
+
+
+def recount(store):
+    stats = CatalogStats()
+    stats.extend(len(store))
+    while not stats.step(store):
+        pass
+    return snapshot(stats)
+
+
+def random_value(rng, key):
+    if key in ("is_published", "is_sale"):
+        return rng.random() < 0.5
+    if key == "rank":
+        return rng.choice("ABC")
+    return rng.choice(["", "abc", 0, -1, rng.randrange(1, 500)])
+
+
+def bulk(store, rng, key, rows):
+    """rows を順に書き換え、apply() と同じ形の BulkChange を返す (同じ行が2回あってもよい)"""
+    change = BulkChange(key, rows, [], [])
+    for row in rows:
+        change.old.append(store.get_many(key, [row])[0])
+        change.new.append(random_value(rng, key))
+        store.set_many(key, [row], [change.new[-1]])
+    return change
+
+
+def test_incremental_updates_match_full_recount():
+    rng = random.Random(3)
+    keys = ("cost_price", "selling_price", "stock_quantity", "is_published", "is_sale", "rank")
+    store = ColumnStore([{key: random_value(rng, key) for key in keys} | {"id": f"{n:04d}"} for n in range(400)])
+    stats = CatalogStats()
+    stats.extend(len(store))
+    stats.step(store, 150) # 集計の途中で編集する (まだ集計していない行は後でその時点の値が数えられる)
+
+    for _ in range(100):
+        row = store[rng.randrange(len(store))]
+        key = rng.choice(keys)
+        old, new = row[key], random_value(rng, key)
+        row[key] = new
+        if old != row[key]:
+            stats.edit(row.row, {key: (old, row[key])}, row)
+    for _ in range(10):
+        rows = [rng.randrange(len(store)) for _ in range(40)]
+        changes = {key: bulk(store, rng, key, rows + rows[:5]) for key in rng.sample(keys, 2)}
+        stats.bulk_edit(store, changes)
+
+    while not stats.step(store):
+        pass
+    assert snapshot(stats) == recount(store)
+    assert all(totals[0] for groups in stats.margins.values() for totals in groups.values()) # 0件の値は残さない
+
+
+def test_margin_rates():
+    store = ColumnStore([
+        {"id": "1", "cost_price": "60", "selling_price": "100", "rank": "A"},
+        {"id": "2", "cost_price": "20", "selling_price": "100", "rank": "A"},
+        {"id": "3", "cost_price": "", "selling_price": "100", "rank": "B"}, # 原価がない行は数えない
+        {"id": "4", "cost_price": "90", "selling_price": "100", "rank": "C"},
+    ])
+    stats = CatalogStats()
+    stats.extend(len(store))
+    stats.step(store)
+    assert stats.margin_rates() == [("A", 0.6), ("C", 0.1)]
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ai_copy
+from ai_copy import CopyCache, CopyGenerator, TokenBucket, build_prompt
+
+
+class StubApi(BaseHTTPRequestHandler):
+    """chat/completions のスタブ。プロンプトごとに 429 → 503 → 成功 の順に応答する"""
+    failures = (429, 503)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][0]["content"]
+        server = self.server
+        with server.lock:
+            server.requests.append(prompt)
+            attempt = server.attempts.get(prompt, 0)
+            server.attempts[prompt] = attempt + 1
+        if attempt < len(self.failures):
+            self.send_response(self.failures[attempt])
+            if self.failures[attempt] == 429:
+                self.send_header("Retry-After", "0.05")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content = json.dumps({"catch_copy": f"コピー {prompt[-4:]}"}, ensure_ascii=False)
+        data = json.dumps({"choices": [{"message": {"content": content}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApi)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.attempts = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("ELTEX_AI_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setattr(ai_copy, "BACKOFF_SECONDS", 0.01)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run(generator):
+    generator.start()
+    generator.join(10)
+    assert generator.finished
+    results, done = generator.poll()
+    assert done
+    return {record_id: (values, error) for record_id, values, error in results}
+
+
+def make_jobs(count):
+    return [(f"{n:04d}", ("catch_copy",), build_prompt({"name": f"商品{n:04d}"}, ("catch_copy",))) for n in range(count)]
+
+
+def test_retries_then_caches(stub_api, tmp_path):
+    jobs = make_jobs(4)
+    generator = CopyGenerator(jobs, "gpt-4o", "key", cache=CopyCache(str(tmp_path)), concurrency=4, rate=100)
+    assert generator.endpoint == f"http://127.0.0.1:{stub_api.server_address[1]}/v1" # ELTEX_AI_ENDPOINT
+    results = run(generator)
+    assert generator.failed == 0 and generator.cached == 0
+    assert {record_id: values["catch_copy"] for record_id, (values, _) in results.items()} == {
+        f"{n:04d}": f"コピー {n:04d}" for n in range(4)
+    }
+    assert len(stub_api.requests) == 4 * 3 # 429 と 503 の後に成功
+
+    # 同じ商品情報ならキャッシュ (ファイルから読み直したものでも) から返し、API は呼ばない
+    generator = CopyGenerator(jobs, "gpt-4o", "key", cache=CopyCache(str(tmp_path)), concurrency=4, rate=100)
+    results = run(generator)
+    assert generator.cached == 4 and len(stub_api.requests) == 12
+    assert results["0002"][0] == {"catch_copy": "コピー 0002"}
+
+
+def test_gives_up_after_retries(stub_api, monkeypatch):
+    monkeypatch.setattr(StubApi, "failures", (503,) * 10)
+    generator = CopyGenerator(make_jobs(1), "gpt-4o", "key", rate=100, retries=2)
+    results = run(generator)
+    assert generator.failed == 1
+    assert results["0000"] == (None, "HTTP 503: Service Unavailable")
+    assert len(stub_api.requests) == 3
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def acquire_all():
+        started = time.monotonic()
+        for _ in range(11):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 最初の1回は待たず、残り10回は 1/50 秒ずつ
+    assert asyncio.run(acquire_all()) >= 10 / 50 * 0.9
+
+
+def test_token_bucket_pause_blocks_everyone():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=5, clock=lambda: now[0])
+    bucket.pause(2)
+    assert bucket.tokens == -20
+    now[0] = 2.1
+    bucket.refill()
+    assert 1 <= bucket.tokens < 2
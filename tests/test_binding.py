@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import binding
+from binding import FormBinding, format_value, parse_value
+from schema import FIELD_MAP
+
+PRICE = FIELD_MAP["selling_price"]
+SALE = FIELD_MAP["is_sale"]
+
+
+class Var:
+    """tk変数の代わり (get() / set() だけを使う)"""
+    def __init__(self, value=""):
+        self.value = value
+        self.sets = 0
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+        self.sets += 1
+
+
+def test_int_round_trip():
+    assert format_value(PRICE, "1980") == "1,980"
+    assert format_value(PRICE, 1980) == "1,980"
+    assert parse_value(PRICE, "1,980") == "1980"
+    assert format_value(PRICE, parse_value(PRICE, "1,980")) == "1,980"
+    assert format_value(PRICE, "1,980") == "1,980" # 正規化されていない値は表示もそのまま
+    assert format_value(PRICE, "01980") == "01980"
+
+
+def test_int_input():
+    assert parse_value(PRICE, "１，９８０") == "1980" # 全角数字
+    assert parse_value(PRICE, "1980円") == "1980"
+    assert parse_value(PRICE, "") == "" and parse_value(PRICE, "  ") == ""
+    assert parse_value(PRICE, "abc") == "abc" # 数値として読めない入力はそのまま (検証で指摘する)
+    assert parse_value(PRICE, "1.5") == "1.5"
+    assert format_value(PRICE, "") == "" and format_value(PRICE, None) == ""
+
+
+def test_bool_and_choice_fields():
+    assert format_value(SALE, "1") is True and format_value(SALE, "0") is False and format_value(SALE, "") is False
+    assert format_value(SALE, True) is True
+    assert parse_value(SALE, True) is True and parse_value(SALE, False) is False
+    assert parse_value(FIELD_MAP["tax_rate"], "１０％") == "10%"
+    assert parse_value(FIELD_MAP["tax_rate"], "11%") == "11%"
+
+
+def test_read_returns_source_for_untouched_fields():
+    pytest.importorskip("tkinter")
+    variables = {"selling_price": Var(), "cost_price": Var(), "name": Var()}
+    form = FormBinding(variables, {}, FIELD_MAP)
+    item = {"selling_price": "1,980", "cost_price": 1000, "name": "ボトル"}
+    assert form.show(item) == {"selling_price", "cost_price", "name"}
+    assert variables["cost_price"].get() == "1,000"
+    assert form.read() == item # 表示を整形しても元の値 ("1,980" と int) を書き換えない
+    variables["selling_price"].set("２，５００")
+    assert form.read() == {"selling_price": "2500", "cost_price": 1000, "name": "ボトル"}
+    # 入力した表記は次の表示で整形し直し、それ以外は書き換えない
+    assert form.show({"selling_price": "2500", "cost_price": 1000, "name": "ボトル"}) == {"selling_price"}
+    assert variables["selling_price"].get() == "2,500" and variables["name"].sets == 1
+
+
+def test_import_without_tkinter():
+    code = "import sys, binding; print('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(binding.__file__)), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
@@ -0,0 +1,50 @@
+import pytest
+
+from bulk_edit import BulkEdit, BulkEditError, round_half_up
+from column_store import ColumnStore
+from csv_io import row_to_item
+
+
+def make_store():
+    rows = [
+        {"id": "0001", "rank": "A", "cost_price": "1000", "selling_price": "1500", "is_sale": "1"},
+        {"id": "0002", "rank": "C", "cost_price": "1990", "selling_price": "2500", "is_sale": "0"},
+        {"id": "0003", "rank": "C", "cost_price": "", "selling_price": "980", "is_sale": "1"},
+    ]
+    return ColumnStore([row_to_item(row) for row in rows])
+
+
+def test_filter_and_assign_rounds_half_up():
+    store = make_store()
+    edit = BulkEdit(store, "rank == 'C'", "selling_price = round(cost_price * 1.05)")
+    assert edit.preview() == (2, 1) # 原価が空欄の行は変更できない
+    changes = edit.apply()
+    assert changes["selling_price"].rows == [1]
+    assert store.get_many("selling_price", [0, 1, 2]) == [1500, 2090, 980]
+    assert round_half_up(2.5) == 3 and round_half_up(1234, -1) == 1230
+
+
+@pytest.mark.parametrize("text, expected", [("'false'", False), ("'0'", False), ("'no'", False), ("'TRUE'", True), ("'1'", True), ("0", False), ("True", True)])
+def test_bool_assignment_parses_strings(text, expected):
+    store = make_store()
+    BulkEdit(store, "", f"is_sale = {text}").apply()
+    assert store.get_many("is_sale", [0, 1, 2]) == [expected] * 3
+
+
+def test_bool_assignment_rejects_unparsable_values():
+    store = make_store()
+    with pytest.raises(BulkEditError):
+        BulkEdit(store, "", "is_sale = 'maybe'").apply()
+    assert store.get_many("is_sale", [0, 1, 2]) == [True, False, True]
+
+
+def test_failed_assignment_writes_nothing():
+    store = make_store()
+    with pytest.raises(BulkEditError):
+        BulkEdit(store, "", "name = 'x'\nselling_price = 'abc'").apply()
+    assert store.get_many("name", [0]) == [""]
+
+
+def test_id_is_readonly():
+    with pytest.raises(BulkEditError):
+        BulkEdit(make_store(), "", "id = 'x'")
@@ -0,0 +1,50 @@
+from catalog import DirtyTracker
+from column_store import ColumnStore
+from csv_io import row_to_item
+
+
+def make_store(count=3):
+    return ColumnStore([row_to_item({"id": f"{n:04d}", "webcd": f"W{n}", "jan": f"49{n:011d}"}) for n in range(count)])
+
+
+def test_index_returns_first_of_duplicates_and_promotes_on_remove():
+    store = make_store()
+    store.set_many("jan", [2], [store[0]["jan"]])
+    index = store.record_index()
+    jan = store[0]["jan"]
+    assert index.get("jan", jan).row == 0
+    index.remove(store[0]) # 別のビューでも同じ行として外せる
+    assert index.get("jan", jan).row == 2
+    assert not index.shadowed["jan"]
+
+
+def test_rekey_with_new_view_of_same_row():
+    # bulk_changed は id を書き換えた後、引けなくなったレコードを data[row] の新しいビューで付け替える
+    store = make_store()
+    index = store.record_index()
+    store.set_many("id", [1], ["X1"])
+    index.rekey(store[1], "id", "0001", "X1")
+    assert index.get("id", "0001") is None
+    assert index.get("id", "X1").row == 1
+
+
+def test_rekey_duplicate_removes_only_that_row():
+    store = make_store()
+    store.set_many("webcd", [1, 2], ["W0", "W0"])
+    index = store.record_index()
+    index.rekey(store[2], "webcd", "W0", "W2")
+    assert index.get("webcd", "W0").row == 0
+    assert [record.row for record in index.shadowed["webcd"]["W0"]] == [1]
+    assert index.get("webcd", "W2").row == 2
+
+
+def test_dirty_tracker_clear_through_keeps_later_edits():
+    dirty = DirtyTracker()
+    dirty.mark("a", "name")
+    dirty.mark_many(["b", "c"], "jan")
+    seq = dirty.seq
+    dirty.mark("c", "name")
+    dirty.clear_through(seq)
+    assert list(dirty) == ["c"]
+    assert dirty.dirty_fields("c") == {"jan", "name"}
+    assert dirty.dirty_fields("a") == set()
@@ -0,0 +1,78 @@
+import os
+
+import catalog_cache
+from catalog_cache import CachedCsvLoader, CatalogCache, capture, fingerprint, restore_search_index
+from column_store import ColumnStore
+from csv_io import row_to_item
+
+
+def write_csv(path, count):
+    lines = ["id,name,price"] + [f"{n:06d},商品{n},{n * 10}" for n in range(count)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def load_all(loader):
+    loader.start()
+    records = []
+    done = False
+    while not done:
+        chunk, done = loader.poll()
+        records.extend(chunk)
+    loader.join(5)
+    return records
+
+
+def test_fingerprint_changes_with_tail(tmp_path):
+    path = tmp_path / "big.csv"
+    write_csv(path, 50000)
+    before = fingerprint(str(path))
+    data = bytearray(path.read_bytes())
+    data[-3] = ord("9") if data[-3] != ord("9") else ord("8")
+    path.write_bytes(bytes(data))
+    os.utime(path, ns=(before["mtime_ns"], before["mtime_ns"])) # サイズも更新日時も同じ
+    assert fingerprint(str(path))["hash"] != before["hash"]
+
+
+def test_middle_edit_misses_cache(tmp_path):
+    path = tmp_path / "catalog.csv"
+    write_csv(path, 50000)
+    cache = CatalogCache(str(tmp_path / "cache"))
+    before = fingerprint(str(path))
+    store = ColumnStore([{"id": "000001"}])
+    cache.save_async(before, *capture(store, store.search_index())).join(5)
+    assert cache.load(before) is not None
+    data = path.read_bytes()
+    middle = data.index("商品25000".encode("utf-8"))
+    path.write_bytes(data[:middle] + "製品".encode("utf-8") + data[middle + len("商品".encode("utf-8")):])
+    os.utime(path, ns=(before["mtime_ns"], before["mtime_ns"])) # サイズも更新日時も同じ
+    after = fingerprint(str(path))
+    assert (after["size"], after["mtime_ns"]) == (before["size"], before["mtime_ns"])
+    assert cache.load(after) is None
+
+
+def test_cached_loader_skips_parsing_on_hit(tmp_path, monkeypatch):
+    path = tmp_path / "catalog.csv"
+    write_csv(path, 30)
+    cache = CatalogCache(str(tmp_path / "cache"))
+
+    loader = CachedCsvLoader(str(path), cache, encoding="utf-8")
+    records = load_all(loader)
+    assert loader.snapshot is None and len(records) == 30
+    store = ColumnStore([row_to_item(record) for record in records])
+    search_index = store.search_index()
+    while not search_index.build_step():
+        pass
+    cache.save_async(loader.fingerprint, *capture(store, search_index)).join(5)
+
+    def parse(self):
+        raise AssertionError("キャッシュが一致したのにCSVを解析した")
+    monkeypatch.setattr(catalog_cache.CsvLoader, "run", parse)
+    hit = CachedCsvLoader(str(path), cache, encoding="utf-8")
+    hit.start()
+    hit.join(5)
+    assert hit.snapshot is not None and hit.error is None
+    restored = hit.snapshot.store
+    assert [restored[row]["id"] for row in range(len(restored))] == [store[row]["id"] for row in range(len(store))]
+    restored_index = restored.search_index()
+    restore_search_index(restored_index, hit.snapshot.search)
+    assert restored_index.search("商品12", 10) == search_index.search("商品12", 10) != []
@@ -0,0 +1,66 @@
+import io
+
+from catalog_diff import REMOVED_FIELD, CatalogDiff, Conflict, diff_files, merge_files, merge_plan
+from csv_io import FIELDS
+
+
+def write(path, rows):
+    path.write_text("\n".join(["id,name,selling_price,is_sale"] + rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def values(**fields):
+    return tuple(fields.get(key, "") for key in FIELDS)
+
+
+def test_diff_files(tmp_path):
+    base = write(tmp_path / "base.csv", ["1,A,100,1", "2,B,200,0", "3,C,300,0"])
+    incoming = write(tmp_path / "new.csv", ["1,A,100,TRUE", "3,C,350,0", "4,D,400,0", ",X,1,0"])
+    diff = diff_files(base, incoming)
+    assert diff.removed == ["2"]
+    assert list(diff.added) == ["4"]
+    added = dict(zip(FIELDS, diff.added["4"]))
+    assert (added["name"], added["selling_price"], added["is_published"]) == ("D", "400", "0") # ない列は空欄 (フラグは 0)
+    assert diff.changed == {"3": {"selling_price": ("300", "350")}}
+    assert diff.unchanged == 1 and diff.unkeyed == 1 # フラグの表記の違いは差分にしない
+    assert len(diff) == 3
+
+
+def test_merge_plan_keeps_unsaved_edits():
+    diff = CatalogDiff("id")
+    diff.changed = {
+        "1": {"name": ("A", "A2"), "selling_price": ("100", "150")},
+        "2": {"name": ("B", "B2")},
+        "9": {"name": ("Z", "Z2")},
+    }
+    diff.added = {"4": values(id="4", name="D"), "5": values(id="5", name="E", is_sale="1")}
+    local = {
+        "1": ({"id": "1", "name": "ローカル", "selling_price": 100}, {"name"}),
+        "2": ({"id": "2", "name": "B2"}, {"name"}), # 同じ値に編集済み: 競合にしない
+        "5": ({"id": "5", "name": "E", "is_sale": False}, set()), # 前回追加済み
+    }
+    updates, added, conflicts = merge_plan(diff, lambda key: local.get(key, (None, ())))
+    assert updates == {"1": {"selling_price": "150"}, "5": {"is_sale": "1"}}
+    assert added == [values(id="4", name="D")]
+    assert conflicts == [
+        Conflict("1", "name", "A", "ローカル", "A2"),
+        Conflict("9", REMOVED_FIELD, "", "(なし)", "(変更)"),
+    ]
+
+
+def test_merge_files(tmp_path):
+    base = write(tmp_path / "base.csv", ["1,A,100,0", "2,B,200,0", "3,C,300,0"])
+    local = write(tmp_path / "local.csv", ["1,A-local,100,0", "2,B,200,0", "5,L,1,0"])
+    incoming = write(tmp_path / "new.csv", ["1,A-new,120,0", "3,C,300,1", "6,N,1,0"])
+    output = io.StringIO()
+    conflicts = merge_files(base, local, incoming, output)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == ",".join(FIELDS)
+    rows = {line.split(",")[0]: line.split(",") for line in lines[1:]}
+    assert list(rows) == ["1", "5", "6"] # 2 は incoming で、3 は local で削除された
+    assert rows["1"][FIELDS.index("name")] == "A-local" # 競合はローカルを残す
+    assert rows["1"][FIELDS.index("selling_price")] == "120"
+    assert conflicts == [
+        Conflict("1", "name", "A", "A-local", "A-new"),
+        Conflict("3", REMOVED_FIELD, "", "(削除)", "(変更)"),
+    ]
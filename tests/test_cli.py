@@ -0,0 +1,63 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+
+ROWS = ["0001,A,100,120,C", "0002,B,200,180,A", "0003,C,300,400,C"] # 0002 は売価が原価を下回る
+
+
+def write(path, rows=ROWS):
+    path.write_text("\n".join(["id,name,cost_price,selling_price,rank"] + rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_transform(tmp_path):
+    source = write(tmp_path / "in.csv")
+    output = str(tmp_path / "out.csv")
+    assert cli.main([source, "-o", output, "-q", "--no-validate", "--filter", "rank == 'C'", "--set", "selling_price = cost_price * 2"]) == 0
+    assert [row["selling_price"] for row in read(output)] == ["200", "180", "600"]
+
+
+def test_strict_exit_code_on_validation_failure(tmp_path):
+    source = write(tmp_path / "in.csv")
+    issues = str(tmp_path / "issues.csv")
+    assert cli.main([source, "-q", "--issues", issues]) == 0
+    assert cli.main([source, "-q", "--strict"]) == 1
+    with open(issues, newline="", encoding="utf-8-sig") as f:
+        found = [row for row in csv.DictReader(f) if row["field"] == "selling_price"]
+    assert [(row["row"], row["id"]) for row in found] == [("2", "0002")]
+
+
+def test_chunked_output(tmp_path):
+    source = write(tmp_path / "in.csv")
+    output = str(tmp_path / "out.csv")
+    issues = str(tmp_path / "issues.csv")
+    assert cli.main([source, "-o", output, "-q", "--chunk-size", "1", "--issues", issues, "--set", "name = name + '!'"]) == 0
+    assert [(row["id"], row["name"]) for row in read(output)] == [("0001", "A!"), ("0002", "B!"), ("0003", "C!")]
+    with open(issues, newline="", encoding="utf-8-sig") as f:
+        rows = {row["row"] for row in csv.DictReader(f) if row["field"] == "selling_price"}
+    assert rows == {"2"} # 行番号はチャンクをまたいで通し番号
+
+
+def test_invalid_arguments(tmp_path, capsys):
+    source = write(tmp_path / "in.csv")
+    with pytest.raises(SystemExit) as raised:
+        cli.main([source, "--filter", "rank == 'C'"]) # --set なしの --filter は黙って無視しない
+    assert raised.value.code == 2
+    assert cli.main([source, "-q", "--set", "selling_price = "]) == 2
+    assert "式の誤り" in capsys.readouterr().err
+
+
+def test_does_not_import_tkinter():
+    code = "import sys, cli; print('tkinter' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(cli.__file__)), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
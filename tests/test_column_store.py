@@ -0,0 +1,57 @@
+import pytest
+
+from column_store import ColumnStore, TextColumn, column_value
+
+
+def test_int_column_round_trips_non_canonical_text():
+    store = ColumnStore([{"id": "1", "selling_price": "1980"}, {"id": "2", "selling_price": "1,980"}, {"id": "3", "selling_price": "05"}, {"id": "4"}])
+    assert [row["selling_price"] for row in store] == ["1980", "1,980", "05", ""]
+    assert store.get_many("selling_price", range(4)) == [1980, "1,980", "05", ""]
+    assert store.typed_column("selling_price") == [1980, 1980, 5, None]
+    store.set_many("selling_price", [1, 2], [500, 600]) # 整数を書き込むと元の文字列は捨てる
+    assert [row["selling_price"] for row in store] == ["1980", "500", "600", ""]
+    store[0]["selling_price"] = "abc"
+    assert store.get_many("selling_price", [0]) == ["abc"]
+
+
+def test_bool_and_category_columns():
+    store = ColumnStore([{"id": "1", "is_sale": "1", "rank": "A"}, {"id": "2", "is_sale": "", "rank": "B"}, {"id": "3", "is_sale": "true", "rank": "A"}])
+    assert store.typed_column("is_sale") == [True, False, True]
+    store.set_many("is_sale", [0, 1], ["0", True])
+    assert store.get_many("is_sale", range(3)) == [False, True, True]
+    assert store.columns["rank"].categories == ["A", "B"] # 同じ値は1回だけ持つ
+    store[1]["rank"] = "A"
+    assert store.column("rank") == ["A", "A", "A"]
+
+
+def test_text_column_reuses_space_and_compacts():
+    column = TextColumn()
+    for value in ("商品A", "商品B", "xyz"):
+        column.append(value)
+    column.set(0, "短い") # 元の領域に収まる
+    column.set(1, "長い商品名" * 10)
+    assert column.get_many(range(3)) == ["短い", "長い商品名" * 10, "xyz"]
+    assert column.garbage == len("商品A".encode()) - len("短い".encode()) + len("商品B".encode())
+    column.compact()
+    assert column.garbage == 0 and len(column.buffer) == sum(column.lengths)
+    assert column.typed_values() == ["短い", "長い商品名" * 10, "xyz"]
+
+
+def test_row_view_behaves_like_a_record():
+    store = ColumnStore([{"id": "1", "name": "テスト"}])
+    row = store[-1]
+    assert row.row == 0 and row["name"] == "テスト" and "name" in row
+    assert row.to_dict()["id"] == "1"
+    row["name"] = "変更"
+    assert store[0]["name"] == "変更"
+    with pytest.raises(IndexError):
+        store[1]
+
+
+def test_column_value_matches_get_many():
+    texts = {"selling_price": ["1980", "1,980", "05", "", 1980], "is_sale": ["1", "0", "", True], "name": ["商品", "", 5]}
+    for key, values in texts.items():
+        store = ColumnStore([{"id": str(n), key: value} for n, value in enumerate(values)])
+        # 取り込んだ値と同じ表記なら、変更なしと判定できる
+        assert [column_value(key, value) for value in values] == store.get_many(key, range(len(values)))
+    assert type(column_value("name", 5)) is str
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+from csv_io import CsvExporter, CsvLoader, iter_csv_chunks, parse_bool, row_to_item
+
+
+def items(count):
+    return [row_to_item({"id": f"{n:04d}", "name": f"商品{n}", "is_sale": "1"}) for n in range(count)]
+
+
+def export(path, chunks, abort=False):
+    exporter = CsvExporter(str(path), sum(map(len, chunks)))
+    exporter.start()
+    for chunk in chunks:
+        exporter.feed(chunk)
+    exporter.abort() if abort else exporter.close()
+    exporter.join(5)
+    return exporter
+
+
+def test_export_round_trip(tmp_path):
+    path = tmp_path / "out.csv"
+    exporter = export(path, [items(3), items(2)])
+    assert exporter.error is None and exporter.written == 5
+    rows = [item for chunk in iter_csv_chunks(str(path), encoding="utf-8") for item in chunk]
+    assert [row["id"] for row in rows] == ["0000", "0001", "0002", "0000", "0001"]
+    assert rows[0]["is_sale"] is True
+
+
+def test_abort_keeps_original_file(tmp_path):
+    path = tmp_path / "out.csv"
+    path.write_text("original", encoding="utf-8")
+    exporter = export(path, [items(3)], abort=True)
+    assert isinstance(exporter.error, InterruptedError)
+    assert path.read_text(encoding="utf-8") == "original"
+    assert os.listdir(tmp_path) == ["out.csv"] # 一時ファイルも残さない
+
+
+def test_close_does_not_block_when_worker_died(tmp_path):
+    exporter = CsvExporter(str(tmp_path / "missing" / "out.csv"), 1, max_pending=1)
+    exporter.start()
+    exporter.join(5)
+    assert exporter.finished and isinstance(exporter.error, OSError)
+    exporter.feed(items(1)) # 誰も取り出さないキューが埋まる
+    closer = threading.Thread(target=exporter.close, daemon=True)
+    closer.start()
+    closer.join(2)
+    assert not closer.is_alive()
+
+
+def write_csv(path, count):
+    # memo にセル内改行を入れて、チャンクの境目で行が割れないことを確かめる
+    lines = ["id,name,memo"] + [f'{n:04d},商品{n},"1行目\n2行目"' for n in range(count)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_loader_chunk_boundaries(tmp_path):
+    path = write_csv(tmp_path / "in.csv", 10)
+    assert [len(chunk) for chunk in iter_csv_chunks(path, 3)] == [3, 3, 3, 1]
+    assert [len(chunk) for chunk in iter_csv_chunks(path, 5)] == [5, 5] # ちょうど割り切れても空のチャンクは返さない
+    loader = CsvLoader(path, chunk_size=3)
+    loader.start()
+    loader.join(5)
+    sizes = []
+    records = []
+    done = False
+    while not done:
+        chunk, done = loader.poll(max_chunks=1)
+        sizes.append(len(chunk))
+        records.extend(chunk)
+    assert loader.error is None
+    assert sizes == [3, 3, 3, 1] # 読み終えていれば最後のチャンクと一緒に完了を返す
+    assert [record["id"] for record in records] == [f"{n:04d}" for n in range(10)]
+    assert all(record["memo"] == "1行目\n2行目" for record in records)
+
+
+def test_loader_stop(tmp_path):
+    path = write_csv(tmp_path / "in.csv", 1000)
+    loader = CsvLoader(path, chunk_size=10, max_pending=2)
+    loader.start()
+    deadline = time.monotonic() + 5
+    while not loader.chunks.full() and time.monotonic() < deadline: # 取り出さないとワーカーはキューの空きを待つ
+        time.sleep(0.01)
+    assert not loader.finished
+    loader.stop()
+    loader.join(2)
+    assert not loader.is_alive() and loader.finished and loader.error is None
+    records, done = loader.poll(max_chunks=100)
+    assert done and len(records) < 1000
+
+
+def test_loader_reports_errors(tmp_path):
+    loader = CsvLoader(str(tmp_path / "missing.csv"))
+    loader.start()
+    loader.join(5)
+    assert isinstance(loader.error, OSError)
+    assert loader.poll() == ([], True)
+
+
+def test_parse_bool():
+    assert parse_bool(" TRUE ") and parse_bool("1") and parse_bool("○")
+    assert not parse_bool("false") and not parse_bool("0") and not parse_bool("")
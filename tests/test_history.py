@@ -0,0 +1,79 @@
+from bulk_edit import BulkChange
+from history import COALESCE_SECONDS, ColumnEdit, EditHistory, RecordEdit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def total_cost(history):
+    return sum(entry.cost for entry in list(history.undo_stack) + history.redo_stack)
+
+
+def test_typing_in_description_is_coalesced():
+    clock = Clock()
+    history = EditHistory(clock=clock)
+    history.seal()
+    history.push_record("0001", {"description": ("", "a")})
+    clock.now += 1
+    history.push_record("0001", {"description": ("a", "ab")})
+    assert len(history) == 1 and history.undo_stack[-1].changes == {"description": ("", "ab")}
+    clock.now += COALESCE_SECONDS + 1 # 間が空いたら別の操作
+    history.push_record("0001", {"description": ("ab", "abc")})
+    assert len(history) == 2
+    clock.now += 1
+    history.push_record("0001", {"description": ("abc", "ab")}) # 入力して元の値に戻した
+    assert len(history) == 1
+    assert history.cost == total_cost(history)
+
+
+def test_other_fields_and_records_are_not_coalesced():
+    history = EditHistory(clock=Clock())
+    history.push_record("0001", {"name": ("A", "B")})
+    history.push_record("0001", {"name": ("B", "C")})
+    history.push_record("0001", {"description": ("", "x")})
+    history.push_record("0002", {"description": ("", "y")})
+    assert len(history) == 4
+
+
+def test_undo_redo_and_new_edit_drops_redo():
+    history = EditHistory(clock=Clock())
+    history.push_record("0001", {"name": ("A", "B")})
+    history.push_bulk({"price": BulkChange("price", [0, 1], [1, 2], [3, 4])})
+    entry = history.undo()
+    assert isinstance(entry, ColumnEdit) and history.can_redo()
+    assert history.redo() is entry and history.undo() is entry
+    history.push_record("0002", {"name": ("C", "D")})
+    assert not history.can_redo() and history.cost == total_cost(history)
+    assert isinstance(history.undo(), RecordEdit) and isinstance(history.undo(), RecordEdit)
+    assert history.undo() is None
+
+
+def test_grouped_bulk_edits_extend_one_entry():
+    history = EditHistory(clock=Clock())
+    first = BulkChange("catch_copy", [0], ["a"], ["b"])
+    history.push_bulk({"catch_copy": first}, group=1)
+    history.push_bulk({"catch_copy": BulkChange("catch_copy", [1], ["c"], ["d"])}, group=1)
+    history.push_bulk({"catch_copy": BulkChange("catch_copy", [], [], [])}, group=1) # 変更なしは無視
+    assert len(history) == 1
+    change = history.undo_stack[-1].changes["catch_copy"]
+    assert change.rows == [0, 1] and change.new == ["b", "d"]
+    assert first.rows == [0] # 呼び出し元の BulkChange は書き換えない
+    history.push_bulk({"catch_copy": BulkChange("catch_copy", [2], ["e"], ["f"])}, group=2)
+    assert len(history) == 2 and history.cost == total_cost(history)
+
+
+def test_evicts_oldest_entries_over_limits():
+    history = EditHistory(max_entries=3, clock=Clock())
+    for n in range(5):
+        history.push_record(f"{n:04d}", {"name": ("", str(n))})
+    assert [entry.record_id for entry in history.undo_stack] == ["0002", "0003", "0004"]
+    assert history.cost == total_cost(history)
+    small = EditHistory(max_bytes=1, clock=Clock())
+    small.push_record("0001", {"name": ("", "x" * 100)})
+    small.push_record("0002", {"name": ("", "y")})
+    assert [entry.record_id for entry in small.undo_stack] == ["0002"] # 最新の操作は上限を超えても残す
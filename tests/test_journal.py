@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+from aggregates import CatalogStats
+from catalog import DirtyTracker
+from column_store import ColumnStore
+from journal import EditJournal, journal_path, read_journal
+from uniqueness import UniqueIndex
+
+
+def make_csv(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("id,name\n0001,A\n", encoding="utf-8")
+    return str(path)
+
+
+def test_records_are_read_back_in_order(tmp_path):
+    csv_path = make_csv(tmp_path)
+    journal = EditJournal(csv_path)
+    journal.record("0001", {"name": ("A", "B"), "jan": ("", "4901234567894")})
+    journal.record_many(["0001", "0002"], "is_sale", [True, False])
+    journal.close()
+    assert journal.error is None and journal.written == 2
+    header, entries = read_journal(journal_path(csv_path))
+    assert header["source"]["path"] == os.path.abspath(csv_path)
+    assert entries == [("0001", "name", "B"), ("0001", "jan", "4901234567894"), ("0001", "is_sale", True), ("0002", "is_sale", False)]
+
+
+def test_replay_after_compaction(tmp_path):
+    csv_path = make_csv(tmp_path)
+    journal = EditJournal(csv_path)
+    journal.record("0001", {"name": ("A", "B")})
+    journal.record("0002", {"name": ("C", "D")})
+    # 0001 だけ保存した後に作り直し、続けて追記する
+    journal.compact([("0002", "name", "D")])
+    journal.record("0003", {"stock_quantity": ("1", "2")})
+    journal.record("0002", {"name": ("D", "E")})
+    journal.close()
+    header, entries = read_journal(journal_path(csv_path))
+    assert header is not None
+    assert entries == [("0002", "name", "D"), ("0003", "stock_quantity", "2"), ("0002", "name", "E")]
+    replayed = {}
+    for record_id, field, value in entries: # 後の編集が勝つ
+        replayed[(record_id, field)] = value
+    assert replayed == {("0002", "name"): "E", ("0003", "stock_quantity"): "2"}
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_reopened_journal_appends_without_new_header(tmp_path):
+    csv_path = make_csv(tmp_path)
+    first = EditJournal(csv_path)
+    first.record("0001", {"name": ("A", "B")})
+    first.close()
+    second = EditJournal(csv_path)
+    second.record("0001", {"name": ("B", "C")})
+    second.close()
+    with open(journal_path(csv_path), encoding="utf-8") as f:
+        assert sum("journal" in json.loads(line) for line in f) == 1
+    assert read_journal(journal_path(csv_path))[1] == [("0001", "name", "B"), ("0001", "name", "C")]
+
+
+def test_truncated_tail_and_unknown_version(tmp_path):
+    csv_path = make_csv(tmp_path)
+    journal = EditJournal(csv_path)
+    journal.record("0001", {"name": ("A", "B")})
+    journal.close()
+    path = journal_path(csv_path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "0001", "chan') # 書き込み途中で終了した
+    assert read_journal(path)[1] == [("0001", "name", "B")]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"journal": 999}\n{"id": "0001", "changes": {"name": "X"}}\n')
+    assert read_journal(path) == (None, [])
+    assert read_journal(str(tmp_path / "missing.journal")) == (None, [])
+
+
+def test_close_remove_deletes_file(tmp_path):
+    csv_path = make_csv(tmp_path)
+    journal = EditJournal(csv_path)
+    journal.record("0001", {"name": ("A", "B")})
+    journal.close(remove=True)
+    assert not os.path.exists(journal_path(csv_path))
+
+
+def test_bulk_numeric_edit_replays_without_dirty_marks(tmp_path):
+    main = pytest.importorskip("main") # EditorView の書き込み処理をそのまま使う (customtkinter が必要)
+    csv_path = make_csv(tmp_path)
+    journal = EditJournal(csv_path)
+    journal.record_many(["0001", "0002"], "cost_price", [1980, 2980]) # 一括編集の BulkChange.new (int)
+    journal.record_many(["0001"], "is_sale", [True])
+    journal.close()
+    entries = read_journal(journal_path(csv_path))[1]
+    assert entries == [("0001", "cost_price", "1980"), ("0002", "cost_price", "2980"), ("0001", "is_sale", True)]
+
+    class Editor:
+        write_fields = main.EditorView.write_fields
+        replay_edits = main.EditorView.replay_edits
+
+    class Validator:
+        def revalidate(self, rows, keys):
+            return False
+
+    class Binding:
+        def invalidate(self):
+            pass
+
+    # 編集はすでにストアにある (SQLite のストアを開き直した場合など): 読み戻しても何も変わらない
+    editor = Editor()
+    editor.data = ColumnStore([{"id": "0001", "cost_price": "1980", "is_sale": "1"}, {"id": "0002", "cost_price": "2980"}])
+    editor.index = editor.data.record_index()
+    editor.search_index = editor.data.search_index()
+    editor.dirty = DirtyTracker()
+    editor.stats = CatalogStats()
+    editor.unique = UniqueIndex()
+    editor.validator = Validator()
+    editor.binding = Binding()
+    editor.refresh_tabs = editor.load_active_item = lambda: None
+    assert editor.replay_edits(entries) == 0
+    assert len(editor.dirty) == 0
+    editor.data[1]["cost_price"] = "100"
+    assert editor.replay_edits(entries) == 1
+    assert editor.data[1]["cost_price"] == "2980" and list(editor.dirty) == ["0002"]
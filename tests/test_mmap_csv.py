@@ -0,0 +1,44 @@
+import csv
+
+import pytest
+
+from mmap_csv import MappedCsvLoader, MappedCsvStore
+
+
+def load(path):
+    store = MappedCsvStore(str(path))
+    loader = MappedCsvLoader(store)
+    loader.run() # スレッドを起動せずにその場で読む
+    entries, done = loader.poll(max_chunks=100)
+    store.extend(entries)
+    return store, loader
+
+
+def test_quoted_newline_and_keys(tmp_path):
+    path = tmp_path / "items.csv"
+    path.write_text('id,name,jan,instore_jan,is_sale\n0001,"複数\n行",4900000000001,2000000000001,1\n0002,"a ""b""",,,0\n', encoding="utf-8")
+    store, loader = load(path)
+    assert loader.error is None and len(store) == 2
+    assert store[0]["name"] == "複数\n行"
+    assert store[1]["name"] == 'a "b"'
+    assert store.get_many("instore_jan", [0, 1]) == ["2000000000001", ""]
+    assert store.get_many("is_sale", [0, 1]) == [True, False]
+    store.set_many("jan", [1], ["4900000000002"])
+    assert store[1]["jan"] == "4900000000002"
+    store.close()
+
+
+def test_unbalanced_quote_reports_line(tmp_path):
+    path = tmp_path / "broken.csv"
+    path.write_text('id,name\n0001,ok\n0002,"abc,1\n', encoding="utf-8")
+    store, loader = load(path)
+    assert isinstance(loader.error, csv.Error)
+    assert "3行目" in str(loader.error)
+    store.close()
+
+
+def test_unbalanced_quote_in_header(tmp_path):
+    path = tmp_path / "broken.csv"
+    path.write_text('id,"name\n0001,ok\n', encoding="utf-8")
+    with pytest.raises(csv.Error, match="1行目"):
+        MappedCsvStore(str(path))
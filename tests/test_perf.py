@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+
+import pytest
+
+import perf
+from perf import Profiler, install_widget_counters
+
+
+def test_chrome_trace_shape(tmp_path):
+    profiler = Profiler()
+
+    @profiler.timed("work")
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    with profiler.span("render"):
+        pass
+    profiler.count("rows", 3)
+    profiler.count("rows")
+    path = tmp_path / "trace.json"
+    profiler.export_chrome_trace(str(path))
+    trace = json.loads(path.read_text(encoding="utf-8"))
+    assert trace["displayTimeUnit"] == "ms"
+    events = trace["traceEvents"]
+    assert [(event["name"], event["ph"]) for event in events] == [("work", "X"), ("render", "X"), ("rows", "C"), ("rows", "C")]
+    for event in events:
+        assert event["pid"] == os.getpid() and event["tid"] == threading.get_ident()
+        assert event["ts"] >= 0 # 時刻はマイクロ秒 (Profiler を作った時点から)
+    assert all(event["dur"] >= 0 and "args" not in event for event in events[:2])
+    assert [event["args"] for event in events[2:]] == [{"value": 3}, {"value": 4}] # カウンターは累計
+    assert events[0]["ts"] <= events[1]["ts"] <= events[2]["ts"]
+
+
+def test_snapshot_reset_and_disable():
+    profiler = Profiler(max_events=3)
+    for _ in range(5):
+        with profiler.span("tick"):
+            pass
+    profiler.count("rows", 2)
+    snapshot = profiler.snapshot()
+    assert snapshot["timers"]["tick"]["count"] == 5
+    assert snapshot["timers"]["tick"]["max_ms"] >= snapshot["timers"]["tick"]["avg_ms"] >= 0
+    assert snapshot["counters"] == {"rows": 2}
+    assert len(profiler.chrome_trace()["traceEvents"]) == 3 # 直近 max_events 件だけ残す
+    profiler.reset()
+    assert profiler.snapshot() == {"timers": {}, "counters": {"rows": 2}}
+    profiler.enabled = False
+    with profiler.span("tick"):
+        pass
+    profiler.count("rows")
+    assert profiler.snapshot() == {"timers": {}, "counters": {"rows": 2}} and profiler.chrome_trace()["traceEvents"] == []
+
+
+def test_widget_counters(monkeypatch):
+    tkinter = pytest.importorskip("tkinter")
+    # 画面がなくても数えられるように、tk ウィジェットの生成・破棄を差し替えてから取り付ける
+    monkeypatch.setattr(tkinter.BaseWidget, "__init__", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(tkinter.BaseWidget, "destroy", lambda self: None)
+    monkeypatch.setattr(perf, "_widget_counters_installed", False)
+    profiler = Profiler()
+    install_widget_counters(profiler)
+    install_widget_counters(profiler) # 2回目は何もしない (二重に数えない)
+
+    class Widget(tkinter.BaseWidget):
+        pass
+
+    widgets = [Widget() for _ in range(3)]
+    widgets[0].destroy()
+    assert profiler.snapshot()["counters"] == {"tk.widgets.created": 3, "tk.widgets.destroyed": 1}
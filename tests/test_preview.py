@@ -0,0 +1,42 @@
+import random
+import time
+
+from preview import PreviewEngine, diff_region, html_to_text
+
+
+def wait_result(engine, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = engine.poll()
+        if result is not None:
+            return result
+        time.sleep(0.01)
+    raise AssertionError("変換結果が届かなかった")
+
+
+def test_html_to_text():
+    html = '<p class="x">大容量<br>保温</p><ul><li>A</li><li>B</li></ul>'
+    assert html_to_text(html) == "大容量\n保温\n\n・ A\n・ B\n"
+
+
+def test_diff_region_reconstructs_new_text():
+    rng = random.Random(2)
+    for _ in range(300):
+        old = "".join(rng.choice("ab\n") for _ in range(rng.randrange(12)))
+        new = "".join(rng.choice("ab\n") for _ in range(rng.randrange(12)))
+        start, end, inserted = diff_region(old, new)
+        assert old[:start] + inserted + old[end:] == new
+        assert start <= end <= len(old)
+    assert diff_region("same", "same") == (4, 4, "")
+
+
+def test_engine_caches_results():
+    engine = PreviewEngine(cache_size=2)
+    assert engine.submit("<p>a</p>", 1) is None
+    assert wait_result(engine) == (1, "a\n\n")
+    assert engine.submit("<p>a</p>", 2) == "a\n\n" # キャッシュにあればその場で返す
+    for token, source in enumerate(("<b>b</b>", "<i>c</i>"), 3):
+        engine.submit(source, token)
+        assert wait_result(engine) == (token, html_to_text(source))
+    assert engine.submit("<p>a</p>", 5) is None # 古いものから捨てる
+    assert wait_result(engine) == (5, "a\n\n")
@@ -0,0 +1,60 @@
+import random
+
+from column_store import ColumnStore
+from search import NGramIndex, normalize, search_text
+
+
+def build(records):
+    store = ColumnStore(records)
+    index = store.search_index()
+    while not index.build_step():
+        pass
+    return store, index
+
+
+def test_prefix_and_substring_search():
+    store, index = build([
+        {"id": "1", "name": "ステンレス ボトル", "jan": "4901234567894", "webcd": "W100"},
+        {"id": "2", "name": "ｽﾃﾝﾚｽ ﾏｸﾞ", "catch_copy": "保温", "jan": "4909999999999", "webcd": "W200"},
+        {"id": "3", "name": "Bottle ＢＯＸ", "webcd": "W101"},
+        {"id": "4", "name": "abcxbcd"},
+    ])
+    assert index.search("4901") == [0]
+    assert index.search("W10") == [0, 2]
+    assert index.search("ステンレス") == [0, 1] # 半角カナも一致する
+    assert index.search("bottle box") == [2]
+    assert index.search("保温") == [1]
+    assert index.search("abcd") == [] # N-gram はそろっていても連続していない
+    assert index.search("  ") == []
+    assert index.search("W", limit=2) == [0, 2] # 値の順に limit 件
+
+
+def test_update_after_edit():
+    store, index = build([{"id": "1", "name": "赤いペン", "jan": "111"}, {"id": "2", "name": "青いペン", "jan": "222"}])
+    row = store[0]
+    changes = {"name": ("赤いペン", "緑のノート"), "jan": ("111", "333")}
+    row["name"], row["jan"] = "緑のノート", "333"
+    index.update(0, row, changes)
+    assert index.search("赤い") == [] and index.search("111") == []
+    assert index.search("ノート") == [0] and index.search("333") == [0]
+    assert index.search("ペン") == [1]
+
+
+def test_ngram_candidates_match_brute_force():
+    rng = random.Random(5)
+    texts = ["".join(rng.choice("abcde") for _ in range(rng.randrange(1, 12))) for _ in range(300)]
+    index = NGramIndex()
+    for row, text in enumerate(texts):
+        index.add(text, row)
+    for row in rng.sample(range(len(texts)), 50): # 途中の行を書き換える (末尾以外への挿入)
+        index.remove(texts[row], row)
+        texts[row] = "".join(rng.choice("abcde") for _ in range(6))
+        index.add(texts[row], row)
+    for query in ("ab", "abc", "eda", "aaaa", "dc"):
+        expected = [row for row, text in enumerate(texts) if all(query[i:i + 2] in text for i in range(len(query) - 1))]
+        assert list(index.candidates(query)) == expected
+
+
+def test_normalize():
+    assert normalize("ＡＢＣ１２３") == "abc123"
+    assert search_text({"name": "ｶﾞｯﾂ", "catch_copy": "Ｎｅｗ"}) == "ガッツ\nnew"
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from column_store import ColumnStore
+from sqlite_store import SqliteStore, database_path
+
+RECORDS = [
+    {"id": "0001", "name": "ステンレス ボトル", "jan": "4901234567894", "webcd": "W100", "selling_price": "1980", "is_sale": "1"},
+    {"id": "0002", "name": "木のマグ", "jan": "4909999999999", "webcd": "W200", "selling_price": "1,980", "is_sale": "0"},
+    {"id": "0003", "name": "ボトルケース", "webcd": "W101", "selling_price": ""},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteStore(str(tmp_path / "catalog.sqlite"))
+    store.extend(RECORDS)
+    yield store
+    store.close()
+
+
+def test_values_match_column_store(store):
+    reference = ColumnStore(RECORDS)
+    for key in ("id", "name", "selling_price", "is_sale", "jan"):
+        assert store.get_many(key, [2, 0, 1]) == reference.get_many(key, [2, 0, 1])
+        assert store.typed_column(key) == reference.typed_column(key)
+        assert [row[key] for row in store] == [row[key] for row in reference]
+
+
+def test_edits_are_recorded_and_persist(store, tmp_path):
+    store[1]["name"] = "陶器のマグ"
+    store.set_many("selling_price", [0, 2], [2000, "abc"])
+    assert store.edited_fields() == {0: {"selling_price"}, 1: {"name"}, 2: {"selling_price"}}
+    store.forget_edits(keep_ids=["0002"])
+    assert store.edited_fields() == {1: {"name"}}
+    store.close()
+    reopened = SqliteStore(str(tmp_path / "catalog.sqlite"))
+    try:
+        assert len(reopened) == 3
+        assert reopened.get_many("selling_price", range(3)) == [2000, "1,980", "abc"]
+        assert reopened[1]["name"] == "陶器のマグ"
+    finally:
+        reopened.close()
+
+
+def test_transaction_rolls_back(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store[0]["name"] = "途中"
+            with store.transaction(): # 入れ子は外側でまとめてコミット・ロールバック
+                store[1]["name"] = "途中"
+            raise RuntimeError
+    assert store[0]["name"] == "ステンレス ボトル" and store[1]["name"] == "木のマグ"
+    assert store.edited_fields() == {}
+
+
+def test_indexes(store):
+    index = store.record_index()
+    assert index.get("webcd", "W200")["id"] == "0002"
+    assert index.get("jan", "") is None and index.get("id", "9999") is None
+    search = store.search_index()
+    assert search.search("W10") == [0, 2]
+    assert search.search("ボトル") == [0, 2]
+    assert search.search("マグ") == [1] # trigram より短い語
+    row = store[1]
+    changes = {"name": (row["name"], "ガラスのボトル")}
+    row["name"] = "ガラスのボトル"
+    search.update(1, row, changes)
+    assert search.search("ボトル") == [0, 1, 2] and search.search("マグ") == []
+
+
+def test_source_path(tmp_path):
+    csv_path = tmp_path / "catalog.csv"
+    store = SqliteStore(database_path(str(csv_path)))
+    try:
+        assert store.is_source(str(csv_path))
+        assert store.is_source(os.path.join(str(tmp_path), ".", "catalog.csv"))
+        assert not store.is_source(str(tmp_path / "copy.csv")) # 「名前を付けて保存」した別のファイル
+    finally:
+        store.close()
@@ -0,0 +1,107 @@
+import pytest
+
+main = pytest.importorskip("main") # customtkinter が必要 (画面は使わない)
+
+
+class Button:
+    """CTkButton の代わり (place / configure の呼び出しを記録する)"""
+    def __init__(self):
+        self.placed = False
+        self.configured = 0
+        self.text = None
+
+    def place(self, **kwargs):
+        self.placed = True
+
+    def place_forget(self):
+        self.placed = False
+
+    def configure(self, text, command, **style):
+        self.configured += 1
+        self.text = text
+        self.command = command
+
+
+class Strip:
+    def __init__(self, width):
+        self.width = width
+
+    def winfo_width(self):
+        return self.width
+
+
+class Scrollbar:
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+class Tabs:
+    """TabBar の処理だけを Tk なしで動かす"""
+    TAB_PADX, SLOT_WIDTH = main.TabBar.TAB_PADX, main.TabBar.SLOT_WIDTH
+    visible_count = main.TabBar.visible_count
+    max_first = main.TabBar.max_first
+    on_resize = main.TabBar.on_resize
+    render = main.TabBar.render
+    update_scrollbar = main.TabBar.update_scrollbar
+    set_active = main.TabBar.set_active
+    scroll_to = main.TabBar.scroll_to
+    on_scroll = main.TabBar.on_scroll
+    set_items = main.TabBar.set_items
+    items_changed = main.TabBar.items_changed
+
+    def __init__(self, data, slots):
+        self.data = data
+        self.dirty = set()
+        self.selected = []
+        self.on_select = self.selected.append
+        self.active_id = None
+        self.first = 0
+        self.buttons = []
+        self.bound = []
+        self.strip = Strip(self.SLOT_WIDTH * (slots - 1))
+        self.scrollbar = Scrollbar()
+
+    def create_button(self):
+        return Button()
+
+    def tab_style(self, is_active):
+        return {"active": is_active}
+
+    def shown(self):
+        return [state[1] if state else None for state in self.bound]
+
+
+def items(count):
+    return [{"id": f"{n:04d}", "name": f"商品{n}"} for n in range(count)]
+
+
+def test_buttons_are_reused_while_scrolling():
+    tabs = Tabs(items(1000), slots=4)
+    tabs.on_resize()
+    assert len(tabs.buttons) == 4 # 件数によらず表示幅に収まる数だけ
+    assert tabs.shown() == ["商品0", "商品1", "商品2", "商品3"]
+    buttons = list(tabs.buttons)
+    tabs.scroll_to(10)
+    assert tabs.buttons == buttons and tabs.shown() == ["商品10", "商品11", "商品12", "商品13"]
+    assert tabs.scrollbar.position == (10 / 1000, 13 / 1000)
+    tabs.on_scroll("moveto", "0.5")
+    assert tabs.first == 500
+    tabs.scroll_to(5000) # 末尾のタブが右端に収まる位置まで
+    assert tabs.first == 997 and tabs.shown() == ["商品997", "商品998", "商品999", None]
+    assert [button.placed for button in tabs.buttons] == [True, True, True, False]
+    tabs.buttons[0].command()
+    assert tabs.selected == ["0997"]
+
+
+def test_only_changed_tabs_are_reconfigured():
+    tabs = Tabs(items(10), slots=4)
+    tabs.on_resize()
+    before = [button.configured for button in tabs.buttons]
+    tabs.set_active("0001")
+    tabs.set_active("0002") # 旧アクティブと新アクティブのボタンだけ
+    tabs.dirty.add("0003")
+    tabs.items_changed()
+    assert [button.configured - count for button, count in zip(tabs.buttons, before)] == [0, 2, 1, 1]
+    assert tabs.shown()[3] == "● 商品3" # 未保存の印
+    tabs.set_items(items(2)) # 検索結果での絞り込み
+    assert tabs.first == 0 and tabs.shown() == ["商品0", "商品1", None, None]
@@ -0,0 +1,81 @@
+import random
+from collections import Counter
+
+from bulk_edit import BulkChange
+from column_store import ColumnStore
+from uniqueness import DELETED, EMPTY, HashTable, UniqueIndex, normalize
+
+
+def test_remove_leaves_deleted_slot_that_keeps_probing():
+    table = HashTable(8)
+    for row, h in enumerate((10, 18, 26)): # すべて同じ枠から探索が始まる
+        table.add(h, row)
+    assert table.remove(18, 1) == 0
+    assert DELETED in table.hashes
+    assert table.rows_of(26) == [2] # 削除した枠の先も探す
+    assert table.remove(18, 1) is None
+    assert table.add(26, 5) == 1 # 削除した枠を使い回しても、その先の同じハッシュを数える
+    assert table.filled == 3 and table.used == 3
+    assert sorted(table.rows_of(26)) == [2, 5]
+
+
+def test_deleted_slots_are_cleared_by_resize():
+    table = HashTable(8)
+    for n in range(200):
+        table.add(100 + n, n)
+        assert table.remove(100 + n, n) == 0
+        assert EMPTY in table.hashes # 削除した枠で埋まって探索が止まらなくならない
+    assert table.used == 0 and len(table.hashes) == 8
+    for n in range(20):
+        table.add(500 + n % 5, n)
+    assert len(table.hashes) >= 32 and table.filled == table.used == 20
+    assert DELETED not in table.hashes
+    assert sorted(table.rows_of(502)) == [2, 7, 12, 17]
+
+
+def test_add_many_reports_existing_hashes():
+    table = HashTable(4)
+    table.add(7, 0)
+    assert table.add_many([(7, 1), (9, 2), (9, 3)]) == [7, 9]
+    assert sorted(table.rows_of(9)) == [2, 3]
+    assert table.used == table.filled == 4
+
+
+def naive(store, key):
+    counts = Counter(normalize(value) for value in store.get_many(key, range(len(store))))
+    counts.pop(None, None)
+    return {value for value, count in counts.items() if count > 1}
+
+
+def test_index_matches_recount_after_edits():
+    rng = random.Random(1)
+    store = ColumnStore([{"id": f"{n:04d}", "jan": str(rng.randrange(40)), "webcd": f"W{n}"} for n in range(300)])
+    unique = UniqueIndex(("jan", "webcd"))
+    unique.extend(len(store))
+    while not unique.step(store, 64): # 少しずつ数える途中でも編集できる
+        row = rng.randrange(len(store))
+        old, new = store[row]["jan"], str(rng.randrange(40))
+        store[row]["jan"] = new
+        unique.edit(row, {"jan": (old, new)})
+    for _ in range(200):
+        row = rng.randrange(len(store))
+        old, new = store[row]["jan"], rng.choice(["", " 7 ", str(rng.randrange(400))])
+        store[row]["jan"] = new
+        unique.edit(row, {"jan": (old, new)})
+    rows = rng.sample(range(len(store)), 50)
+    rows.append(rows[0]) # 同じ行が2回含まれる一括編集
+    change = BulkChange("webcd", rows, [], [])
+    for row in rows:
+        change.old.append(store[row]["webcd"])
+        change.new.append(f"W{rng.randrange(100)}")
+        store[row]["webcd"] = change.new[-1]
+    unique.bulk_edit({"webcd": change})
+
+    for key in ("jan", "webcd"):
+        found = {collision.value for collision in unique.collisions(store) if collision.key == key}
+        assert found == naive(store, key)
+    assert unique.count() >= len(naive(store, "jan")) + len(naive(store, "webcd"))
+    value = next(iter(naive(store, "jan")))
+    rows = unique.matching_rows(store, "jan", value)
+    assert len(rows) > 1 and unique.colliding(store, "jan", value, rows[0])
+    assert not unique.colliding(store, "jan", "not in store", 0)
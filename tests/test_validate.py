@@ -0,0 +1,75 @@
+from column_store import ColumnStore
+from validate import CatalogValidator, extract, gtin_error, validate_batch
+
+
+def record(n, **values):
+    base = {"id": f"{n:04d}", "jan": "4901234567894", "cost_price": "100", "selling_price": "200", "tax_rate": "10%"}
+    base.update(values)
+    return base
+
+
+def problems(validator):
+    return [(issue.id, issue.field) for issue in validator.all_issues()]
+
+
+def test_gtin_error():
+    assert gtin_error("4901234567894") is None
+    assert gtin_error("49012347") is None # GTIN-8
+    assert "チェックデジット" in gtin_error("4901234567890")
+    assert "桁数" in gtin_error("49012345678")
+    assert "数字以外" in gtin_error("49012345678９")
+
+
+def test_full_validation_finds_each_kind_of_issue():
+    store = ColumnStore([
+        record(0),
+        record(1, jan=""),
+        record(2, jan="4901234567890", instore_jan="12"),
+        record(3, cost_price="", selling_price="abc"),
+        record(4, cost_price="300", stock_quantity="-1"),
+        record(5, tax_rate="5%"),
+    ])
+    validator = CatalogValidator(store)
+    validator.start()
+    while not validator.step():
+        pass
+    assert problems(validator) == [
+        ("0001", "jan"),
+        ("0002", "jan"), ("0002", "instore_jan"),
+        ("0003", "cost_price"), ("0003", "selling_price"),
+        ("0004", "stock_quantity"), ("0004", "selling_price"),
+        ("0005", "tax_rate"),
+    ]
+
+
+def test_revalidate_only_checked_fields_after_full_run():
+    store = ColumnStore([record(0), record(1, jan="")])
+    validator = CatalogValidator(store)
+    assert not validator.revalidate([0], {"jan"}) # 全件検証の前は何もしない
+    validator.start()
+    while not validator.step():
+        pass
+    store[1]["jan"] = "4901234567894"
+    store[0]["name"] = "x"
+    assert not validator.revalidate([1], {"jan": ("", "4901234567894")})
+    assert validator.all_issues() == []
+    store[0]["selling_price"] = "-5"
+    validator.revalidate([0], {"name"}) # 検証しない列の変更では再検証しない
+    assert validator.all_issues() == []
+    validator.revalidate([0], {"selling_price"})
+    assert problems(validator) == [("0000", "selling_price"), ("0000", "selling_price")]
+
+
+def test_stale_batch_does_not_overwrite_revalidated_row():
+    store = ColumnStore([record(0, jan=""), record(1)])
+    validator = CatalogValidator(store)
+    validator.start()
+    # step() がバッチを取り出してワーカーで検証している間に、その行が編集・再検証された
+    rows = validator.todo.pop(0)
+    validator.generation += 1
+    validator.running.append((rows, validator.generation, validate_batch(rows, extract(store, rows))))
+    store[0]["jan"] = "4901234567894"
+    validator.validate_rows([0])
+    while not validator.step():
+        pass
+    assert validator.all_issues() == []
@@ -0,0 +1,280 @@
+from array import array
+from collections import namedtuple
+
+from schema import SCHEMA
+
+# --- 一意であるべき列 (JAN / インストアJAN / WebCD / id) の重複チェック ---
+# 読み込みに合わせて、ストアに入った行を先頭からバッチごとに1回だけ数え (step() が4列の値を get_many でまとめて読む。
+# CSVを読み直すのではなく、mmap のストアでもこれらの列は読み込み時に抜き出したキー列から引ける)、
+# 以降は編集のたびに変更前の値を外して変更後の値を入れる。
+# 値そのものやレコードは持たず、値のハッシュと行番号だけを配列のハッシュ表に入れる (1件あたり数十バイト)。
+# ハッシュが同じ行は一覧にするときにストアの値を読んで確かめる。
+# このモジュールは Tk に依存しない。
+
+UNIQUE_FIELDS = tuple(field.key for field in SCHEMA if field.unique)
+BATCH_SIZE = 2000 # 読み込み時に1回で数える行数 (4列分のハッシュを計算するため集計より少なくする)
+
+# 重複している値と、その値を持つ行
+Collision = namedtuple("Collision", "key value rows")
+
+EMPTY = 0
+DELETED = 1 # 削除した枠の印 (探索はその先へ続ける)
+
+
+def normalize(value):
+    """前後の空白は区別しない。空欄は None (数えない)"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def digest(value):
+    """値のハッシュ (EMPTY / DELETED と重ならない正の整数)"""
+    h = hash(value) & 0x7FFFFFFFFFFFFFFF
+    return h if h > DELETED else h + 2
+
+
+class HashTable:
+    """
+    ハッシュ → 行番号 の多重集合 (同じハッシュの行をいくつでも入れられる)。
+    オープンアドレス法の表を array で持つため、dict / set より1件あたりの容量が小さい。
+    """
+    def __init__(self, capacity=1024):
+        self.clear(capacity)
+
+    def clear(self, capacity=1024):
+        self.hashes = array("q", [EMPTY]) * capacity
+        self.rows = array("i", [0]) * capacity
+        self.mask = capacity - 1
+        self.used = 0 # 行の入っている枠
+        self.filled = 0 # 行の入っている枠 + 削除した枠
+
+    def add(self, h, row):
+        """行を入れ、同じハッシュの行がほかにいくつあったかを返す"""
+        if (self.filled + 1) * 4 > len(self.hashes) * 3:
+            self.resize()
+        hashes = self.hashes
+        mask = self.mask
+        slot = h & mask
+        free = None
+        same = 0
+        while True:
+            current = hashes[slot]
+            if current == EMPTY:
+                break
+            if current == h:
+                same += 1
+            elif current == DELETED and free is None:
+                free = slot
+            slot = (slot + 1) & mask
+        if free is None:
+            free = slot
+            self.filled += 1
+        hashes[free] = h
+        self.rows[free] = row
+        self.used += 1
+        return same
+
+    def add_many(self, entries):
+        """[(ハッシュ, 行), ...] を入れ、入れる前から同じハッシュの行があったハッシュを返す (読み込み時の一括登録用)"""
+        entries = list(entries)
+        if (self.filled + len(entries)) * 4 > len(self.hashes) * 3:
+            self.resize(len(entries))
+        hashes = self.hashes
+        rows = self.rows
+        mask = self.mask
+        found = []
+        for h, row in entries:
+            slot = h & mask
+            current = hashes[slot]
+            while current != EMPTY:
+                if current == h:
+                    found.append(h)
+                slot = (slot + 1) & mask
+                current = hashes[slot]
+            hashes[slot] = h
+            rows[slot] = row
+        self.used += len(entries)
+        self.filled += len(entries)
+        return found
+
+    def remove(self, h, row):
+        """行を取り除き、同じハッシュの行が残りいくつあるかを返す (入っていなければ None)"""
+        hashes = self.hashes
+        mask = self.mask
+        slot = h & mask
+        found = None
+        same = 0
+        while True:
+            current = hashes[slot]
+            if current == EMPTY:
+                break
+            if current == h:
+                if found is None and self.rows[slot] == row:
+                    found = slot
+                else:
+                    same += 1
+            slot = (slot + 1) & mask
+        if found is None:
+            return None
+        hashes[found] = DELETED
+        self.used -= 1
+        return same
+
+    def rows_of(self, h):
+        """ハッシュが h の行 (入れた順とは限らない)"""
+        hashes = self.hashes
+        mask = self.mask
+        slot = h & mask
+        rows = []
+        while True:
+            current = hashes[slot]
+            if current == EMPTY:
+                return rows
+            if current == h:
+                rows.append(self.rows[slot])
+            slot = (slot + 1) & mask
+
+    def resize(self, extra=0):
+        """入っている行 (と、これから入れる extra 行) が表の 2/3 未満になるように広げる (削除した枠はここで片付く)"""
+        capacity = len(self.hashes)
+        while (self.used + extra) * 3 >= capacity * 2:
+            capacity *= 2
+        old_hashes, old_rows, used = self.hashes, self.rows, self.used
+        self.clear(capacity)
+        hashes = self.hashes
+        rows = self.rows
+        mask = self.mask
+        for h, row in zip(old_hashes, old_rows):
+            if h > DELETED:
+                slot = h & mask
+                while hashes[slot] != EMPTY:
+                    slot = (slot + 1) & mask
+                hashes[slot] = h
+                rows[slot] = row
+        self.used = self.filled = used
+
+
+class UniqueIndex:
+    """
+    一意であるべき列の値の重複を数える。
+    行は先頭から順に数え (extend() で対象を広げ、step() で少しずつ進める)、まだ数えていない行の編集は無視する
+    (後でその時点の値が数えられる)。重複しているハッシュは duplicates に持ち、件数は count() で引ける。
+    """
+    def __init__(self, keys=UNIQUE_FIELDS):
+        self.keys = keys
+        self.tables = {key: HashTable() for key in keys}
+        self.version = 0 # 重複の状態が変わるたびに増える (表示の更新判定用)
+        self.clear()
+
+    def clear(self):
+        self.counted = 0 # 数えた行数 (先頭から)
+        self.total = 0 # 数える行数
+        for table in self.tables.values():
+            table.clear()
+        self.duplicates = {key: set() for key in self.keys} # 列 → 2行以上にあるハッシュ
+        self.version += 1
+
+    def pending(self):
+        return self.counted < self.total
+
+    def extend(self, total):
+        """読み込みでストアが total 行になったときに呼ぶ"""
+        self.total = total
+
+    def step(self, store, budget_rows=None):
+        """まだ数えていない行を1バッチ分数える。すべて終わったら True を返す"""
+        size = budget_rows or getattr(store, "BATCH_ROWS", BATCH_SIZE) # mmap のストアは1行ごとの取り出しが重い
+        end = min(self.counted + size, self.total, len(store))
+        if end > self.counted:
+            rows = range(self.counted, end)
+            for key in self.keys:
+                entries = [
+                    (digest(value), row)
+                    for row, value in zip(rows, map(normalize, store.get_many(key, rows)))
+                    if value is not None
+                ]
+                self.duplicates[key].update(self.tables[key].add_many(entries))
+            self.counted = end
+            self.version += 1
+        return not self.pending()
+
+    def finish(self, store):
+        """残りの行をすべて数える (保存前の確認用)"""
+        while not self.step(store, len(store) or None):
+            pass
+
+    def count(self):
+        """重複している値の数 (ハッシュの単位。値を確かめるのは collisions())"""
+        return sum(len(hashes) for hashes in self.duplicates.values())
+
+    def add(self, key, value, row):
+        value = normalize(value)
+        if value is None:
+            return
+        h = digest(value)
+        if self.tables[key].add(h, row):
+            self.duplicates[key].add(h)
+
+    def remove(self, key, value, row):
+        value = normalize(value)
+        if value is None:
+            return
+        h = digest(value)
+        if self.tables[key].remove(h, row) == 1:
+            self.duplicates[key].discard(h)
+
+    def edit(self, row, changes):
+        """1件のレコードの編集 {キー: (変更前, 変更後)} を反映する"""
+        if row >= self.counted or not any(key in changes for key in self.keys):
+            return
+        for key in self.keys:
+            if key in changes:
+                old, new = changes[key]
+                self.remove(key, old, row)
+                self.add(key, new, row)
+        self.version += 1
+
+    def bulk_edit(self, changes):
+        """列単位の書き換え {列名: BulkChange} を反映する (同じ行が2回含まれていても順に付け替える)"""
+        keys = [key for key in self.keys if key in changes]
+        if not keys:
+            return
+        counted = self.counted
+        for key in keys:
+            change = changes[key]
+            for row, old, new in zip(change.rows, change.old, change.new):
+                if row < counted:
+                    self.remove(key, old, row)
+                    self.add(key, new, row)
+        self.version += 1
+
+    def matching_rows(self, store, key, value):
+        """key 列が value の行 (ハッシュが同じでも値が異なる行は除く)"""
+        value = normalize(value)
+        if value is None:
+            return []
+        rows = sorted(self.tables[key].rows_of(digest(value)))
+        return [row for row, current in zip(rows, store.get_many(key, rows)) if normalize(current) == value]
+
+    def colliding(self, store, key, value, row):
+        """row 以外に key 列が value の行があるか"""
+        return any(other != row for other in self.matching_rows(store, key, value))
+
+    def collisions(self, store, limit=None):
+        """重複している値 [Collision, ...] (列の順、各列の中は最初の行の順)。limit 件で打ち切る"""
+        found = []
+        for key in self.keys:
+            groups = []
+            for h in self.duplicates[key]:
+                rows = sorted(self.tables[key].rows_of(h))
+                values = {}
+                for row, value in zip(rows, store.get_many(key, rows)):
+                    values.setdefault(normalize(value), []).append(row)
+                groups.extend(Collision(key, value, rows) for value, rows in values.items() if len(rows) > 1)
+            groups.sort(key=lambda collision: collision.rows[0])
+            found.extend(groups)
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+        return found
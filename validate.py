@@ -0,0 +1,238 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from csv_io import parse_number
+from schema import FIELD_MAP, GTIN, INT, SCHEMA, keys_of
+
+# --- 全件検証 ---
+# このモジュールは Tk に依存しない (プロセスプールのワーカーが import するため)
+
+# 検証する列と内容は schema.SCHEMA の定義から決まる
+GTIN_FIELDS = tuple(field.key for field in SCHEMA if field.check == GTIN)
+REQUIRED_GTIN_FIELDS = tuple(key for key in GTIN_FIELDS if FIELD_MAP[key].required)
+NUMBER_FIELDS = keys_of(INT)
+REQUIRED_NUMBER_FIELDS = tuple(key for key in NUMBER_FIELDS if FIELD_MAP[key].required)
+CHOICE_FIELDS = tuple(field.key for field in SCHEMA if field.choices) # 選べる値が決まっている列 (税率)
+CHECKED_FIELDS = ("id",) + GTIN_FIELDS + NUMBER_FIELDS + CHOICE_FIELDS
+
+GTIN_LENGTHS = (8, 12, 13, 14) # GTIN-8 / 12 (UPC) / 13 (JAN) / 14
+
+BATCH_SIZE = 2000 # UIスレッドで1回に値を取り出す行数
+PARALLEL_MIN_ROWS = 50000 # これ以上の行を検証するときはプロセスプールを使う
+
+Issue = namedtuple("Issue", "row id field message")
+
+
+def gtin_error(code):
+    """GS1 のコード (JAN など) の誤りを返す。正しければ None"""
+    if not (code.isascii() and code.isdigit()):
+        return "数字以外が含まれています"
+    if len(code) not in GTIN_LENGTHS:
+        return f"桁数が正しくありません ({len(code)}桁)"
+    # 右端のチェックデジットを除き、右から奇数桁目に3、偶数桁目に1を掛けた合計から求める
+    digits = code.encode("ascii")
+    odd = digits[-2::-2]
+    even = digits[-3::-2]
+    total = (sum(odd) - 48 * len(odd)) * 3 + sum(even) - 48 * len(even)
+    if (10 - total % 10) % 10 != digits[-1] - 48:
+        return "チェックデジットが正しくありません"
+    return None
+
+
+def validate_batch(rows, columns):
+    """
+    rows の各行を検証して Issue のリストを返す。
+    columns は {列名: rows と同じ並びの値のリスト} (CHECKED_FIELDS の各列)。
+    プロセスプールのワーカーでも実行されるため、引数と戻り値は pickle できる値だけにする。
+    """
+    issues = []
+    ids = columns["id"]
+    for key in GTIN_FIELDS:
+        required = key in REQUIRED_GTIN_FIELDS
+        for n, value in enumerate(columns[key]):
+            value = value.strip()
+            if not value:
+                if required:
+                    issues.append(Issue(rows[n], ids[n], key, "未入力です"))
+                continue
+            message = gtin_error(value)
+            if message:
+                issues.append(Issue(rows[n], ids[n], key, message))
+
+    numbers = {}
+    for key in NUMBER_FIELDS:
+        required = key in REQUIRED_NUMBER_FIELDS
+        minimum = FIELD_MAP[key].minimum
+        parsed = []
+        for n, value in enumerate(columns[key]):
+            number = value if type(value) is int else parse_number(value)
+            parsed.append(number)
+            if number is None:
+                if value != "":
+                    issues.append(Issue(rows[n], ids[n], key, f"数値ではありません: {value}"))
+                elif required:
+                    issues.append(Issue(rows[n], ids[n], key, "未入力です"))
+            elif minimum is not None and number < minimum:
+                message = "負の値です" if minimum == 0 else f"{minimum} より小さい値です"
+                issues.append(Issue(rows[n], ids[n], key, f"{message}: {value}"))
+        numbers[key] = parsed
+
+    for n, (cost, selling) in enumerate(zip(numbers["cost_price"], numbers["selling_price"])):
+        if cost is not None and selling is not None and selling < cost:
+            issues.append(Issue(rows[n], ids[n], "selling_price", f"売価 ({selling}) が原価 ({cost}) を下回っています"))
+
+    for key in CHOICE_FIELDS:
+        field = FIELD_MAP[key]
+        for n, value in enumerate(columns[key]):
+            if value not in field.choices:
+                issues.append(Issue(rows[n], ids[n], key, f"{field.label}が不正です: {value or '(空欄)'}"))
+    return issues
+
+
+def extract(store, rows):
+    """検証に必要な列の値を store から取り出す (UIスレッドで呼ぶ)"""
+    return {key: store.get_many(key, rows) for key in CHECKED_FIELDS}
+
+
+class CatalogValidator:
+    """
+    ColumnStore の全件検証と、編集後の再検証を管理する。
+    検証は BATCH_SIZE 行ずつ行い、対象が PARALLEL_MIN_ROWS 行以上ならプロセスプールで並列に実行する。
+    ストアはUIスレッドからしか触れないため、値の取り出しと結果の反映は step() の中で行い、
+    UI側は after() で step() を繰り返し呼ぶ。
+    """
+    def __init__(self, store):
+        self.store = store
+        self.issues = {} # 行番号 → その行の Issue のリスト
+        self.checked = False # 一度でも全件検証したか (以降は編集した行だけを再検証する)
+        self.todo = [] # これから検証する行のバッチ
+        self.running = [] # 実行中のバッチ (行, 取り出した時点の世代, Future または結果)
+        self.generation = 0
+        self.revalidated = {} # 検証中に validate_rows() で再検証した行 → その世代
+        self.executor = None
+        self.workers = max(1, (os.cpu_count() or 2) - 1)
+        self.started_at = None
+        self.seconds = None # 直近の検証にかかった時間
+        self.batches = 0 # 実行中の検証のバッチ数 (進捗の表示用)
+        self.done_batches = 0
+        self.version = 0 # 結果が変わるたびに増える (表示の更新判定用)
+
+    def __len__(self):
+        return sum(len(issues) for issues in self.issues.values())
+
+    def busy(self):
+        return bool(self.todo or self.running)
+
+    def start(self, rows=None):
+        """
+        rows (省略時は全行) の検証を始める。実際の検証は step() で進む。
+        実行中の検証がある場合は対象を追加する。
+        """
+        if rows is None:
+            rows = range(len(self.store))
+            self.checked = True
+        rows = list(rows)
+        if not rows:
+            return
+        if not self.busy():
+            self.started_at = time.perf_counter()
+            self.revalidated.clear()
+            self.batches = self.done_batches = 0
+        size = getattr(self.store, "BATCH_ROWS", BATCH_SIZE) # mmap のストアは1行ごとの取り出しが重い
+        batches = [rows[i:i + size] for i in range(0, len(rows), size)]
+        self.todo.extend(batches)
+        self.batches += len(batches)
+        if len(rows) >= PARALLEL_MIN_ROWS and self.executor is None:
+            # ワーカーの起動に時間がかかるため、大きなファイルのときだけ作って使い回す
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def step(self, budget=0.015):
+        """
+        検証を budget 秒を目安に進める。すべて終わったら True を返す。
+        """
+        deadline = time.perf_counter() + budget
+        parallel = self.executor is not None and len(self.todo) > 1
+        while self.todo and time.perf_counter() < deadline:
+            if parallel and len(self.running) >= 4 * self.workers:
+                break # 結果の受け取りが追いつくまで取り出しを待つ
+            rows = self.todo.pop(0)
+            self.generation += 1
+            columns = extract(self.store, rows)
+            if parallel:
+                result = self.executor.submit(validate_batch, rows, columns)
+            else:
+                result = validate_batch(rows, columns)
+            self.running.append((rows, self.generation, result))
+
+        while self.running and time.perf_counter() < deadline:
+            rows, generation, result = self.running[0]
+            if not isinstance(result, list):
+                if not result.done():
+                    break
+                result = result.result()
+            self.running.pop(0)
+            self.done_batches += 1
+            self.apply(rows, generation, result)
+
+        if self.busy():
+            return False
+        self.seconds = time.perf_counter() - self.started_at
+        return True
+
+    def progress(self):
+        return self.done_batches / self.batches if self.batches else 1.0
+
+    def apply(self, rows, generation, issues):
+        """バッチの検証結果を反映する (取り出し後に再検証された行の結果は捨てる)"""
+        revalidated = self.revalidated
+        skip = {row for row in rows if revalidated.get(row, 0) > generation} if revalidated else ()
+        for row in rows:
+            if row not in skip:
+                self.issues.pop(row, None)
+        for issue in issues:
+            if issue.row not in skip:
+                self.issues.setdefault(issue.row, []).append(issue)
+        self.version += 1
+
+    def validate_rows(self, rows):
+        """編集した少数の行をその場で再検証する"""
+        rows = list(rows)
+        self.generation += 1
+        if self.busy():
+            for row in rows:
+                self.revalidated[row] = self.generation
+        self.apply(rows, self.generation, validate_batch(rows, extract(self.store, rows)))
+
+    def revalidate(self, rows, changed_fields):
+        """
+        編集後に呼ぶ。検証対象の列が変わった行だけを再検証する。
+        少数ならその場で、多数 (一括編集など) なら start() で step() に任せる。
+        戻り値は step() を呼ぶ必要があるかどうか。
+        """
+        if not self.checked or not any(key in CHECKED_FIELDS for key in changed_fields):
+            return False
+        rows = list(rows)
+        if len(rows) <= BATCH_SIZE:
+            self.validate_rows(rows)
+            return False
+        self.start(rows)
+        return True
+
+    def all_issues(self):
+        """すべての Issue を行番号順に返す"""
+        return [issue for row in sorted(self.issues) for issue in self.issues[row]]
+
+    def clear(self):
+        self.issues.clear()
+        self.todo = []
+        self.running = []
+        self.revalidated.clear()
+        self.checked = False
+        self.version += 1
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None